@@ -0,0 +1,32 @@
+"""Per-event cost of event type classification.
+
+Run with: PYTHONPATH=src python benchmarks/bench_classifier.py
+"""
+import json
+import timeit
+
+from shim.events.classifier import classify, peek
+
+SAMPLES = {
+    "sqs": {"Records": [{"messageId": "m1", "eventSource": "aws:sqs", "body": "{}"}] * 10},
+    "sns": {"Records": [{"EventSource": "aws:sns", "Sns": {"Message": "{}"}}]},
+    "eventbridge": {"detail-type": "Shipment", "source": "asn", "detail": {"id": 1}},
+    "api_gateway_v1": {"httpMethod": "POST", "path": "/asn", "requestContext": {"accountId": "1"}},
+    "api_gateway_v2": {"version": "2.0", "routeKey": "POST /asn", "requestContext": {"http": {}}},
+    "alb": {"httpMethod": "GET", "requestContext": {"elb": {"targetGroupArn": "arn"}}},
+    "direct": {"shipment_number": "SH-1", "items": [{"part_number": "P", "quantity": 1}]},
+}
+
+def bench(func, arg, number=200_000) -> float:
+    """Return the mean cost of one call in nanoseconds."""
+    best = min(timeit.repeat(lambda: func(arg), number=number, repeat=5))
+    return best / number * 1e9
+
+def main():
+    print(f"{'event':<16}{'classify (ns)':>15}{'peek (ns)':>12}")
+    for name, raw_event in SAMPLES.items():
+        body = json.dumps(raw_event).encode()
+        print(f"{name:<16}{bench(classify, raw_event):>15.0f}{bench(peek, body):>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""End-to-end throughput, latency and CPU of the shim against a fake upstream.
+
+Every scenario runs a fresh app from ``create_app`` at a fixed arrival
+rate; see ``shim.bench`` for how requests are driven and measured. Run
+the same scenarios before and after a change on the same machine and
+compare.
+
+Run with: PYTHONPATH=src python benchmarks/bench_shim.py [rps] [seconds]
+"""
+import asyncio
+import logging
+import sys
+
+from shim.bench import parse_mix, run_benchmark
+
+MIXES = {
+    "sqs": "sqs",
+    "eventbridge": "eventbridge",
+    "api-gateway": "api-gateway",
+    "direct": "direct",
+    "mixed": "sqs=1,eventbridge=1,api-gateway=1,direct=1",
+}
+UPSTREAMS = ("asgi", "http")
+
+async def main(rps: float, duration: float):
+    print(f"{'scenario':<20}{'req/s':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'cpu ms/req':>12}")
+    for upstream in UPSTREAMS:
+        for name, mix in MIXES.items():
+            result = await run_benchmark(upstream=upstream, rps=rps, duration=duration, mix=parse_mix(mix))
+            print(
+                f"{upstream + '/' + name:<20}{result.throughput:>9.1f}{result.errors:>8}"
+                f"{result.p50_ms:>9.2f}{result.p95_ms:>9.2f}{result.p99_ms:>9.2f}"
+                f"{result.cpu_ms_per_request:>12.3f}"
+            )
+
+if __name__ == "__main__":
+    for name in ("shim", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    rps = float(sys.argv[1]) if len(sys.argv) > 1 else 100
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    asyncio.run(main(rps, duration))
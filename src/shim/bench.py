@@ -0,0 +1,318 @@
+"""In-process load generator for benchmarking the shim.
+
+The app from ``create_app`` is driven through httpx's ASGI transport with
+a weighted mix of SQS, EventBridge, API Gateway and direct events at a
+fixed arrival rate. Its upstream is a fake service: either an ASGI app
+called in-process, or a real HTTP server on localhost reached through
+the shim's normal connection pool.
+
+Latency is measured from each request's scheduled start, so requests
+delayed by an overloaded shim count against it rather than being
+silently sent later. CPU time is that of the benchmark process, so it
+includes the load generator, and the ASGI fake upstream when used; it is
+only comparable between runs of the same scenario.
+"""
+import asyncio
+import contextlib
+import copy
+import math
+import multiprocessing
+import random
+import time
+from typing import Any, Awaitable, Callable
+
+import httpx
+from pydantic import BaseModel
+
+from . import codec
+from .resolver import DNSCache
+from .server import create_app
+from .transport import CachedDNSTransport, pool_limits
+
+ASGI_UPSTREAM = "asgi"
+HTTP_UPSTREAM = "http"
+UPSTREAMS = (ASGI_UPSTREAM, HTTP_UPSTREAM)
+
+BENCH_FUNCTION = "bench-fn"
+
+# Ingress route of each event kind
+ROUTES = {
+    "sqs": "/sqs/{function}",
+    "eventbridge": "/eventbridge/{function}",
+    "api-gateway": "/api-gateway/{function}",
+    "direct": "/invoke/{function}",
+}
+DEFAULT_MIX = {kind: 1.0 for kind in ROUTES}
+
+UPSTREAM_REPLY = b'{"ok":true}'
+
+ASN = {
+    "shipment_number": "SH-2025-001",
+    "carrier": "FEDEX",
+    "ship_to_address": "123 Factory St, Detroit, MI",
+    "delivery_date": "2025-11-28",
+    "items": [{"part_number": "BRK-1234-A", "quantity": 100}],
+}
+
+class BenchResult(BaseModel):
+    upstream: str
+    target_rps: float
+    requests: int
+    errors: int
+    duration: float
+    throughput: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    cpu_ms_per_request: float
+
+def parse_mix(spec: str) -> dict[str, float]:
+    """Parse ``sqs=2,direct=1`` into event kind weights."""
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.strip().partition("=")
+        if kind not in ROUTES:
+            raise ValueError(f"Unknown event kind '{kind}', expected one of {', '.join(ROUTES)}")
+        mix[kind] = float(weight) if weight else 1.0
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("Event mix needs a positive weight")
+    return mix
+
+def sample_payload(kind: str, sqs_batch: int = 10) -> dict[str, Any]:
+    """A representative event of ``kind`` carrying an ASN."""
+    if kind == "sqs":
+        return {"Records": [
+            {"messageId": f"msg-{i}", "eventSource": "aws:sqs", "body": ASN}
+            for i in range(sqs_batch)
+        ]}
+    if kind == "eventbridge":
+        return {"detail-type": "ShipmentCreated", "source": "bench", "detail": ASN}
+    if kind == "api-gateway":
+        return {"httpMethod": "POST", "path": "/asn", "body": ASN}
+    return dict(ASN)
+
+def bench_config(config: dict[str, Any] | None = None, port: int = 8080) -> dict[str, Any]:
+    """``config`` with every service on ``port`` and without pod discovery.
+
+    Without a config, a single ``BENCH_FUNCTION`` service is used.
+    """
+    config = copy.deepcopy(config) if config else {}
+    services = config.get('services') or [{
+        "name": BENCH_FUNCTION,
+        "namespace": "bench",
+        "service_name": "upstream",
+        "port": port,
+        "path": "/invoke",
+    }]
+    config['services'] = [{**svc, "port": port, "discovery": False} for svc in services]
+    return config
+
+def fake_upstream(latency: float = 0.0) -> Callable[..., Awaitable[None]]:
+    """ASGI app that reads the request and replies ``{"ok":true}`` after ``latency`` seconds."""
+    async def app(scope, receive, send):
+        more_body = True
+        while more_body:
+            message = await receive()
+            more_body = message.get("more_body", False)
+        if latency:
+            await asyncio.sleep(latency)
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": UPSTREAM_REPLY})
+
+    return app
+
+class UpstreamStub:
+    """Keep-alive HTTP/1.1 server on localhost answering every request like ``fake_upstream``.
+
+    It runs in its own process, so that it neither competes with the shim
+    for the event loop nor shows up in the shim's CPU time.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.port = 0
+        self._process: multiprocessing.Process | None = None
+
+    async def __aenter__(self) -> "UpstreamStub":
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        self._process = context.Process(target=_run_stub, args=(sender, self.latency), daemon=True)
+        self._process.start()
+        sender.close()
+        self.port = await asyncio.to_thread(receiver.recv)
+        receiver.close()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._process.terminate()
+        await asyncio.to_thread(self._process.join)
+
+def _run_stub(port_sender: Any, latency: float):
+    asyncio.run(_serve_stub(port_sender, latency))
+
+async def _serve_stub(port_sender: Any, latency: float):
+    response = (
+        b"HTTP/1.1 200 OK\r\n"
+        b"Content-Type: application/json\r\n"
+        b"Content-Length: " + str(len(UPSTREAM_REPLY)).encode() + b"\r\n\r\n"
+        + UPSTREAM_REPLY
+    )
+
+    async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    name, _, value = line.partition(b":")
+                    if name.lower() == b"content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+                if latency:
+                    await asyncio.sleep(latency)
+                writer.write(response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(serve, "127.0.0.1", 0, backlog=1024)
+    port_sender.send(server.sockets[0].getsockname()[1])
+    port_sender.close()
+    async with server:
+        await server.serve_forever()
+
+async def _loopback(host: str) -> tuple[list[str], float | None]:
+    return ["127.0.0.1"], None
+
+def _percentile(ordered: list[float], percentile: float) -> float:
+    if not ordered:
+        return 0.0
+    rank = math.ceil(percentile / 100 * len(ordered)) - 1
+    return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+async def drive(
+    app: Any,
+    rps: float,
+    duration: float,
+    mix: dict[str, float] | None = None,
+    function: str = BENCH_FUNCTION,
+    concurrency: int = 256,
+    sqs_batch: int = 10,
+    seed: int = 0
+) -> tuple[list[float], int, float]:
+    """Send ``rps * duration`` events to ``app`` at a fixed rate.
+
+    At most ``concurrency`` requests are in flight; later arrivals wait,
+    and the wait counts towards their latency. Returns the latencies of
+    the successful requests, the error count and the CPU seconds used.
+    """
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    rng = random.Random(seed)
+    bodies = {kind: codec.dumps(sample_payload(kind, sqs_batch)) for kind in kinds}
+    urls = {kind: ROUTES[kind].format(function=function) for kind in kinds}
+
+    latencies: list[float] = []
+    errors = 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def send(client: httpx.AsyncClient, kind: str, scheduled: float):
+        nonlocal errors
+        try:
+            async with slots:
+                response = await client.post(
+                    urls[kind],
+                    content=bodies[kind],
+                    headers={"Content-Type": "application/json"}
+                )
+            if response.is_success:
+                latencies.append(time.perf_counter() - scheduled)
+            else:
+                errors += 1
+        except Exception:
+            errors += 1
+
+    total = int(rps * duration)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://shim") as client:
+        tasks = []
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        for i in range(total):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            kind = rng.choices(kinds, weights)[0]
+            tasks.append(asyncio.create_task(send(client, kind, scheduled)))
+        await asyncio.gather(*tasks)
+        cpu = time.process_time() - cpu_start
+
+    return latencies, errors, cpu
+
+async def run_benchmark(
+    upstream: str = ASGI_UPSTREAM,
+    config: dict[str, Any] | None = None,
+    rps: float = 200,
+    duration: float = 10.0,
+    warmup: float = 1.0,
+    mix: dict[str, float] | None = None,
+    function: str | None = None,
+    concurrency: int = 256,
+    upstream_latency: float = 0.0,
+    sqs_batch: int = 10,
+    seed: int = 0
+) -> BenchResult:
+    """Run one scenario against a fresh app and report its numbers.
+
+    A ``warmup`` run at the same rate comes first and is not reported.
+    """
+    if upstream not in UPSTREAMS:
+        raise ValueError(f"Unknown upstream '{upstream}', expected one of {', '.join(UPSTREAMS)}")
+
+    stub = UpstreamStub(upstream_latency) if upstream == HTTP_UPSTREAM else contextlib.nullcontext()
+    async with stub:
+        if upstream == HTTP_UPSTREAM:
+            config = bench_config(config, stub.port)
+            # Every service name resolves to the stub
+            transport = CachedDNSTransport(
+                httpx.AsyncHTTPTransport(limits=pool_limits(config.get('http', {}))),
+                DNSCache(resolve=_loopback)
+            )
+        else:
+            config = bench_config(config)
+            transport = httpx.ASGITransport(app=fake_upstream(upstream_latency))
+
+        app = create_app(config, upstream_transport=transport)
+        function = function or config['services'][0]['name']
+        async with app.router.lifespan_context(app):
+            options = dict(
+                mix=mix, function=function, concurrency=concurrency, sqs_batch=sqs_batch, seed=seed
+            )
+            if warmup > 0:
+                await drive(app, rps, warmup, **options)
+            start = time.perf_counter()
+            latencies, errors, cpu = await drive(app, rps, duration, **options)
+            elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    requests = len(latencies) + errors
+    return BenchResult(
+        upstream=upstream,
+        target_rps=rps,
+        requests=requests,
+        errors=errors,
+        duration=elapsed,
+        throughput=len(latencies) / elapsed if elapsed else 0.0,
+        p50_ms=_percentile(latencies, 50) * 1000,
+        p95_ms=_percentile(latencies, 95) * 1000,
+        p99_ms=_percentile(latencies, 99) * 1000,
+        cpu_ms_per_request=cpu / requests * 1000 if requests else 0.0,
+    )
@@ -0,0 +1,82 @@
+"""Circuit breakers that fail fast while an upstream service is down."""
+import time
+from enum import Enum
+from typing import Any, Callable
+
+from .errors import UpstreamUnavailable
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+DEFAULT_HALF_OPEN_MAX_CALLS = 1
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+class CircuitOpenError(UpstreamUnavailable):
+    """Raised instead of calling a service whose circuit is open."""
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one upstream service.
+
+    ``failure_threshold`` consecutive failures open the circuit, and calls
+    then fail immediately for ``reset_timeout`` seconds. After that up to
+    ``half_open_max_calls`` trial calls are let through: one success
+    closes the circuit again and one failure reopens it.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+        half_open_max_calls: int = DEFAULT_HALF_OPEN_MAX_CALLS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.clock = clock
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trials = 0
+
+    @classmethod
+    def from_settings(cls, settings: dict[str, Any]) -> "CircuitBreaker":
+        return cls(
+            failure_threshold=settings.get('failure_threshold', DEFAULT_FAILURE_THRESHOLD),
+            reset_timeout=settings.get('reset_timeout', DEFAULT_RESET_TIMEOUT),
+            half_open_max_calls=settings.get('half_open_max_calls', DEFAULT_HALF_OPEN_MAX_CALLS)
+        )
+
+    def before_call(self):
+        """Admit a call or raise ``CircuitOpenError``."""
+        if self.state is CircuitState.OPEN:
+            remaining = self.opened_at + self.reset_timeout - self.clock()
+            if remaining > 0:
+                raise CircuitOpenError(f"Circuit open, retrying upstream in {remaining:.1f}s")
+            self.state = CircuitState.HALF_OPEN
+            self._trials = 0
+
+        if self.state is CircuitState.HALF_OPEN:
+            if self._trials >= self.half_open_max_calls:
+                raise CircuitOpenError("Circuit half-open, trial call in progress")
+            self._trials += 1
+
+    def record_success(self):
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self._trials = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state is CircuitState.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = CircuitState.OPEN
+            self.opened_at = self.clock()
+            self._trials = 0
+
+    def record_abandoned(self):
+        """A call ended without an outcome, e.g. because it was cancelled."""
+        if self.state is CircuitState.HALF_OPEN and self._trials:
+            self._trials -= 1
@@ -2,229 +2,351 @@
 import asyncio
 import click
 import logging
+import logging.handlers
 import yaml
 from pathlib import Path
 from typing import Optional
 
-from shim.events.dispatcher import EventDispatcher, Event, EventType
-from shim.registry.service_registry import ServiceRegistry, ServiceEndpoint
-from shim.middleware.base import MiddlewareChain
-from shim.middleware.common import LoggingMiddleware, ValidationMiddleware
-from shim.handlers import (
- APIGatewayHandler,
- EventBridgeHandler,
- SQSHandler,
- DirectInvokeHandler
-)
+from shim import factory
+from shim.events.dispatcher import Event, EventType
+from shim.transport import create_http_client
 
 @click.group()
 @click.option('--verbose', '-v', is_flag=True, help='Enable verbose logging')
 def cli(verbose: bool):
- """K8s Lambda Shim - Route AWS Lambda events to Kubernetes services."""
- level = logging.DEBUG if verbose else logging.INFO
- logging.basicConfig(
- level=level,
- format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
- )
+    """K8s Lambda Shim - Route AWS Lambda events to Kubernetes services."""
+    level = logging.DEBUG if verbose else logging.INFO
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+def _queued_logging(ctx: click.Context, cfg: dict) -> logging.handlers.QueueListener:
+    """Send logs through the background writer configured under ``logging``."""
+    from .logs import configure_logging
+
+    log_settings = dict(cfg.get('logging') or {})
+    if ctx.find_root().params.get('verbose'):
+        log_settings['level'] = 'DEBUG'
+    try:
+        return configure_logging(log_settings)
+    except ValueError as e:
+        raise click.ClickException(str(e))
 
 @cli.command()
 @click.option('--config', '-c', type=click.Path(exists=True), required=True,
- help='Path to configuration YAML file')
+              help='Path to configuration YAML file')
 @click.option('--host', default='0.0.0.0', help='Host to bind to')
 @click.option('--port', default=8000, help='Port to listen on')
-def serve(config: str, host: str, port: int):
- """Start the Lambda shim server."""
- import uvicorn
- from .server import create_app
+@click.pass_context
+def serve(ctx: click.Context, config: str, host: str, port: int):
+    """Start the Lambda shim server."""
+    import uvicorn
+    from .server import create_app
 
- # Load config
- with open(config) as f:
- cfg = yaml.safe_load(f)
+    # Load config
+    with open(config) as f:
+        cfg = yaml.safe_load(f)
 
- # Create FastAPI app with config
- app = create_app(cfg)
+    listener = _queued_logging(ctx, cfg)
 
- click.echo(f" Starting K8s Lambda Shim server on {host}:{port}")
- uvicorn.run(app, host=host, port=port)
+    # Create FastAPI app with config
+    app = create_app(cfg)
+
+    click.echo(f" Starting K8s Lambda Shim server on {host}:{port}")
+    try:
+        # Without a log config uvicorn's loggers propagate to the queued root handler
+        uvicorn.run(app, host=host, port=port, log_config=None)
+    finally:
+        listener.stop()
 
 @cli.command()
 @click.option('--config', '-c', type=click.Path(exists=True), required=True,
- help='Path to configuration YAML file')
+              help='Path to configuration YAML file')
 @click.option('--event-type', '-t',
- type=click.Choice(['sqs', 'eventbridge', 'api-gateway', 'direct']),
- required=True, help='Event type')
+              type=click.Choice(['sqs', 'eventbridge', 'api-gateway', 'direct']),
+              required=True, help='Event type')
 @click.option('--function', '-f', required=True, help='Target function name')
 @click.option('--payload', '-p', type=click.Path(exists=True),
- help='Path to JSON payload file')
+              help='Path to JSON payload file')
 def invoke(config: str, event_type: str, function: str, payload: Optional[str]):
- """Invoke a function with a test event."""
- import json
-
- # Load config
- with open(config) as f:
- cfg = yaml.safe_load(f)
-
- # Load payload
- event_payload = {}
- if payload:
- with open(payload) as f:
- event_payload = json.load(f)
-
- # Map event type
- type_map = {
- 'sqs': EventType.SQS,
- 'eventbridge': EventType.EVENTBRIDGE,
- 'api-gateway': EventType.API_GATEWAY,
- 'direct': EventType.DIRECT_INVOKE
- }
-
- async def run():
- # Setup registry
- registry = ServiceRegistry()
- for svc in cfg.get('services', []):
- registry.register(
- svc['name'],
- ServiceEndpoint(
- namespace=svc['namespace'],
- service_name=svc['service_name'],
- port=svc['port'],
- path=svc.get('path', '/')
- )
- )
-
- # Setup dispatcher
- dispatcher = EventDispatcher()
- dispatcher.register_handler(EventType.API_GATEWAY, APIGatewayHandler(registry))
- dispatcher.register_handler(EventType.EVENTBRIDGE, EventBridgeHandler(registry))
- dispatcher.register_handler(EventType.SQS, SQSHandler(registry))
- dispatcher.register_handler(EventType.DIRECT_INVOKE, DirectInvokeHandler(registry))
-
- # Setup middleware
- middleware = MiddlewareChain([
- LoggingMiddleware(),
- ValidationMiddleware(),
- ])
-
- # Create event
- event = Event(
- event_type=type_map[event_type],
- function_name=function,
- payload=event_payload,
- context={}
- )
-
- # Process
- async def final_handler(evt: Event):
- return await dispatcher.dispatch(evt)
-
- result = await middleware.execute(event, final_handler)
- click.echo(f" Result: {json.dumps(result, indent=2)}")
-
- asyncio.run(run())
+    """Invoke a function with a test event."""
+    import json
+
+    # Load config
+    with open(config) as f:
+        cfg = yaml.safe_load(f)
+
+    # Load payload
+    event_payload = {}
+    if payload:
+        with open(payload) as f:
+            event_payload = json.load(f)
+
+    # Map event type
+    type_map = {
+        'sqs': EventType.SQS,
+        'eventbridge': EventType.EVENTBRIDGE,
+        'api-gateway': EventType.API_GATEWAY,
+        'direct': EventType.DIRECT_INVOKE
+    }
+
+    async def run():
+        registry = factory.build_registry(cfg)
+        client = create_http_client(
+            cfg.get('http', {}),
+            http2_origins=factory.http2_origins(registry)
+        )
+        dispatcher = factory.build_dispatcher(cfg, registry, client)
+        middleware = factory.build_middleware(cfg)
+
+        # Create event
+        event = Event(
+            event_type=type_map[event_type],
+            function_name=function,
+            payload=event_payload,
+            context={}
+        )
+
+        # Process
+        try:
+            result = await middleware.execute(event, dispatcher.dispatch)
+        finally:
+            await client.aclose()
+        click.echo(f" Result: {json.dumps(result, indent=2)}")
+
+    asyncio.run(run())
+
+@cli.command()
+@click.option('--config', '-c', type=click.Path(exists=True), required=True,
+              help='Path to configuration YAML file')
+@click.pass_context
+def poll(ctx: click.Context, config: str):
+    """Consume the configured SQS queues directly."""
+    import boto3
+    from .poller import QueueSubscription, SQSPoller
+
+    with open(config) as f:
+        cfg = yaml.safe_load(f)
+
+    sqs_config = cfg.get('sqs', {})
+    subscriptions = [QueueSubscription(**queue) for queue in sqs_config.get('queues', [])]
+    if not subscriptions:
+        click.echo(" No queues configured under 'sqs.queues'")
+        raise click.Abort()
+
+    async def run():
+        registry = factory.build_registry(cfg)
+        discovery = factory.build_discovery(cfg, registry)
+        client = create_http_client(
+            cfg.get('http', {}),
+            http2_origins=factory.http2_origins(registry),
+            endpoint_sets=discovery.endpoint_sets if discovery else None
+        )
+        dispatcher = factory.build_dispatcher(cfg, registry, client)
+        handle = factory.build_middleware(cfg, batch_processing=True).build(dispatcher.dispatch)
+        sqs = boto3.client(
+            'sqs',
+            region_name=sqs_config.get('region'),
+            endpoint_url=sqs_config.get('endpoint_url')
+        )
+
+        if discovery:
+            discovery.start()
+        try:
+            await asyncio.gather(*(
+                SQSPoller(sqs, subscription, handle).run() for subscription in subscriptions
+            ))
+        finally:
+            if discovery:
+                await discovery.stop()
+            await client.aclose()
+
+    for subscription in subscriptions:
+        click.echo(
+            f" Polling {subscription.queue_url} → {subscription.function_name} "
+            f"with {subscription.receivers} receiver(s)"
+        )
+    listener = _queued_logging(ctx, cfg)
+    try:
+        asyncio.run(run())
+    finally:
+        listener.stop()
+
+@cli.command()
+@click.option('--config', '-c', type=click.Path(exists=True),
+              help='Configuration YAML file; its services are pointed at the fake upstream')
+@click.option('--upstream', type=click.Choice(['asgi', 'http']), default='asgi',
+              help='Fake upstream: in-process ASGI app or HTTP server on localhost')
+@click.option('--rps', default=200.0, help='Target requests per second')
+@click.option('--duration', '-d', default=10.0, help='Measured seconds')
+@click.option('--warmup', default=1.0, help='Unmeasured seconds before the run')
+@click.option('--mix', '-m', default='sqs=1,eventbridge=1,api-gateway=1,direct=1',
+              help='Event kind weights, e.g. sqs=3,direct=1')
+@click.option('--function', '-f', help='Target function (default: first service)')
+@click.option('--concurrency', default=256, help='Maximum requests in flight')
+@click.option('--upstream-latency-ms', default=0.0, help='Fake upstream reply delay')
+@click.option('--sqs-batch', default=10, help='Records per SQS event')
+@click.option('--seed', default=0, help='Seed for the event mix')
+@click.option('--json', 'as_json', is_flag=True, help='Print the result as JSON')
+def bench(
+    config: Optional[str],
+    upstream: str,
+    rps: float,
+    duration: float,
+    warmup: float,
+    mix: str,
+    function: Optional[str],
+    concurrency: int,
+    upstream_latency_ms: float,
+    sqs_batch: int,
+    seed: int,
+    as_json: bool
+):
+    """Benchmark the shim in-process against a fake upstream."""
+    from .bench import parse_mix, run_benchmark
+
+    cfg = None
+    if config:
+        with open(config) as f:
+            cfg = yaml.safe_load(f)
+    try:
+        weights = parse_mix(mix)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--mix')
+
+    # Per-event log lines would dominate the measurement
+    for name in ('shim', 'httpx'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    result = asyncio.run(run_benchmark(
+        upstream=upstream,
+        config=cfg,
+        rps=rps,
+        duration=duration,
+        warmup=warmup,
+        mix=weights,
+        function=function,
+        concurrency=concurrency,
+        upstream_latency=upstream_latency_ms / 1000,
+        sqs_batch=sqs_batch,
+        seed=seed
+    ))
+
+    if as_json:
+        click.echo(result.model_dump_json(indent=2))
+        return
+    click.echo(f" Upstream: {result.upstream}, target {result.target_rps:.0f} rps, mix {mix}")
+    click.echo(f" Requests: {result.requests} ({result.errors} errors) in {result.duration:.2f}s")
+    click.echo(f" Throughput: {result.throughput:.1f} req/s")
+    click.echo(
+        f" Latency: p50 {result.p50_ms:.2f} ms, p95 {result.p95_ms:.2f} ms, "
+        f"p99 {result.p99_ms:.2f} ms"
+    )
+    click.echo(f" CPU: {result.cpu_ms_per_request:.3f} ms/request")
 
 @cli.command()
 @click.option('--config', '-c', type=click.Path(exists=True), required=True,
- help='Path to configuration YAML file')
+              help='Path to configuration YAML file')
 def validate(config: str):
- """Validate configuration file."""
- try:
- with open(config) as f:
- cfg = yaml.safe_load(f)
-
- # Validate required fields
- errors = []
-
- if 'services' not in cfg:
- errors.append("Missing 'services' section")
- else:
- for i, svc in enumerate(cfg['services']):
- required = ['name', 'namespace', 'service_name', 'port']
- for field in required:
- if field not in svc:
- errors.append(f"Service {i}: missing '{field}'")
-
- if errors:
- click.echo(" Configuration validation failed:")
- for error in errors:
- click.echo(f" - {error}")
- raise click.Abort()
-
- click.echo(" Configuration is valid")
- click.echo(f"\n Services configured: {len(cfg['services'])}")
- for svc in cfg['services']:
- click.echo(f" - {svc['name']} → {svc['namespace']}/{svc['service_name']}:{svc['port']}")
-
- except yaml.YAMLError as e:
- click.echo(f" Invalid YAML: {e}")
- raise click.Abort()
+    """Validate configuration file."""
+    try:
+        with open(config) as f:
+            cfg = yaml.safe_load(f)
+
+        # Validate required fields
+        errors = []
+
+        if 'services' not in cfg:
+            errors.append("Missing 'services' section")
+        else:
+            for i, svc in enumerate(cfg['services']):
+                required = ['name', 'namespace', 'service_name', 'port']
+                for field in required:
+                    if field not in svc:
+                        errors.append(f"Service {i}: missing '{field}'")
+
+        if errors:
+            click.echo(" Configuration validation failed:")
+            for error in errors:
+                click.echo(f" - {error}")
+            raise click.Abort()
+
+        click.echo(" Configuration is valid")
+        click.echo(f"\n Services configured: {len(cfg['services'])}")
+        for svc in cfg['services']:
+            click.echo(f" - {svc['name']} → {svc['namespace']}/{svc['service_name']}:{svc['port']}")
+
+    except yaml.YAMLError as e:
+        click.echo(f" Invalid YAML: {e}")
+        raise click.Abort()
 
 @cli.command()
 @click.argument('output', type=click.Path())
 def init(output: str):
- """Generate a sample configuration file."""
- sample_config = {
- 'services': [
- {
- 'name': 'my-function',
- 'namespace': 'default',
- 'service_name': 'my-service',
- 'port': 8080,
- 'path': '/invoke'
- }
- ],
- 'middleware': {
- 'logging': {
- 'enabled': True,
- 'level': 'INFO'
- },
- 'validation': {
- 'enabled': True
- }
- },
- 'server': {
- 'host': '0.0.0.0',
- 'port': 8000,
- 'timeout': 30
- }
- }
-
- output_path = Path(output)
- if output_path.exists():
- if not click.confirm(f'{output} already exists. Overwrite?'):
- return
-
- with open(output_path, 'w') as f:
- yaml.dump(sample_config, f, default_flow_style=False, sort_keys=False)
-
- click.echo(f" Created sample config at {output}")
- click.echo(f"\nNext steps:")
- click.echo(f" 1. Edit {output} to configure your services")
- click.echo(f" 2. Validate: k8s-shim validate -c {output}")
- click.echo(f" 3. Run: k8s-shim serve -c {output}")
+    """Generate a sample configuration file."""
+    sample_config = {
+        'services': [
+            {
+                'name': 'my-function',
+                'namespace': 'default',
+                'service_name': 'my-service',
+                'port': 8080,
+                'path': '/invoke'
+            }
+        ],
+        'middleware': {
+            'logging': {
+                'enabled': True,
+                'level': 'INFO'
+            },
+            'validation': {
+                'enabled': True
+            }
+        },
+        'server': {
+            'host': '0.0.0.0',
+            'port': 8000,
+            'timeout': 30
+        }
+    }
+
+    output_path = Path(output)
+    if output_path.exists():
+        if not click.confirm(f'{output} already exists. Overwrite?'):
+            return
+
+    with open(output_path, 'w') as f:
+        yaml.dump(sample_config, f, default_flow_style=False, sort_keys=False)
+
+    click.echo(f" Created sample config at {output}")
+    click.echo(f"\nNext steps:")
+    click.echo(f" 1. Edit {output} to configure your services")
+    click.echo(f" 2. Validate: k8s-shim validate -c {output}")
+    click.echo(f" 3. Run: k8s-shim serve -c {output}")
 
 @cli.command()
 @click.option('--namespace', '-n', default='default', help='Kubernetes namespace')
 def list_services(namespace: str):
- """List available Kubernetes services."""
- from kubernetes import client, config
+    """List available Kubernetes services."""
+    from kubernetes import client, config
 
- try:
- config.load_kube_config()
- v1 = client.CoreV1Api()
+    try:
+        config.load_kube_config()
+        v1 = client.CoreV1Api()
 
- click.echo(f" Services in namespace '{namespace}':\n")
- services = v1.list_namespaced_service(namespace)
+        click.echo(f" Services in namespace '{namespace}':\n")
+        services = v1.list_namespaced_service(namespace)
 
- for svc in services.items:
- ports = ', '.join([f"{p.port}/{p.protocol}" for p in svc.spec.ports])
- click.echo(f" {svc.metadata.name}")
- click.echo(f" Type: {svc.spec.type}")
- click.echo(f" Ports: {ports}")
- click.echo()
+        for svc in services.items:
+            ports = ', '.join([f"{p.port}/{p.protocol}" for p in svc.spec.ports])
+            click.echo(f" {svc.metadata.name}")
+            click.echo(f" Type: {svc.spec.type}")
+            click.echo(f" Ports: {ports}")
+            click.echo()
 
- except Exception as e:
- click.echo(f" Error: {e}")
- raise click.Abort()
+    except Exception as e:
+        click.echo(f" Error: {e}")
+        raise click.Abort()
 
 if __name__ == '__main__':
- cli()
+    cli()
@@ -0,0 +1,63 @@
+"""JSON codec used for ingress bodies, upstream envelopes and responses.
+
+The stdlib codec is the default. orjson and msgspec are faster but are
+limited to 64-bit integers, so they are only used when ``json.codec``
+names them explicitly.
+"""
+import json
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+class JSONCodec:
+    def __init__(
+        self,
+        name: str,
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[bytes | str], Any]
+    ):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+_CODECS: dict[str, JSONCodec] = {
+    "json": JSONCodec("json", _stdlib_dumps, json.loads),
+}
+if msgspec is not None:
+    _CODECS["msgspec"] = JSONCodec("msgspec", msgspec.json.encode, msgspec.json.decode)
+if orjson is not None:
+    _CODECS["orjson"] = JSONCodec("orjson", orjson.dumps, orjson.loads)
+
+DEFAULT_CODEC = "json"
+
+def get_codec(name: str | None = None) -> JSONCodec:
+    """Return the named codec, or the stdlib one when ``name`` is None."""
+    name = name or DEFAULT_CODEC
+    if name not in _CODECS:
+        raise ValueError(f"JSON codec '{name}' is not available")
+    return _CODECS[name]
+
+_active = get_codec()
+
+def use_codec(name: str | None = None) -> JSONCodec:
+    """Select the process-wide codec used by ``dumps`` and ``loads``."""
+    global _active
+    _active = get_codec(name)
+    return _active
+
+def dumps(obj: Any) -> bytes:
+    return _active.dumps(obj)
+
+def loads(data: bytes | str) -> Any:
+    return _active.loads(data)
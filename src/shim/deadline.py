@@ -0,0 +1,76 @@
+"""Request deadlines: read from ingress headers, propagated upstream, enforced per call.
+
+A deadline is an absolute time in epoch milliseconds, stored in
+``Event.context`` so it survives derived events and reaches the upstream
+in the envelope as well as in the ``X-Request-Deadline`` header.
+"""
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Mapping
+
+# Absolute deadline in epoch milliseconds, used on ingress and upstream calls
+DEADLINE_HEADER = "X-Request-Deadline"
+# What a forwarding Lambda reports from context.get_remaining_time_in_millis()
+REMAINING_TIME_HEADER = "X-Lambda-Remaining-Ms"
+CONTEXT_KEY = "deadline"
+
+class DeadlineExceeded(Exception):
+    """The caller's deadline or the function's total timeout ran out; reported as 504."""
+
+def now_ms() -> float:
+    return time.time() * 1000
+
+def _milliseconds(value: str) -> float | None:
+    """``value`` as a number, or None if it is malformed, infinite or NaN."""
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+def from_headers(headers: Mapping[str, str]) -> dict[str, Any]:
+    """Event context carrying the deadline found in ingress ``headers``, if any."""
+    if DEADLINE_HEADER in headers:
+        deadline = _milliseconds(headers[DEADLINE_HEADER])
+    elif REMAINING_TIME_HEADER in headers:
+        left = _milliseconds(headers[REMAINING_TIME_HEADER])
+        deadline = None if left is None else now_ms() + left
+    else:
+        deadline = None
+    return {} if deadline is None else {CONTEXT_KEY: deadline}
+
+def remaining(context: Mapping[str, Any]) -> float | None:
+    """Seconds left before the event's deadline, or None without one."""
+    deadline = context.get(CONTEXT_KEY)
+    if deadline is None:
+        return None
+    return (deadline - now_ms()) / 1000
+
+def headers(base: Mapping[str, str], context: Mapping[str, Any]) -> Mapping[str, str]:
+    """``base`` plus the deadline header when the event has a deadline."""
+    deadline = context.get(CONTEXT_KEY)
+    if deadline is None:
+        return base
+    return {**base, DEADLINE_HEADER: str(int(deadline))}
+
+@asynccontextmanager
+async def bounded(total_timeout: float | None, context: Mapping[str, Any]) -> AsyncIterator[None]:
+    """Cancel the enclosed work when the total timeout or the event's deadline is reached.
+
+    Work whose deadline has already passed is not started.
+    """
+    left = remaining(context)
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("Deadline passed before the upstream call")
+    limits = [limit for limit in (total_timeout, left) if limit is not None]
+    if not limits:
+        yield
+        return
+
+    try:
+        async with asyncio.timeout(min(limits)):
+            yield
+    except TimeoutError:
+        raise DeadlineExceeded(f"Upstream call exceeded {min(limits):.3f}s") from None
@@ -0,0 +1,238 @@
+"""Pod endpoint discovery from EndpointSlices with client-side load balancing.
+
+For services with ``discovery: true`` the shim watches the service's
+EndpointSlices and sends requests straight to ready pod IPs, bypassing
+cluster DNS and kube-proxy. While no ready pod is known, requests keep
+going to the service's cluster DNS name.
+"""
+import asyncio
+import logging
+import random
+import threading
+from typing import Any, Callable, Iterable
+
+from .registry.service_registry import ServiceEndpoint
+
+logger = logging.getLogger(__name__)
+
+LEAST_OUTSTANDING = "least_outstanding"
+POWER_OF_TWO = "p2c"
+STRATEGIES = (LEAST_OUTSTANDING, POWER_OF_TWO)
+
+SERVICE_NAME_LABEL = "kubernetes.io/service-name"
+# Server-side watch timeout; the watch is re-established after it
+WATCH_TIMEOUT_SECONDS = 300
+
+# Event type of the first event of a watch stream, whose ``objects`` are every
+# EndpointSlice of the service at the time the watch started
+SYNC = "SYNC"
+
+# Yields a SYNC event, then watch events from the state it listed
+WatchStream = Callable[[str, str], Iterable[dict[str, Any]]]
+
+class EndpointSet:
+    """Ready pod addresses of one service and their outstanding request counts."""
+
+    def __init__(self, strategy: str = LEAST_OUTSTANDING):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown load balancing strategy '{strategy}'")
+        self.strategy = strategy
+        self.addresses: list[str] = []
+        self.outstanding: dict[str, int] = {}
+        self._slices: dict[str, list[str]] = {}
+
+    def update_slice(self, name: str, addresses: list[str]):
+        self._slices[name] = addresses
+        self._rebuild()
+
+    def remove_slice(self, name: str):
+        self._slices.pop(name, None)
+        self._rebuild()
+
+    def replace_slices(self, slices: dict[str, list[str]]):
+        """Replace every slice, dropping those deleted while no watch was open."""
+        self._slices = dict(slices)
+        self._rebuild()
+
+    def _rebuild(self):
+        self.addresses = sorted({a for addresses in self._slices.values() for a in addresses})
+        # Counts for removed pods are dropped once their requests finish
+        for address in self.addresses:
+            self.outstanding.setdefault(address, 0)
+
+    def pick(self) -> str | None:
+        """Choose a ready address, or None when no pod is known to be ready."""
+        addresses = self.addresses
+        if not addresses:
+            return None
+        if len(addresses) == 1:
+            return addresses[0]
+        if self.strategy == POWER_OF_TWO:
+            first, second = random.sample(addresses, 2)
+            return first if self.outstanding[first] <= self.outstanding[second] else second
+        fewest = min(self.outstanding[a] for a in addresses)
+        return random.choice([a for a in addresses if self.outstanding[a] == fewest])
+
+    def acquire(self, address: str):
+        self.outstanding[address] = self.outstanding.get(address, 0) + 1
+
+    def release(self, address: str):
+        count = self.outstanding.get(address, 0) - 1
+        if count <= 0 and address not in self.addresses:
+            self.outstanding.pop(address, None)
+        else:
+            self.outstanding[address] = max(count, 0)
+
+def ready_addresses(endpoint_slice: Any, port: int) -> list[str]:
+    """``ip:port`` of every ready endpoint in a V1EndpointSlice.
+
+    The pod port is the slice port numbered ``port``, or the slice's only
+    port when the service maps ``port`` to a different target port.
+    """
+    ports = endpoint_slice.ports or []
+    target = next((p.port for p in ports if p.port == port), None)
+    if target is None:
+        if len(ports) != 1:
+            return []
+        target = ports[0].port
+
+    addresses = []
+    for endpoint in endpoint_slice.endpoints or []:
+        conditions = endpoint.conditions
+        # A missing ready condition means ready, per the EndpointSlice API
+        if conditions is not None and conditions.ready is False:
+            continue
+        addresses.extend(f"{ip}:{target}" for ip in endpoint.addresses or [])
+    return addresses
+
+def kubernetes_watch_stream(namespace: str, service_name: str) -> Iterable[dict[str, Any]]:
+    """Blocking list and watch of a service's EndpointSlices through the kubernetes client.
+
+    The watch starts from the list's resourceVersion, so no change between
+    the two is missed.
+    """
+    from kubernetes import client, config, watch
+
+    try:
+        config.load_incluster_config()
+    except config.ConfigException:
+        config.load_kube_config()
+
+    api = client.DiscoveryV1Api()
+    selector = f"{SERVICE_NAME_LABEL}={service_name}"
+    listed = api.list_namespaced_endpoint_slice(namespace, label_selector=selector)
+    yield {"type": SYNC, "objects": listed.items}
+    yield from watch.Watch().stream(
+        api.list_namespaced_endpoint_slice,
+        namespace,
+        label_selector=selector,
+        resource_version=listed.metadata.resource_version,
+        timeout_seconds=WATCH_TIMEOUT_SECONDS
+    )
+
+class EndpointSliceWatcher:
+    """Keeps an ``EndpointSet`` in sync with a service's EndpointSlices.
+
+    The watch stream is blocking, so it is consumed in a daemon thread,
+    which cannot hold up shutdown, and every event is applied on the event
+    loop. Each stream starts by listing the slices, so slices deleted while
+    the watch was being re-established are dropped.
+    """
+
+    def __init__(
+        self,
+        endpoint: ServiceEndpoint,
+        endpoint_set: EndpointSet,
+        watch_stream: WatchStream = kubernetes_watch_stream,
+        retry_delay: float = 1.0
+    ):
+        self.endpoint = endpoint
+        self.endpoint_set = endpoint_set
+        self.watch_stream = watch_stream
+        self.retry_delay = retry_delay
+
+    def apply(self, event: dict[str, Any]):
+        if event["type"] == SYNC:
+            self.endpoint_set.replace_slices({
+                endpoint_slice.metadata.name: ready_addresses(endpoint_slice, self.endpoint.port)
+                for endpoint_slice in event["objects"]
+            })
+            return
+        endpoint_slice = event["object"]
+        name = endpoint_slice.metadata.name
+        if event["type"] == "DELETED":
+            self.endpoint_set.remove_slice(name)
+        elif event["type"] in ("ADDED", "MODIFIED"):
+            self.endpoint_set.update_slice(name, ready_addresses(endpoint_slice, self.endpoint.port))
+
+    async def _watch_once(self):
+        loop = asyncio.get_running_loop()
+        finished = loop.create_future()
+
+        def finish(error: BaseException | None):
+            if finished.done():
+                return
+            if error is None:
+                finished.set_result(None)
+            else:
+                finished.set_exception(error)
+
+        def consume():
+            error = None
+            try:
+                for event in self.watch_stream(self.endpoint.namespace, self.endpoint.service_name):
+                    loop.call_soon_threadsafe(self.apply, event)
+            except Exception as e:
+                error = e
+            try:
+                loop.call_soon_threadsafe(finish, error)
+            except RuntimeError:
+                # The loop closed while the watch was still open
+                pass
+
+        threading.Thread(
+            target=consume,
+            name=f"endpointslice-watch-{self.endpoint.service_name}",
+            daemon=True
+        ).start()
+        await finished
+
+    async def run(self):
+        """Watch until cancelled, re-establishing the watch whenever it ends."""
+        while True:
+            try:
+                await self._watch_once()
+            except Exception as e:
+                logger.warning("EndpointSlice watch for %s failed: %s", self.endpoint.service_name, e)
+                await asyncio.sleep(self.retry_delay)
+
+class Discovery:
+    """Endpoint sets for every discovered service, keyed by the service's host and port."""
+
+    def __init__(
+        self,
+        strategy: str = LEAST_OUTSTANDING,
+        watch_stream: WatchStream = kubernetes_watch_stream
+    ):
+        self.strategy = strategy
+        self.watch_stream = watch_stream
+        self.endpoint_sets: dict[str, EndpointSet] = {}
+        self._watchers: list[EndpointSliceWatcher] = []
+        self._tasks: list[asyncio.Task] = []
+
+    def add(self, endpoint: ServiceEndpoint) -> EndpointSet:
+        netloc = endpoint.origin.split("://", 1)[1]
+        endpoint_set = self.endpoint_sets.get(netloc)
+        if endpoint_set is None:
+            endpoint_set = self.endpoint_sets[netloc] = EndpointSet(self.strategy)
+            self._watchers.append(EndpointSliceWatcher(endpoint, endpoint_set, self.watch_stream))
+        return endpoint_set
+
+    def start(self):
+        self._tasks = [asyncio.create_task(watcher.run()) for watcher in self._watchers]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,8 @@
+"""Errors raised by the shim itself rather than by the upstream services."""
+
+class UpstreamUnavailable(Exception):
+    """The shim declined to call an upstream service.
+
+    The server reports these as 503 and ``SQSHandler`` as a failed record,
+    so callers can retry later instead of treating them as bad input.
+    """
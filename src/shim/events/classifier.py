@@ -0,0 +1,81 @@
+"""Table-driven AWS event type classification shared by the server and dispatcher."""
+from typing import Any
+
+from .dispatcher import EventType
+
+# Record-based events are identified by the eventSource of their first record
+RECORD_SOURCES: dict[str, EventType] = {
+    "aws:sqs": EventType.SQS,
+    "aws:sns": EventType.SNS,
+    "aws:s3": EventType.S3,
+    "aws:kinesis": EventType.KINESIS,
+    "aws:dynamodb": EventType.DYNAMODB,
+}
+
+# Top-level keys that identify an event on their own, checked in order
+KEY_MARKERS: tuple[tuple[str, EventType], ...] = (
+    ("httpMethod", EventType.API_GATEWAY),
+    ("routeKey", EventType.API_GATEWAY),
+    ("detail-type", EventType.EVENTBRIDGE),
+)
+
+def classify(raw_event: Any) -> EventType:
+    """Identify the AWS event type of a decoded event from its key layout."""
+    if not isinstance(raw_event, dict):
+        return EventType.DIRECT_INVOKE
+
+    records = raw_event.get("Records")
+    if isinstance(records, list) and records:
+        first = records[0]
+        if isinstance(first, dict):
+            # SNS capitalises the key
+            source = first.get("eventSource") or first.get("EventSource")
+            return RECORD_SOURCES.get(source, EventType.DIRECT_INVOKE)
+        return EventType.DIRECT_INVOKE
+
+    request_context = raw_event.get("requestContext")
+    if request_context is not None:
+        if isinstance(request_context, dict) and "elb" in request_context:
+            return EventType.ALB
+        return EventType.API_GATEWAY
+
+    for key, event_type in KEY_MARKERS:
+        if key in raw_event:
+            return event_type
+
+    if "source" in raw_event and "detail" in raw_event:
+        return EventType.EVENTBRIDGE
+
+    return EventType.DIRECT_INVOKE
+
+# Only the head of an undecoded body is scanned; the classification of a
+# passthrough event only selects middleware behaviour and log labels.
+PEEK_BYTES = 4096
+
+_RECORD_SOURCE_MARKERS = tuple(
+    (f'"{source}"'.encode(), event_type) for source, event_type in RECORD_SOURCES.items()
+)
+_KEY_MARKER_BYTES = tuple(
+    (f'"{key}"'.encode(), event_type) for key, event_type in KEY_MARKERS
+)
+
+def peek(body: bytes) -> EventType:
+    """Identify the AWS event type from the start of an undecoded JSON body."""
+    head = body[:PEEK_BYTES]
+    if b'"Records"' in head:
+        for marker, event_type in _RECORD_SOURCE_MARKERS:
+            if marker in head:
+                return event_type
+        return EventType.DIRECT_INVOKE
+
+    if b'"requestContext"' in head:
+        return EventType.ALB if b'"elb"' in head else EventType.API_GATEWAY
+
+    for marker, event_type in _KEY_MARKER_BYTES:
+        if marker in head:
+            return event_type
+
+    if b'"source"' in head and b'"detail"' in head:
+        return EventType.EVENTBRIDGE
+
+    return EventType.DIRECT_INVOKE
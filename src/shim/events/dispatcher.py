@@ -4,41 +4,50 @@ from typing import Any, Protocol
 from pydantic import BaseModel, Field
 
 class EventType(str, Enum):
- API_GATEWAY = "api_gateway"
- EVENTBRIDGE = "eventbridge"
- SQS = "sqs"
- DIRECT_INVOKE = "direct_invoke"
+    API_GATEWAY = "api_gateway"
+    EVENTBRIDGE = "eventbridge"
+    SQS = "sqs"
+    SNS = "sns"
+    S3 = "s3"
+    KINESIS = "kinesis"
+    DYNAMODB = "dynamodb"
+    ALB = "alb"
+    DIRECT_INVOKE = "direct_invoke"
 
 class Event(BaseModel):
- event_type: EventType
- payload: dict[str, Any]
- context: dict[str, Any] = Field(default_factory=dict)
- source_arn: str | None = None
- function_name: str
+    event_type: EventType
+    payload: dict[str, Any]
+    context: dict[str, Any] = Field(default_factory=dict)
+    source_arn: str | None = None
+    function_name: str
+    # Undecoded request body for passthrough functions; payload stays empty
+    raw_payload: bytes | None = Field(default=None, exclude=True, repr=False)
+
+    def derive(self, **changes: Any) -> "Event":
+        """Copy this already-validated event with ``changes``, skipping validation.
+
+        Only for events built inside the shim from values that came off a
+        validated event; ingress payloads must go through the constructor.
+        """
+        return self.model_copy(update=changes)
 
 class EventHandler(Protocol):
- async def handle(self, event: Event) -> dict[str, Any]: ...
+    async def handle(self, event: Event) -> dict[str, Any]: ...
 
 class EventDispatcher:
- def __init__(self):
- self._handlers: dict[EventType, EventHandler] = {}
-
- def register_handler(self, event_type: EventType, handler: EventHandler):
- self._handlers[event_type] = handler
-
- async def dispatch(self, event: Event) -> dict[str, Any]:
- handler = self._handlers.get(event.event_type)
- if not handler:
- raise ValueError(f"No handler registered for {event.event_type}")
- return await handler.handle(event)
-
- @staticmethod
- def identify_event_type(raw_event: dict[str, Any]) -> EventType:
- if "httpMethod" in raw_event or "requestContext" in raw_event:
- return EventType.API_GATEWAY
- elif "detail-type" in raw_event or "source" in raw_event:
- return EventType.EVENTBRIDGE
- elif "Records" in raw_event and raw_event["Records"][0].get("eventSource") == "aws:sqs":
- return EventType.SQS
- else:
- return EventType.DIRECT_INVOKE
+    def __init__(self):
+        self._handlers: dict[EventType, EventHandler] = {}
+
+    def register_handler(self, event_type: EventType, handler: EventHandler):
+        self._handlers[event_type] = handler
+
+    async def dispatch(self, event: Event) -> dict[str, Any]:
+        handler = self._handlers.get(event.event_type)
+        if not handler:
+            raise ValueError(f"No handler registered for {event.event_type}")
+        return await handler.handle(event)
+
+    @staticmethod
+    def identify_event_type(raw_event: dict[str, Any]) -> EventType:
+        from .classifier import classify
+        return classify(raw_event)
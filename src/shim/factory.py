@@ -0,0 +1,103 @@
+"""Builds the registry, dispatcher and middleware shared by the server and CLI."""
+from typing import Any, Dict
+
+import httpx
+
+from .discovery import LEAST_OUTSTANDING, Discovery
+from .events.dispatcher import EventDispatcher, EventType
+from .registry.service_registry import ServiceRegistry, ServiceEndpoint
+from .middleware.base import MiddlewareChain
+from .middleware.common import LoggingMiddleware, ValidationMiddleware
+from .middleware.asn import ASNBatchProcessingMiddleware
+from .handlers import (
+    APIGatewayHandler,
+    EventBridgeHandler,
+    SQSHandler,
+    DirectInvokeHandler
+)
+
+def build_registry(config: Dict[str, Any]) -> ServiceRegistry:
+    """Register every configured service under its function name."""
+    registry = ServiceRegistry()
+    for svc in config.get('services', []):
+        registry.register(
+            svc['name'],
+            ServiceEndpoint(
+                namespace=svc['namespace'],
+                service_name=svc['service_name'],
+                port=svc['port'],
+                path=svc.get('path', '/'),
+                http2=svc.get('http2', False),
+                passthrough=svc.get('passthrough', False),
+                stream=svc.get('stream', False),
+                discovery=svc.get('discovery', False),
+                retries=svc.get('retries', 0),
+                idempotent=svc.get('idempotent', False),
+                hedge_percentile=svc.get('hedge_percentile'),
+                connect_timeout=svc.get('connect_timeout'),
+                read_timeout=svc.get('read_timeout'),
+                timeout=svc.get('timeout')
+            )
+        )
+    return registry
+
+def http2_origins(registry: ServiceRegistry) -> list[str]:
+    """Origins of the services that opted into h2c."""
+    return [ep.origin for ep in registry._mappings.values() if ep.http2]
+
+def build_discovery(config: Dict[str, Any], registry: ServiceRegistry) -> Discovery | None:
+    """EndpointSlice discovery for services with ``discovery: true``, if any."""
+    endpoints = [ep for ep in registry._mappings.values() if ep.discovery]
+    if not endpoints:
+        return None
+    discovery = Discovery(config.get('discovery', {}).get('strategy', LEAST_OUTSTANDING))
+    for endpoint in endpoints:
+        discovery.add(endpoint)
+    return discovery
+
+def build_dispatcher(
+    config: Dict[str, Any],
+    registry: ServiceRegistry,
+    client: httpx.AsyncClient
+) -> EventDispatcher:
+    """Register a handler for every event type, all sharing ``client``."""
+    sqs_config = config.get('sqs', {})
+    function_concurrency = {
+        svc['name']: svc['max_concurrency']
+        for svc in config.get('services', [])
+        if 'max_concurrency' in svc
+    }
+    dispatcher = EventDispatcher()
+    api_gateway = APIGatewayHandler(registry, client)
+    dispatcher.register_handler(EventType.API_GATEWAY, api_gateway)
+    dispatcher.register_handler(EventType.ALB, api_gateway)
+    dispatcher.register_handler(EventType.EVENTBRIDGE, EventBridgeHandler(registry, client))
+    dispatcher.register_handler(EventType.SQS, SQSHandler(
+        registry,
+        client,
+        batch_concurrency=sqs_config.get('batch_concurrency', 10),
+        function_concurrency=function_concurrency
+    ))
+    direct = DirectInvokeHandler(registry, client)
+    dispatcher.register_handler(EventType.DIRECT_INVOKE, direct)
+    # Record streams without batch semantics in the shim are forwarded whole
+    for event_type in (EventType.SNS, EventType.S3, EventType.KINESIS, EventType.DYNAMODB):
+        dispatcher.register_handler(event_type, direct)
+    return dispatcher
+
+def build_middleware(config: Dict[str, Any], batch_processing: bool = False) -> MiddlewareChain:
+    """Middleware applied to every event before it is dispatched.
+
+    ``ASNBatchProcessingMiddleware`` is only added for ``batch_processing``
+    callers, as it answers SQS events itself: HTTP routes expect the
+    handler's response, and passthrough events carry no parsed records.
+    """
+    settings = config.get('middleware', {})
+    chain = MiddlewareChain([
+        LoggingMiddleware(),
+        ValidationMiddleware(),
+    ], timing=settings.get('timing', False))
+    batch_settings = settings.get('batch_processing', {})
+    if batch_processing and batch_settings.get('enabled'):
+        chain.add(ASNBatchProcessingMiddleware(batch_settings.get('batch_size', 100)))
+    return chain
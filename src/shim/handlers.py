@@ -1,56 +1,222 @@
 """Event handlers for different AWS event types."""
+import asyncio
 import httpx
-from typing import Any
+import logging
+import time
+from typing import Any, AsyncIterator
 
+from . import deadline, metrics
+from .codec import dumps, loads
 from .events.dispatcher import Event, EventHandler
-from .registry.service_registry import ServiceRegistry
+from .hedging import LatencyWindow, hedged
+from .registry.service_registry import ServiceRegistry, ServiceEndpoint
+from .transport import create_http_client
+
+logger = logging.getLogger(__name__)
+
+JSON_HEADERS = {"Content-Type": "application/json"}
 
 class K8sInvokeHandler:
- def __init__(self, registry: ServiceRegistry):
- self.registry = registry
- self.client = httpx.AsyncClient(timeout=30.0)
-
- async def handle(self, event: Event) -> dict[str, Any]:
- endpoint = self.registry.lookup(event.function_name)
- if not endpoint:
- raise ValueError(f"No service registered for {event.function_name}")
-
- response = await self.client.post(
- endpoint.url,
- json={
- "event": event.payload,
- "context": event.context,
- }
- )
- response.raise_for_status()
- return response.json()
+    def __init__(self, registry: ServiceRegistry, client: httpx.AsyncClient | None = None):
+        self.registry = registry
+        self.client = client or create_http_client()
+
+    async def handle(self, event: Event) -> dict[str, Any]:
+        endpoint = self.registry.lookup(event.function_name)
+        if not endpoint:
+            raise ValueError(f"No service registered for {event.function_name}")
+        return await self._invoke(endpoint, event)
+
+    async def _invoke(self, endpoint: ServiceEndpoint, event: Event) -> dict[str, Any]:
+        async with deadline.bounded(endpoint.timeout, event.context):
+            response = await self.client.post(
+                endpoint.url,
+                content=dumps({
+                    "event": event.payload,
+                    "context": event.context,
+                }),
+                headers=deadline.headers(JSON_HEADERS, event.context),
+                timeout=self._timeout(endpoint),
+                extensions=self._extensions(endpoint, event)
+            )
+        response.raise_for_status()
+        return loads(response.content)
+
+    @staticmethod
+    def _extensions(endpoint: ServiceEndpoint, event: Event) -> dict[str, Any]:
+        """Request extensions read by the client's retry and metrics transports."""
+        return {
+            "retries": endpoint.retries,
+            metrics.LABELS_EXTENSION: metrics.event_labels(event),
+        }
+
+    def _timeout(self, endpoint: ServiceEndpoint) -> httpx.Timeout:
+        """The client's timeouts with the function's connect and read overrides."""
+        default = self.client.timeout
+        if endpoint.connect_timeout is None and endpoint.read_timeout is None:
+            return default
+        return httpx.Timeout(
+            connect=default.connect if endpoint.connect_timeout is None else endpoint.connect_timeout,
+            read=default.read if endpoint.read_timeout is None else endpoint.read_timeout,
+            write=default.write,
+            pool=default.pool
+        )
 
 class APIGatewayHandler(K8sInvokeHandler):
- async def handle(self, event: Event) -> dict[str, Any]:
- result = await super().handle(event)
- return {
- "statusCode": 200,
- "body": result,
- "headers": {"Content-Type": "application/json"}
- }
+    """Wraps replies for API Gateway and hedges slow calls to idempotent functions.
+
+    For services with ``idempotent`` and ``hedge_percentile`` set, a second
+    request is sent once the first has taken longer than that percentile of
+    the function's recent latencies, and the first reply wins.
+    """
+
+    def __init__(self, registry: ServiceRegistry, client: httpx.AsyncClient | None = None):
+        super().__init__(registry, client)
+        self._latencies: dict[str, LatencyWindow] = {}
+
+    async def handle(self, event: Event) -> dict[str, Any]:
+        endpoint = self.registry.lookup(event.function_name)
+        if not endpoint:
+            raise ValueError(f"No service registered for {event.function_name}")
+
+        if endpoint.idempotent and endpoint.hedge_percentile is not None:
+            result = await self._hedged_invoke(endpoint, event)
+        else:
+            result = await self._invoke(endpoint, event)
+        return {
+            "statusCode": 200,
+            "body": result,
+            "headers": {"Content-Type": "application/json"}
+        }
+
+    async def _hedged_invoke(self, endpoint: ServiceEndpoint, event: Event) -> dict[str, Any]:
+        latencies = self._latencies.get(event.function_name)
+        if latencies is None:
+            latencies = self._latencies[event.function_name] = LatencyWindow()
+
+        async def attempt() -> dict[str, Any]:
+            start = time.monotonic()
+            result = await self._invoke(endpoint, event)
+            latencies.record(time.monotonic() - start)
+            return result
+
+        return await hedged(attempt, latencies.percentile(endpoint.hedge_percentile))
+
+    @staticmethod
+    async def wrap_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Emit the same response shape as ``handle`` around a streamed body."""
+        yield b'{"statusCode":200,"body":'
+        async for chunk in chunks:
+            yield chunk
+        yield b',"headers":' + dumps({"Content-Type": "application/json"}) + b"}"
 
 class EventBridgeHandler(K8sInvokeHandler):
- async def handle(self, event: Event) -> dict[str, Any]:
- return await super().handle(event)
+    async def handle(self, event: Event) -> dict[str, Any]:
+        return await super().handle(event)
 
 class SQSHandler(K8sInvokeHandler):
- async def handle(self, event: Event) -> dict[str, Any]:
- results = []
- for record in event.payload.get("Records", []):
- individual_event = Event(
- event_type=event.event_type,
- payload=record,
- context=event.context,
- function_name=event.function_name
- )
- result = await super().handle(individual_event)
- results.append(result)
- return {"batchItemFailures": []}
+    """Fans SQS records out concurrently and reports failed records individually."""
+
+    def __init__(
+        self,
+        registry: ServiceRegistry,
+        client: httpx.AsyncClient | None = None,
+        batch_concurrency: int = 10,
+        function_concurrency: dict[str, int] | None = None
+    ):
+        super().__init__(registry, client)
+        self.batch_concurrency = batch_concurrency
+        self.function_concurrency = function_concurrency or {}
+        self._function_semaphores: dict[str, asyncio.Semaphore] = {}
+
+    def _function_semaphore(self, function_name: str) -> asyncio.Semaphore | None:
+        limit = self.function_concurrency.get(function_name)
+        if not limit:
+            return None
+        semaphore = self._function_semaphores.get(function_name)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(limit)
+            self._function_semaphores[function_name] = semaphore
+        return semaphore
+
+    async def handle(self, event: Event) -> dict[str, Any]:
+        if not self.registry.lookup(event.function_name):
+            raise ValueError(f"No service registered for {event.function_name}")
+
+        invoke = super().handle
+        batch_semaphore = asyncio.Semaphore(max(1, self.batch_concurrency))
+        function_semaphore = self._function_semaphore(event.function_name)
+
+        async def invoke_record(record: Any) -> dict[str, Any]:
+            # A dict record is a valid payload, so it can skip revalidation
+            if not isinstance(record, dict):
+                raise ValueError("SQS record is not an object")
+            individual_event = event.derive(payload=record)
+            async with batch_semaphore:
+                if function_semaphore is None:
+                    return await invoke(individual_event)
+                async with function_semaphore:
+                    return await invoke(individual_event)
+
+        records = event.payload.get("Records", [])
+        if not isinstance(records, list):
+            raise ValueError("SQS event Records must be a list")
+        results = await asyncio.gather(
+            *(invoke_record(record) for record in records),
+            return_exceptions=True
+        )
+
+        failures = []
+        for record, result in zip(records, results):
+            if isinstance(result, Exception):
+                message_id = record.get("messageId") if isinstance(record, dict) else None
+                logger.error("SQS record %s failed: %s", message_id, result)
+                failures.append({"itemIdentifier": message_id})
+            elif isinstance(result, BaseException):
+                raise result
+        metrics.record_sqs_batch(event.function_name, len(records), len(failures))
+        return {"batchItemFailures": failures}
 
 class DirectInvokeHandler(K8sInvokeHandler):
- pass
+    pass
+
+class StreamingHandler(K8sInvokeHandler):
+    """Sends the event envelope and returns the upstream response with its body unread.
+
+    Passthrough events have their undecoded request body spliced into the
+    ``{"event", "context"}`` envelope, so the shim parses neither side. The
+    caller owns the returned response and must close it.
+    """
+
+    async def handle(self, event: Event) -> httpx.Response:
+        endpoint = self.registry.lookup(event.function_name)
+        if not endpoint:
+            raise ValueError(f"No service registered for {event.function_name}")
+
+        if event.raw_payload is not None:
+            envelope = b"".join((
+                b'{"event":',
+                event.raw_payload or b"{}",
+                b',"context":',
+                dumps(event.context),
+                b"}",
+            ))
+        else:
+            envelope = dumps({"event": event.payload, "context": event.context})
+
+        request = self.client.build_request(
+            "POST",
+            endpoint.url,
+            content=envelope,
+            headers=deadline.headers(JSON_HEADERS, event.context),
+            timeout=self._timeout(endpoint),
+            extensions=self._extensions(endpoint, event)
+        )
+        # The total timeout covers the wait for the reply headers, not the stream
+        async with deadline.bounded(endpoint.timeout, event.context):
+            response = await self.client.send(request, stream=True)
+        if response.is_error:
+            await response.aread()
+            await response.aclose()
+            response.raise_for_status()
+        return response
@@ -0,0 +1,60 @@
+"""Hedged upstream requests: a second attempt when the first is slower than usual."""
+import asyncio
+import math
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_WINDOW = 200
+# Hedging waits until the window says something about normal latency
+MIN_SAMPLES = 20
+
+class LatencyWindow:
+    """Latencies of the most recent successful upstream calls for one function."""
+
+    def __init__(self, size: int = DEFAULT_WINDOW):
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, latency: float):
+        self._samples.append(latency)
+
+    def percentile(self, percentile: float) -> float | None:
+        """The ``percentile`` (0-100) latency, or None before ``MIN_SAMPLES`` calls."""
+        if len(self._samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        rank = math.ceil(percentile / 100 * len(ordered)) - 1
+        return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+async def hedged(attempt: Callable[[], Awaitable[T]], delay: float | None) -> T:
+    """Run ``attempt``, starting a second copy if the first is still running after ``delay``.
+
+    The first successful result wins and the other attempt is cancelled. A
+    failure only counts once both attempts have failed.
+    """
+    tasks = {asyncio.ensure_future(attempt())}
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                tasks.add(asyncio.ensure_future(attempt()))
+
+        pending = set(tasks)
+        error: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        losers = [task for task in tasks if not task.done()]
+        for task in losers:
+            task.cancel()
+        # Let the losers release their connections before returning
+        await asyncio.gather(*losers, return_exceptions=True)
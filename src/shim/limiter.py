@@ -0,0 +1,127 @@
+"""Adaptive (AIMD) concurrency limits for upstream services."""
+import asyncio
+from collections import deque
+from typing import Any
+
+import httpx
+
+from .errors import UpstreamUnavailable
+
+DEFAULT_INITIAL_LIMIT = 20
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_MAX_LIMIT = 200
+DEFAULT_MAX_QUEUE = 100
+DEFAULT_BACKOFF_RATIO = 0.9
+DEFAULT_LATENCY_TOLERANCE = 2.0
+# Weight of each sample in the smoothed baseline latency
+BASELINE_SMOOTHING = 0.05
+
+class ConcurrencyLimitExceeded(UpstreamUnavailable):
+    """Raised when a request would exceed both the in-flight limit and the queue."""
+
+class AdaptiveLimiter:
+    """In-flight request limit that adapts to the latency an upstream reports.
+
+    The limit grows by about one per round trip while it is being used
+    and latency stays within ``latency_tolerance`` times the smoothed
+    baseline. It shrinks by ``backoff_ratio`` on a slow response, a 5xx or
+    a timeout. Requests over the limit wait in a FIFO queue of up to
+    ``max_queue`` entries; beyond that they are shed.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = DEFAULT_INITIAL_LIMIT,
+        min_limit: int = DEFAULT_MIN_LIMIT,
+        max_limit: int = DEFAULT_MAX_LIMIT,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        backoff_ratio: float = DEFAULT_BACKOFF_RATIO,
+        latency_tolerance: float = DEFAULT_LATENCY_TOLERANCE
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.max_queue = max_queue
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.baseline: float | None = None
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @classmethod
+    def from_settings(cls, settings: dict[str, Any]) -> "AdaptiveLimiter":
+        return cls(
+            initial_limit=settings.get('initial_limit', DEFAULT_INITIAL_LIMIT),
+            min_limit=settings.get('min_limit', DEFAULT_MIN_LIMIT),
+            max_limit=settings.get('max_limit', DEFAULT_MAX_LIMIT),
+            max_queue=settings.get('max_queue', DEFAULT_MAX_QUEUE),
+            backoff_ratio=settings.get('backoff_ratio', DEFAULT_BACKOFF_RATIO),
+            latency_tolerance=settings.get('latency_tolerance', DEFAULT_LATENCY_TOLERANCE)
+        )
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise ConcurrencyLimitExceeded(
+                f"{self.in_flight} requests in flight and {len(self._waiters)} queued"
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the caller gave up
+                self.in_flight -= 1
+                self._wake()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, latency: float | None = None, dropped: bool = False):
+        """Return a slot, adjusting the limit from the request's outcome.
+
+        ``latency`` is None when the request ended without a usable sample,
+        e.g. because the caller cancelled it.
+        """
+        utilised = self.in_flight * 2 >= self.limit
+        self.in_flight -= 1
+
+        if dropped or (latency is not None and self._is_slow(latency)):
+            self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        elif latency is not None and utilised:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        if latency is not None and not dropped:
+            self._update_baseline(latency)
+        self._wake()
+
+    def _is_slow(self, latency: float) -> bool:
+        return self.baseline is not None and latency > self.baseline * self.latency_tolerance
+
+    def _update_baseline(self, latency: float):
+        if self.baseline is None:
+            self.baseline = latency
+        else:
+            self.baseline += (latency - self.baseline) * BASELINE_SMOOTHING
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+def signals_overload(response: httpx.Response | None = None, error: BaseException | None = None) -> bool:
+    """Whether an upstream outcome means the service is struggling."""
+    if error is not None:
+        return isinstance(error, (httpx.TimeoutException, httpx.NetworkError))
+    return response is not None and response.status_code >= 500
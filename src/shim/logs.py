@@ -0,0 +1,123 @@
+"""Structured logging written by a background thread.
+
+``configure_logging`` replaces the root logger's handlers with a
+``QueueHandler`` feeding a ``QueueListener`` thread, which formats each
+record and writes it out. Logging from the event loop only creates the
+record and puts it on the queue: messages are rendered from their
+``%``-style arguments on the writer thread, and when the queue is full
+records are dropped rather than waiting for the writer.
+
+Records can be sampled per level before they are queued, so busy
+per-event logs can be thinned without losing warnings and errors.
+"""
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import Any, TextIO
+
+JSON_FORMAT = "json"
+TEXT_FORMAT = "text"
+FORMATS = (JSON_FORMAT, TEXT_FORMAT)
+
+TEXT_LAYOUT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DEFAULT_QUEUE_SIZE = 10_000
+
+# Attributes of every LogRecord; any others were passed in ``extra``.
+# uvicorn passes an ANSI-coloured copy of its messages as color_message.
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "taskName", "color_message"
+}
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with ``extra`` fields as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+class LevelSampler(logging.Filter):
+    """Keeps records of each level with the configured probability.
+
+    Levels without a rate are always kept.
+    """
+
+    def __init__(self, rates: dict[str, float] | None = None):
+        super().__init__()
+        self.rates = {
+            logging.getLevelName(level.upper()): rate for level, rate in (rates or {}).items()
+        }
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno)
+        return rate is None or rate >= 1 or random.random() < rate
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queues records unformatted and drops them when the queue is full.
+
+    The stock QueueHandler renders the message before queueing it; here
+    that is left to the listener thread, so arguments must not be mutated
+    after they are logged.
+    """
+
+    def __init__(self, queue: queue.Queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return copy.copy(record)
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def configure_logging(
+    settings: dict[str, Any],
+    stream: TextIO | None = None
+) -> logging.handlers.QueueListener:
+    """Route the root logger through a queue to a writer thread on ``stream``.
+
+    Returns the started listener; stop it to flush the queue on shutdown.
+    """
+    log_format = settings.get('format', JSON_FORMAT)
+    if log_format not in FORMATS:
+        raise ValueError(f"Unknown log format '{log_format}', expected one of {', '.join(FORMATS)}")
+
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(JSONFormatter() if log_format == JSON_FORMAT else logging.Formatter(TEXT_LAYOUT))
+
+    records: queue.Queue = queue.Queue(settings.get('queue_size', DEFAULT_QUEUE_SIZE))
+    handler = NonBlockingQueueHandler(records)
+    handler.addFilter(LevelSampler(settings.get('sampling')))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+        old.close()
+    root.addHandler(handler)
+    root.setLevel(settings.get('level', 'INFO').upper())
+
+    listener = logging.handlers.QueueListener(records, writer)
+    listener.start()
+    return listener
@@ -0,0 +1,281 @@
+"""Prometheus metrics for ingress, middleware, upstream calls, the pool and SQS batches.
+
+Metrics live in the default prometheus_client registry and are served by
+the ``/metrics`` route. Per-event metrics are labelled by function name
+and event type; names of unregistered functions are reported as
+``unknown`` so that arbitrary request paths cannot add label values.
+"""
+import time
+import weakref
+from contextvars import ContextVar
+from typing import Any, Callable, Iterable, Iterator
+
+import httpx
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+
+from .events.dispatcher import Event
+from .middleware.base import HandlerFunc, MiddlewareChain, ResponseType, stage_timings
+from .registry.service_registry import ServiceRegistry
+
+EVENT_LABELS = ("function", "event_type")
+# Request extension carrying the (function, event type) labels of an upstream call
+LABELS_EXTENSION = "shim_metrics_labels"
+UNKNOWN_FUNCTION = "unknown"
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+INGRESS_DURATION = Histogram(
+    "shim_ingress_duration_seconds",
+    "Time from an event entering the middleware chain to its reply.",
+    EVENT_LABELS + ("outcome",)
+)
+INGRESS_IN_FLIGHT = Gauge(
+    "shim_ingress_in_flight",
+    "Events currently in the middleware chain or a handler.",
+    EVENT_LABELS
+)
+MIDDLEWARE_DURATION = Histogram(
+    "shim_middleware_duration_seconds",
+    "Time an event spent in middleware, excluding its handler.",
+    EVENT_LABELS
+)
+MIDDLEWARE_SELF_DURATION = Histogram(
+    "shim_middleware_self_duration_seconds",
+    "Time spent in one middleware, excluding downstream middleware and the handler.",
+    ("middleware",) + EVENT_LABELS
+)
+UPSTREAM_CONNECT = Histogram(
+    "shim_upstream_connect_seconds",
+    "Time to open a new upstream connection, including TLS.",
+    EVENT_LABELS
+)
+UPSTREAM_TTFB = Histogram(
+    "shim_upstream_ttfb_seconds",
+    "Time from sending an upstream attempt to receiving its response headers.",
+    EVENT_LABELS
+)
+UPSTREAM_DURATION = Histogram(
+    "shim_upstream_duration_seconds",
+    "Time from sending an upstream attempt to closing its response body.",
+    EVENT_LABELS + ("status",)
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "shim_upstream_in_flight",
+    "Upstream attempts sent and not yet closed.",
+    EVENT_LABELS
+)
+SQS_BATCH_SIZE = Histogram(
+    "shim_sqs_batch_size",
+    "Records per SQS batch.",
+    ("function",),
+    buckets=BATCH_SIZE_BUCKETS
+)
+SQS_RECORD_FAILURES = Counter(
+    "shim_sqs_record_failures",
+    "SQS records reported in batchItemFailures.",
+    ("function",)
+)
+
+# Seconds spent in handlers for the event currently in the chain
+_handler_time: ContextVar[list[float] | None] = ContextVar("shim_handler_time", default=None)
+
+def event_labels(event: Event, registry: ServiceRegistry | None = None) -> tuple[str, str]:
+    function = event.function_name
+    if registry is not None and registry.lookup(function) is None:
+        function = UNKNOWN_FUNCTION
+    return function, event.event_type.value
+
+def instrument(
+    chain: MiddlewareChain,
+    final_handler: Callable[[Event], Any],
+    registry: ServiceRegistry
+) -> HandlerFunc:
+    """Compile ``chain`` around ``final_handler``, timing the whole call and the handler.
+
+    Middleware time is the total minus the time spent in the handler.
+    Handlers run by middleware in child tasks still count, as the tasks
+    share the caller's timer. For a timed chain the self-time of each
+    middleware is recorded as well.
+    """
+    async def timed_handler(event: Event) -> ResponseType:
+        start = time.perf_counter()
+        try:
+            return await final_handler(event)
+        finally:
+            spent = _handler_time.get()
+            if spent is not None:
+                spent[0] += time.perf_counter() - start
+
+    handle = chain.build(timed_handler)
+
+    async def instrumented(event: Event) -> ResponseType:
+        labels = event_labels(event, registry)
+        spent = [0.0]
+        token = _handler_time.set(spent)
+        in_flight = INGRESS_IN_FLIGHT.labels(*labels)
+        in_flight.inc()
+        outcome = "error"
+        start = time.perf_counter()
+        with stage_timings() as timings:
+            # A collection opened by the caller may hold earlier events' stages
+            before = dict(timings)
+            try:
+                result = await handle(event)
+                outcome = "success"
+                return result
+            finally:
+                total = time.perf_counter() - start
+                in_flight.dec()
+                _handler_time.reset(token)
+                INGRESS_DURATION.labels(*labels, outcome).observe(total)
+                MIDDLEWARE_DURATION.labels(*labels).observe(max(total - spent[0], 0.0))
+                for name, seconds in timings.items():
+                    seconds -= before.get(name, 0.0)
+                    MIDDLEWARE_SELF_DURATION.labels(name, *labels).observe(max(seconds, 0.0))
+
+    return instrumented
+
+def record_sqs_batch(function: str, records: int, failures: int):
+    SQS_BATCH_SIZE.labels(function).observe(records)
+    if failures:
+        SQS_RECORD_FAILURES.labels(function).inc(failures)
+
+class _ObservedStream(httpx.AsyncByteStream):
+    """Response stream that records the attempt's total time once closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, done: Callable[[], None]):
+        self._stream = stream
+        self._done = done
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._done()
+
+class MetricsTransport(httpx.AsyncBaseTransport):
+    """Records connect time, TTFB, total time and in-flight count of upstream attempts.
+
+    Labels come from the request's ``LABELS_EXTENSION``. Connect time is
+    taken from httpcore's trace events, so it is only recorded for
+    attempts that opened a connection.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        labels = request.extensions.get(LABELS_EXTENSION, ("", ""))
+        tls = request.url.scheme == "https"
+        caller_trace = request.extensions.get("trace")
+        connect_started = 0.0
+
+        async def trace(name: str, info: dict[str, Any]):
+            nonlocal connect_started
+            if name == "connection.connect_tcp.started":
+                connect_started = time.perf_counter()
+            elif name == ("connection.start_tls.complete" if tls else "connection.connect_tcp.complete"):
+                UPSTREAM_CONNECT.labels(*labels).observe(time.perf_counter() - connect_started)
+            if caller_trace is not None:
+                await caller_trace(name, info)
+
+        # A new request, so a retry of the original does not inherit this trace
+        traced = httpx.Request(
+            request.method,
+            request.url,
+            headers=request.headers,
+            stream=request.stream,
+            extensions={**request.extensions, "trace": trace}
+        )
+        in_flight = UPSTREAM_IN_FLIGHT.labels(*labels)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(traced)
+        except BaseException:
+            in_flight.dec()
+            UPSTREAM_DURATION.labels(*labels, "error").observe(time.perf_counter() - start)
+            raise
+        UPSTREAM_TTFB.labels(*labels).observe(time.perf_counter() - start)
+
+        def done():
+            in_flight.dec()
+            UPSTREAM_DURATION.labels(*labels, str(response.status_code)).observe(
+                time.perf_counter() - start
+            )
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ObservedStream(response.stream, done),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+def _connection_pool(transport: Any) -> Any:
+    """The httpcore pool under a stack of transport wrappers, if there is one."""
+    while not isinstance(transport, httpx.AsyncHTTPTransport):
+        transport = getattr(transport, "_transport", None)
+        if transport is None:
+            return None
+    return transport._pool
+
+def _pools(client: httpx.AsyncClient) -> Iterator[tuple[str, Any]]:
+    pool = _connection_pool(client._transport)
+    if pool is not None:
+        yield "default", pool
+    for pattern, transport in client._mounts.items():
+        pool = _connection_pool(transport)
+        if pool is not None:
+            yield pattern.pattern, pool
+
+class PoolCollector:
+    """Connection counts of the pools of every tracked client, read at scrape time."""
+
+    def __init__(self):
+        self._clients: "weakref.WeakSet[httpx.AsyncClient]" = weakref.WeakSet()
+
+    def track(self, client: httpx.AsyncClient):
+        self._clients.add(client)
+
+    def untrack(self, client: httpx.AsyncClient):
+        self._clients.discard(client)
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        connections = GaugeMetricFamily(
+            "shim_pool_connections",
+            "Upstream pool connections by state.",
+            labels=("pool", "state")
+        )
+        limit = GaugeMetricFamily(
+            "shim_pool_max_connections",
+            "Upstream pool connection limit.",
+            labels=("pool",)
+        )
+        queued = GaugeMetricFamily(
+            "shim_pool_queued_requests",
+            "Requests waiting for an upstream pool connection.",
+            labels=("pool",)
+        )
+        for client in list(self._clients):
+            for name, pool in _pools(client):
+                idle = sum(1 for connection in pool.connections if connection.is_idle())
+                connections.add_metric((name, "idle"), idle)
+                connections.add_metric((name, "active"), len(pool.connections) - idle)
+                if pool._max_connections is not None:
+                    limit.add_metric((name,), pool._max_connections)
+                queued.add_metric((name,), sum(1 for r in pool._requests if r.is_queued()))
+        yield from (connections, limit, queued)
+
+POOLS = PoolCollector()
+REGISTRY.register(POOLS)
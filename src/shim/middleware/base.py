@@ -1,5 +1,8 @@
 """Base middleware framework."""
-from typing import Any, Callable, Awaitable
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Awaitable, Iterator
 from abc import ABC, abstractmethod
 
 from ..events.dispatcher import Event
@@ -8,29 +11,109 @@ ResponseType = dict[str, Any]
 HandlerFunc = Callable[[Event], Awaitable[ResponseType]]
 
 class Middleware(ABC):
- @abstractmethod
- async def process(self, event: Event, next_handler: HandlerFunc) -> ResponseType:
- pass
+    @abstractmethod
+    async def process(self, event: Event, next_handler: HandlerFunc) -> ResponseType:
+        pass
+
+# Self-time per middleware for the events handled in the current context
+_stage_timings: ContextVar[dict[str, float] | None] = ContextVar("stage_timings", default=None)
+
+@contextmanager
+def stage_timings() -> Iterator[dict[str, float]]:
+    """Collect the self-time, in seconds, of each middleware of a timed chain.
+
+    Nested collections share the outermost one's dict.
+    """
+    timings = _stage_timings.get()
+    if timings is not None:
+        yield timings
+        return
+    timings = {}
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+def _bind(middleware: Middleware, next_handler: HandlerFunc) -> HandlerFunc:
+    """Close over ``next_handler`` and pass it positionally, as ``process`` declares it."""
+    process = middleware.process
+
+    def handler(event: Event) -> Awaitable[ResponseType]:
+        return process(event, next_handler)
+
+    return handler
+
+def _bind_timed(middleware: Middleware, next_handler: HandlerFunc) -> HandlerFunc:
+    """Like ``_bind``, also recording the middleware's self-time into ``stage_timings``.
+
+    Self-time excludes the time during which at least one downstream call
+    is running, so a middleware that fans out concurrently is not charged
+    for its handlers.
+    """
+    process = middleware.process
+    name = type(middleware).__name__
+
+    async def handler(event: Event) -> ResponseType:
+        timings = _stage_timings.get()
+        if timings is None:
+            return await process(event, next_handler)
+
+        # Entered here so that stages are listed outermost first
+        timings.setdefault(name, 0.0)
+        running = 0
+        running_since = 0.0
+        downstream = 0.0
+
+        async def timed_next(event: Event) -> ResponseType:
+            nonlocal running, running_since, downstream
+            if running == 0:
+                running_since = time.perf_counter()
+            running += 1
+            try:
+                return await next_handler(event)
+            finally:
+                running -= 1
+                if running == 0:
+                    downstream += time.perf_counter() - running_since
+
+        start = time.perf_counter()
+        try:
+            return await process(event, timed_next)
+        finally:
+            elapsed = time.perf_counter() - start - downstream
+            timings[name] += elapsed
+
+    return handler
 
 class MiddlewareChain:
- def __init__(self, middlewares: list[Middleware] | None = None):
- self.middlewares = middlewares or []
+    """Ordered middleware stack compiled once into a reusable handler.
+
+    The compiled handler is cached per final handler and rebuilt after ``add``.
+    With ``timing`` each middleware's self-time is recorded while a
+    ``stage_timings`` collection is open.
+    """
 
- def add(self, middleware: Middleware):
- self.middlewares.append(middleware)
+    def __init__(self, middlewares: list[Middleware] | None = None, timing: bool = False):
+        self.middlewares = middlewares or []
+        self.timing = timing
+        self._compiled: tuple[HandlerFunc, HandlerFunc] | None = None
 
- async def execute(self, event: Event, final_handler: HandlerFunc) -> ResponseType:
- async def create_chain(index: int) -> HandlerFunc:
- if index >= len(self.middlewares):
- return final_handler
+    def add(self, middleware: Middleware):
+        self.middlewares.append(middleware)
+        self._compiled = None
 
- middleware = self.middlewares[index]
- next_handler = await create_chain(index + 1)
+    def build(self, final_handler: HandlerFunc) -> HandlerFunc:
+        if self._compiled is not None and self._compiled[0] == final_handler:
+            return self._compiled[1]
 
- async def handler(evt: Event) -> ResponseType:
- return await middleware.process(evt, next_handler)
+        bind = _bind_timed if self.timing else _bind
+        handler = final_handler
+        for middleware in reversed(self.middlewares):
+            handler = bind(middleware, handler)
 
- return handler
+        self._compiled = (final_handler, handler)
+        return handler
 
- chain = await create_chain(0)
- return await chain(event)
+    async def execute(self, event: Event, final_handler: HandlerFunc) -> ResponseType:
+        return await self.build(final_handler)(event)
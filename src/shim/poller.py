@@ -0,0 +1,170 @@
+"""SQS poller that consumes queues directly instead of waiting for pushed events.
+
+Each queue is long-polled by several concurrent receivers. Received
+messages are dispatched as one Lambda-shaped SQS event through the same
+middleware chain and ``SQSHandler`` as the HTTP routes, successful
+messages are deleted in ``DeleteMessageBatch`` calls and failed ones are
+left to reappear after their visibility timeout.
+"""
+import asyncio
+import logging
+from typing import Any
+
+from pydantic import BaseModel
+
+from . import codec
+from .events.dispatcher import Event, EventType
+from .middleware.base import HandlerFunc
+
+logger = logging.getLogger(__name__)
+
+# SQS caps ReceiveMessage, DeleteMessageBatch and ChangeMessageVisibilityBatch at 10
+SQS_BATCH_LIMIT = 10
+
+class QueueSubscription(BaseModel):
+    queue_url: str
+    function_name: str
+    receivers: int = 1
+    max_messages: int = SQS_BATCH_LIMIT
+    wait_time_seconds: int = 20
+    visibility_timeout: int = 30
+    # Seconds between visibility extensions; half the timeout when unset
+    extend_interval: float | None = None
+
+class SQSPoller:
+    """Long-polls one queue and dispatches its messages to ``handle``.
+
+    ``sqs`` is a boto3 SQS client, or anything with the same
+    ``receive_message``, ``delete_message_batch`` and
+    ``change_message_visibility_batch`` methods. boto3 clients are
+    blocking, so every call runs in a worker thread.
+    """
+
+    def __init__(self, sqs: Any, subscription: QueueSubscription, handle: HandlerFunc):
+        self.sqs = sqs
+        self.subscription = subscription
+        self.handle = handle
+
+    async def run(self, stop: asyncio.Event | None = None):
+        """Run the receivers until ``stop`` is set."""
+        stop = stop or asyncio.Event()
+        await asyncio.gather(*(
+            self._receive_loop(stop) for _ in range(max(1, self.subscription.receivers))
+        ))
+
+    async def _receive_loop(self, stop: asyncio.Event):
+        sub = self.subscription
+        while not stop.is_set():
+            try:
+                response = await asyncio.to_thread(
+                    self.sqs.receive_message,
+                    QueueUrl=sub.queue_url,
+                    MaxNumberOfMessages=min(sub.max_messages, SQS_BATCH_LIMIT),
+                    WaitTimeSeconds=sub.wait_time_seconds,
+                    VisibilityTimeout=sub.visibility_timeout,
+                    AttributeNames=["All"],
+                    MessageAttributeNames=["All"]
+                )
+            except Exception as e:
+                logger.error("Receiving from %s failed: %s", sub.queue_url, e)
+                await asyncio.sleep(1)
+                continue
+
+            messages = response.get("Messages", [])
+            if messages:
+                await self.process(messages)
+
+    async def process(self, messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Dispatch one received batch and delete the messages that succeeded.
+
+        Returns the messages that failed and were left on the queue.
+        """
+        event = Event(
+            event_type=EventType.SQS,
+            function_name=self.subscription.function_name,
+            payload={"Records": [_to_record(message) for message in messages]},
+            context={}
+        )
+
+        extender = asyncio.create_task(self._extend_visibility(messages))
+        try:
+            result = await self.handle(event)
+            failed_ids = {f.get("itemIdentifier") for f in result.get("batchItemFailures", [])}
+        except Exception as e:
+            logger.error("Batch from %s failed: %s", self.subscription.queue_url, e)
+            failed_ids = {message["MessageId"] for message in messages}
+        finally:
+            extender.cancel()
+
+        succeeded = [m for m in messages if m["MessageId"] not in failed_ids]
+        await self._delete(succeeded)
+        return [m for m in messages if m["MessageId"] in failed_ids]
+
+    async def _extend_visibility(self, messages: list[dict[str, Any]]):
+        """Keep a slow batch invisible to other consumers until it finishes."""
+        sub = self.subscription
+        interval = sub.extend_interval or sub.visibility_timeout / 2
+        entries = [
+            {
+                "Id": str(i),
+                "ReceiptHandle": message["ReceiptHandle"],
+                "VisibilityTimeout": sub.visibility_timeout
+            }
+            for i, message in enumerate(messages)
+        ]
+        while True:
+            await asyncio.sleep(interval)
+            for chunk in _chunks(entries):
+                try:
+                    await asyncio.to_thread(
+                        self.sqs.change_message_visibility_batch,
+                        QueueUrl=sub.queue_url,
+                        Entries=chunk
+                    )
+                except Exception as e:
+                    logger.warning("Extending visibility on %s failed: %s", sub.queue_url, e)
+
+    async def _delete(self, messages: list[dict[str, Any]]):
+        entries = [
+            {"Id": str(i), "ReceiptHandle": message["ReceiptHandle"]}
+            for i, message in enumerate(messages)
+        ]
+        for chunk in _chunks(entries):
+            try:
+                response = await asyncio.to_thread(
+                    self.sqs.delete_message_batch,
+                    QueueUrl=self.subscription.queue_url,
+                    Entries=chunk
+                )
+            except Exception as e:
+                logger.error("Deleting from %s failed: %s", self.subscription.queue_url, e)
+                continue
+            for failure in response.get("Failed", []):
+                logger.error(
+                    "Deleting message %s from %s failed: %s",
+                    failure.get('Id'), self.subscription.queue_url, failure.get('Message')
+                )
+
+def _to_record(message: dict[str, Any]) -> dict[str, Any]:
+    """Shape a ReceiveMessage message like the record Lambda would deliver.
+
+    JSON bodies are decoded so body-inspecting middleware sees the same
+    structure as on the HTTP routes; anything else is passed as a string.
+    """
+    body = message.get("Body", "")
+    try:
+        body = codec.loads(body)
+    except Exception:
+        pass
+    return {
+        "messageId": message["MessageId"],
+        "receiptHandle": message["ReceiptHandle"],
+        "body": body,
+        "attributes": message.get("Attributes", {}),
+        "messageAttributes": message.get("MessageAttributes", {}),
+        "md5OfBody": message.get("MD5OfBody"),
+        "eventSource": "aws:sqs",
+    }
+
+def _chunks(entries: list[dict[str, Any]]) -> list[list[dict[str, Any]]]:
+    return [entries[i:i + SQS_BATCH_LIMIT] for i in range(0, len(entries), SQS_BATCH_LIMIT)]
@@ -0,0 +1,169 @@
+"""Sampled request profiling, aggregated into flamegraph collapsed stacks.
+
+A profiled request turns on a sampler thread that records the event loop
+thread's Python stack every ``interval`` seconds until the request ends.
+Requests run interleaved on one loop, so per-request tracers such as
+cProfile would charge each request for its neighbours; the sampler does
+the same, but cheaply, and under load the loop's busy stacks are the hot
+path being diagnosed. Samples taken while the loop waits for I/O are
+not recorded: for asyncio's own loops that is while it is in its
+selector, and for loops written in C, such as the uvloop that uvicorn
+picks when installed, while no Python code runs above the frame that
+started the loop.
+
+Requests are profiled when the ``X-Shim-Profile`` header asks for it, or
+at random with probability ``sample_rate``. The aggregate is served by
+``GET /admin/profile`` in the collapsed format read by flamegraph.pl and
+speedscope.
+"""
+import inspect
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from types import FrameType
+from typing import Any, AsyncIterator, Mapping
+
+PROFILE_HEADER = "X-Shim-Profile"
+
+DEFAULT_INTERVAL = 0.005
+DEFAULT_MAX_STACKS = 10_000
+MAX_DEPTH = 128
+# Bucket for new stacks once ``max_stacks`` distinct ones are recorded
+TRUNCATED = "[truncated]"
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    path = code.co_filename.replace(os.sep, "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+def _is_selecting(frame: FrameType) -> bool:
+    """Whether an asyncio loop is blocked in its selector waiting for I/O."""
+    return frame.f_code.co_name == "select" and frame.f_code.co_filename.endswith("selectors.py")
+
+def _loop_caller(frame: FrameType) -> FrameType | None:
+    """The frame below the outermost coroutine on ``frame``'s stack.
+
+    Loops implemented in C, such as uvloop, have no Python frames of their
+    own, so while they wait for I/O this frame is the loop thread's top one.
+    """
+    caller = None
+    while frame is not None:
+        if frame.f_code.co_flags & inspect.CO_COROUTINE:
+            caller = frame.f_back
+        frame = frame.f_back
+    return caller
+
+def collapse(frame: FrameType, max_depth: int = MAX_DEPTH) -> str:
+    """``frame``'s stack, outermost first, as one collapsed-stack line without the count."""
+    names = []
+    while frame is not None and len(names) < max_depth:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class Profiler:
+    """Samples the event loop thread while at least one profiled request is running."""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        sample_rate: float = 0.0,
+        interval: float = DEFAULT_INTERVAL,
+        allow_header: bool = True,
+        max_stacks: int = DEFAULT_MAX_STACKS
+    ):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.allow_header = allow_header
+        self.max_stacks = max_stacks
+        self.stacks: Counter[str] = Counter()
+        self.profiled_requests = 0
+        self._active = 0
+        self._loop_thread: int | None = None
+        self._loop_frame: FrameType | None = None
+        self._lock = threading.Lock()
+        self._wanted = threading.Event()
+        self._closed = False
+        self._sampler: threading.Thread | None = None
+
+    @classmethod
+    def from_settings(cls, settings: dict[str, Any]) -> "Profiler":
+        return cls(
+            enabled=settings.get('enabled', False),
+            sample_rate=settings.get('sample_rate', 0.0),
+            interval=settings.get('interval_ms', DEFAULT_INTERVAL * 1000) / 1000,
+            allow_header=settings.get('allow_header', True),
+            max_stacks=settings.get('max_stacks', DEFAULT_MAX_STACKS)
+        )
+
+    def wants(self, headers: Mapping[str, str]) -> bool:
+        if not self.enabled:
+            return False
+        if self.allow_header and headers.get(PROFILE_HEADER, "").lower() in ("1", "true"):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @asynccontextmanager
+    async def profile(self, headers: Mapping[str, str]) -> AsyncIterator[None]:
+        """Sample the loop for the duration of the block if this request is to be profiled."""
+        if not self.wants(headers):
+            yield
+            return
+
+        self._start()
+        self.profiled_requests += 1
+        self._active += 1
+        self._wanted.set()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            if self._active == 0:
+                self._wanted.clear()
+
+    def _start(self):
+        if self._sampler is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._loop_frame = _loop_caller(sys._getframe())
+        self._sampler = threading.Thread(target=self._sample, name="shim-profiler", daemon=True)
+        self._sampler.start()
+
+    def _sample(self):
+        while True:
+            self._wanted.wait()
+            if self._closed:
+                return
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None or not self._wanted.is_set() or self._is_idle(frame):
+                continue
+            stack = collapse(frame)
+            with self._lock:
+                if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+                    stack = TRUNCATED
+                self.stacks[stack] += 1
+
+    def _is_idle(self, frame: FrameType) -> bool:
+        return _is_selecting(frame) or frame is self._loop_frame
+
+    def collapsed(self) -> str:
+        """Every recorded stack with its sample count, one per line."""
+        with self._lock:
+            stacks = self.stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def reset(self):
+        with self._lock:
+            self.stacks = Counter()
+        self.profiled_requests = 0
+
+    def close(self):
+        """Stop the sampler thread."""
+        self._closed = True
+        self._wanted.set()
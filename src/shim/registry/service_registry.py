@@ -3,28 +3,48 @@ from typing import Optional
 from pydantic import BaseModel
 
 class ServiceEndpoint(BaseModel):
- namespace: str = "default"
- service_name: str
- port: int = 80
- path: str = "/"
+    namespace: str = "default"
+    service_name: str
+    port: int = 80
+    path: str = "/"
+    http2: bool = False
+    passthrough: bool = False
+    stream: bool = False
+    # Call ready pods from the service's EndpointSlices instead of its DNS name
+    discovery: bool = False
+    # Retries for connect errors and 502/503/504, within the shared retry budget
+    retries: int = 0
+    # Safe to send twice; required for hedging
+    idempotent: bool = False
+    # API Gateway calls slower than this latency percentile are hedged
+    hedge_percentile: float | None = None
+    # Seconds; None keeps the shared client's http.timeout
+    connect_timeout: float | None = None
+    read_timeout: float | None = None
+    # Whole call including retries, bounded further by the event's deadline
+    timeout: float | None = None
 
- @property
- def url(self) -> str:
- return f"http://{self.service_name}.{self.namespace}.svc.cluster.local:{self.port}{self.path}"
+    @property
+    def origin(self) -> str:
+        return f"http://{self.service_name}.{self.namespace}.svc.cluster.local:{self.port}"
+
+    @property
+    def url(self) -> str:
+        return f"{self.origin}{self.path}"
 
 class ServiceRegistry:
- def __init__(self):
- self._mappings: dict[str, ServiceEndpoint] = {}
+    def __init__(self):
+        self._mappings: dict[str, ServiceEndpoint] = {}
 
- def register(self, function_name: str, endpoint: ServiceEndpoint):
- self._mappings[function_name] = endpoint
+    def register(self, function_name: str, endpoint: ServiceEndpoint):
+        self._mappings[function_name] = endpoint
 
- def lookup(self, function_name: str) -> Optional[ServiceEndpoint]:
- return self._mappings.get(function_name)
+    def lookup(self, function_name: str) -> Optional[ServiceEndpoint]:
+        return self._mappings.get(function_name)
 
- def load_from_config(self, config: dict[str, dict]):
- for func_name, endpoint_config in config.items():
- self.register(
- func_name,
- ServiceEndpoint(**endpoint_config)
- )
+    def load_from_config(self, config: dict[str, dict]):
+        for func_name, endpoint_config in config.items():
+            self.register(
+                func_name,
+                ServiceEndpoint(**endpoint_config)
+            )
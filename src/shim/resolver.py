@@ -0,0 +1,123 @@
+"""In-process DNS cache for upstream service hostnames.
+
+With the usual Kubernetes ``ndots:5`` resolv.conf, every lookup of
+``<svc>.<ns>.svc.cluster.local`` first walks the search domains and fails
+several times. The cache resolves each name once as a fully qualified
+name, keeps the answer for its TTL, and refreshes it in the background
+before it expires, so new connections rarely wait on DNS.
+"""
+import asyncio
+import logging
+import socket
+import time
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# CoreDNS's kubernetes plugin answers with a 5s TTL by default
+DEFAULT_TTL = 5.0
+# Refresh in the background once this fraction of the TTL has passed
+DEFAULT_REFRESH_RATIO = 0.75
+# Serve the last answer this long past its TTL while DNS is failing
+DEFAULT_STALE_TTL = 30.0
+
+# Resolves a hostname to its addresses and their TTL in seconds (None: default TTL)
+Resolve = Callable[[str], Awaitable[tuple[list[str], float | None]]]
+
+async def getaddrinfo_resolve(host: str) -> tuple[list[str], float | None]:
+    """Resolve ``host`` through the system resolver, skipping the search domains.
+
+    getaddrinfo does not report TTLs, so the cache's default TTL applies.
+    """
+    fqdn = host if host.endswith(".") else f"{host}."
+    infos = await asyncio.get_running_loop().getaddrinfo(fqdn, None, type=socket.SOCK_STREAM)
+    return list(dict.fromkeys(info[4][0] for info in infos)), None
+
+class _Entry:
+    def __init__(self, addresses: list[str], resolved_at: float, ttl: float):
+        self.addresses = addresses
+        self.resolved_at = resolved_at
+        self.ttl = ttl
+        self.next = 0
+
+class DNSCache:
+    """Resolved addresses per hostname, honouring TTLs with refresh-ahead.
+
+    Concurrent lookups of the same name share one resolution. When a
+    refresh fails the previous addresses are served for up to
+    ``stale_ttl`` seconds past their expiry.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        refresh_ratio: float = DEFAULT_REFRESH_RATIO,
+        stale_ttl: float = DEFAULT_STALE_TTL,
+        resolve: Resolve = getaddrinfo_resolve,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.ttl = ttl
+        self.refresh_ratio = refresh_ratio
+        self.stale_ttl = stale_ttl
+        self.resolve = resolve
+        self.clock = clock
+        self._entries: dict[str, _Entry] = {}
+        self._pending: dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def from_settings(cls, settings: dict[str, Any]) -> "DNSCache":
+        return cls(
+            ttl=settings.get('ttl', DEFAULT_TTL),
+            refresh_ratio=settings.get('refresh_ratio', DEFAULT_REFRESH_RATIO),
+            stale_ttl=settings.get('stale_ttl', DEFAULT_STALE_TTL)
+        )
+
+    async def lookup(self, host: str) -> str:
+        """One address for ``host``, rotating through the answer on each lookup."""
+        entry = self._entries.get(host)
+        now = self.clock()
+        if entry is None or now >= entry.resolved_at + entry.ttl:
+            try:
+                # Shielded so a cancelled caller does not cancel the shared lookup
+                entry = await asyncio.shield(self._resolution(host))
+            except Exception:
+                if entry is None or now >= entry.resolved_at + entry.ttl + self.stale_ttl:
+                    raise
+                logger.warning("DNS lookup of %s failed, using the last answer", host)
+        elif now >= entry.resolved_at + entry.ttl * self.refresh_ratio:
+            # Refresh ahead of expiry; this lookup still uses the cached answer
+            self._resolution(host)
+
+        address = entry.addresses[entry.next % len(entry.addresses)]
+        entry.next += 1
+        return address
+
+    def _resolution(self, host: str) -> "asyncio.Task[_Entry]":
+        task = self._pending.get(host)
+        if task is None:
+            task = self._pending[host] = asyncio.create_task(self._resolve(host))
+            # Background refreshes are never awaited; their errors are logged
+            task.add_done_callback(self._finished(host))
+        return task
+
+    def _finished(self, host: str) -> Callable[["asyncio.Task[_Entry]"], None]:
+        def finished(task: "asyncio.Task[_Entry]"):
+            self._pending.pop(host, None)
+            if not task.cancelled() and task.exception() is not None:
+                logger.debug("DNS refresh of %s failed: %s", host, task.exception())
+        return finished
+
+    async def _resolve(self, host: str) -> _Entry:
+        addresses, ttl = await self.resolve(host)
+        if not addresses:
+            raise OSError(f"No addresses for {host}")
+        entry = _Entry(addresses, self.clock(), self.ttl if ttl is None else ttl)
+        self._entries[host] = entry
+        return entry
+
+    async def aclose(self):
+        """Cancel refreshes still in flight."""
+        tasks = list(self._pending.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
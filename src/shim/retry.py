@@ -0,0 +1,95 @@
+"""Retry backoff and the process-wide retry budget for upstream calls."""
+import random
+import time
+from typing import Any, Callable
+
+import httpx
+
+DEFAULT_BASE_DELAY = 0.05
+DEFAULT_MAX_DELAY = 1.0
+DEFAULT_BUDGET_RATIO = 0.1
+DEFAULT_MIN_RETRIES_PER_SECOND = 5.0
+DEFAULT_MAX_TOKENS = 100.0
+
+# Statuses a proxy or a restarting pod returns before the service has acted
+RETRYABLE_STATUSES = {502, 503, 504}
+
+def is_retryable(response: httpx.Response | None = None, error: BaseException | None = None) -> bool:
+    """Whether an attempt failed in a way that is safe to repeat."""
+    if error is not None:
+        # The connection was never made, so the service never saw the request
+        return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+    return response is not None and response.status_code in RETRYABLE_STATUSES
+
+class RetryBudget:
+    """Token bucket that caps retries to a fraction of overall traffic.
+
+    Every first attempt deposits ``ratio`` tokens and every retry spends
+    one, so retries add at most ``ratio`` extra load while the upstream is
+    failing. ``min_retries_per_second`` tokens are added over time so that
+    low-traffic functions can still retry.
+    """
+
+    def __init__(
+        self,
+        ratio: float = DEFAULT_BUDGET_RATIO,
+        min_retries_per_second: float = DEFAULT_MIN_RETRIES_PER_SECOND,
+        max_tokens: float = DEFAULT_MAX_TOKENS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.max_tokens = max_tokens
+        self.clock = clock
+        self.tokens = min(max_tokens, min_retries_per_second)
+        self._refilled_at = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(
+            self.max_tokens,
+            self.tokens + (now - self._refilled_at) * self.min_retries_per_second
+        )
+        self._refilled_at = now
+
+    def record_request(self):
+        self._refill()
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, shared by every function."""
+
+    def __init__(
+        self,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        budget: RetryBudget | None = None
+    ):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+
+    @classmethod
+    def from_settings(cls, settings: dict[str, Any]) -> "RetryPolicy":
+        return cls(
+            base_delay=settings.get('base_delay', DEFAULT_BASE_DELAY),
+            max_delay=settings.get('max_delay', DEFAULT_MAX_DELAY),
+            budget=RetryBudget(
+                ratio=settings.get('budget_ratio', DEFAULT_BUDGET_RATIO),
+                min_retries_per_second=settings.get(
+                    'min_retries_per_second', DEFAULT_MIN_RETRIES_PER_SECOND
+                ),
+                max_tokens=settings.get('max_budget_tokens', DEFAULT_MAX_TOKENS)
+            )
+        )
+
+    def backoff(self, retry: int) -> float:
+        """Delay before the ``retry``-th retry (0-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
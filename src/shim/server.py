@@ -1,162 +1,449 @@
 """FastAPI server for K8s Lambda Shim."""
-from fastapi import FastAPI, HTTPException, Request
-from typing import Any, Dict
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.requests import ClientDisconnect
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict
+import httpx
 import logging
 
-from .events.dispatcher import EventDispatcher, Event, EventType
-from .registry.service_registry import ServiceRegistry, ServiceEndpoint
-from .middleware.base import MiddlewareChain
-from .middleware.common import LoggingMiddleware, ValidationMiddleware
-from .handlers import (
- APIGatewayHandler,
- EventBridgeHandler,
- SQSHandler,
- DirectInvokeHandler
-)
+from . import codec, deadline, factory, metrics
+from .deadline import DeadlineExceeded
+from .errors import UpstreamUnavailable
+from .events import classifier
+from .events.dispatcher import Event, EventType
+from .registry.service_registry import ServiceRegistry
+from .middleware.base import HandlerFunc, stage_timings
+from .profiling import Profiler
+from .handlers import APIGatewayHandler, StreamingHandler
+from .transport import create_http_client
 
 logger = logging.getLogger(__name__)
 
-def create_app(config: Dict[str, Any]) -> FastAPI:
- """Create and configure FastAPI application."""
- app = FastAPI(
- title="K8s Lambda Shim",
- description="Event dispatcher for routing AWS Lambda events to Kubernetes services",
- version="0.1.0"
- )
-
- # Setup service registry
- registry = ServiceRegistry()
- for svc in config.get('services', []):
- registry.register(
- svc['name'],
- ServiceEndpoint(
- namespace=svc['namespace'],
- service_name=svc['service_name'],
- port=svc['port'],
- path=svc.get('path', '/')
- )
- )
- logger.info(f"Registered service: {svc['name']}")
-
- # Setup event dispatcher
- dispatcher = EventDispatcher()
- dispatcher.register_handler(EventType.API_GATEWAY, APIGatewayHandler(registry))
- dispatcher.register_handler(EventType.EVENTBRIDGE, EventBridgeHandler(registry))
- dispatcher.register_handler(EventType.SQS, SQSHandler(registry))
- dispatcher.register_handler(EventType.DIRECT_INVOKE, DirectInvokeHandler(registry))
-
- # Setup middleware
- middleware = MiddlewareChain([
- LoggingMiddleware(),
- ValidationMiddleware(),
- ])
-
- @app.get("/health")
- async def health():
- """Health check endpoint."""
- return {"status": "healthy", "services": len(config.get('services', []))}
-
- @app.post("/invoke/{function_name}")
- async def invoke_function(function_name: str, request: Request):
- """Invoke a function by name."""
- try:
- body = await request.json()
-
- # Detect event type from payload structure
- event_type = _detect_event_type(body)
-
- event = Event(
- event_type=event_type,
- function_name=function_name,
- payload=body,
- context={}
- )
-
- async def final_handler(evt: Event):
- return await dispatcher.dispatch(evt)
-
- result = await middleware.execute(event, final_handler)
- return result
-
- except ValueError as e:
- raise HTTPException(status_code=404, detail=str(e))
- except Exception as e:
- logger.error(f"Error invoking {function_name}: {e}")
- raise HTTPException(status_code=500, detail=str(e))
-
- @app.post("/sqs/{function_name}")
- async def sqs_event(function_name: str, request: Request):
- """Handle SQS events."""
- return await _handle_event(function_name, EventType.SQS, request, dispatcher, middleware)
-
- @app.post("/eventbridge/{function_name}")
- async def eventbridge_event(function_name: str, request: Request):
- """Handle EventBridge events."""
- return await _handle_event(function_name, EventType.EVENTBRIDGE, request, dispatcher, middleware)
-
- @app.post("/api-gateway/{function_name}")
- async def api_gateway_event(function_name: str, request: Request):
- """Handle API Gateway events."""
- return await _handle_event(function_name, EventType.API_GATEWAY, request, dispatcher, middleware)
-
- @app.get("/services")
- async def list_services():
- """List all registered services."""
- services = []
- for name, endpoint in registry._mappings.items():
- services.append({
- "name": name,
- "namespace": endpoint.namespace,
- "service_name": endpoint.service_name,
- "port": endpoint.port,
- "path": endpoint.path,
- "url": endpoint.url
- })
- return {"services": services}
-
- return app
+# Routes whose replies may be streamed for services with ``stream: true``
+STREAMABLE_EVENT_TYPES = {EventType.DIRECT_INVOKE, EventType.API_GATEWAY, EventType.ALB}
+
+Responder = Callable[[Event], Awaitable[Response]]
+
+NDJSON_MEDIA_TYPES = {"application/x-ndjson", "application/jsonl"}
+
+class CodecJSONResponse(JSONResponse):
+    """JSON response rendered with the configured fast codec."""
+
+    def render(self, content: Any) -> bytes:
+        return codec.dumps(content)
+
+class ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that closes its body iterator even when sending fails.
+
+    Starlette abandons the iterator mid-stream when the client disconnects,
+    leaving any ``finally`` in it to the garbage collector.
+    """
+
+    async def stream_response(self, send) -> None:
+        try:
+            await super().stream_response(send)
+        finally:
+            await self.body_iterator.aclose()
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body generator may still be reading the request.
+
+    The stock response listens for disconnects on ``receive`` under older
+    ASGI servers, which would swallow request body messages. A disconnect
+    surfaces here as a failed ``send`` instead.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        finally:
+            await self.body_iterator.aclose()
+        if self.background is not None:
+            await self.background()
+
+def create_app(
+    config: Dict[str, Any],
+    upstream_transport: httpx.AsyncBaseTransport | None = None
+) -> FastAPI:
+    """Create and configure FastAPI application.
+
+    ``upstream_transport`` stands in for the upstream connection pools, as
+    the benchmarks do with a fake upstream.
+    """
+    codec.use_codec(config.get('json', {}).get('codec'))
+
+    registry = factory.build_registry(config)
+    for name in registry._mappings:
+        logger.info("Registered service: %s", name)
+
+    discovery = factory.build_discovery(config, registry)
+
+    # One connection pool shared by every handler, closed on shutdown
+    client = create_http_client(
+        config.get('http', {}),
+        http2_origins=factory.http2_origins(registry),
+        endpoint_sets=discovery.endpoint_sets if discovery else None,
+        transport=upstream_transport
+    )
+
+    metrics.POOLS.track(client)
+    profiler = Profiler.from_settings(config.get('profiling', {}))
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if discovery:
+            discovery.start()
+        try:
+            yield
+        finally:
+            if discovery:
+                await discovery.stop()
+            metrics.POOLS.untrack(client)
+            profiler.close()
+            await client.aclose()
+
+    app = FastAPI(
+        title="K8s Lambda Shim",
+        description="Event dispatcher for routing AWS Lambda events to Kubernetes services",
+        version="0.1.0",
+        lifespan=lifespan,
+        default_response_class=CodecJSONResponse
+    )
+
+    dispatcher = factory.build_dispatcher(config, registry, client)
+
+    # Middleware compiled once around the dispatcher
+    middleware = factory.build_middleware(config)
+    handle = metrics.instrument(middleware, dispatcher.dispatch, registry)
+    handle_stream = metrics.instrument(middleware, StreamingHandler(registry, client).handle, registry)
+    batch_concurrency = config.get('batch', {}).get('max_concurrency', 50)
+
+    async def respond(event: Event) -> Response:
+        with stage_timings() as timings:
+            response = await reply(event)
+        if timings:
+            response.headers["Server-Timing"] = _server_timing(timings)
+        return response
+
+    async def reply(event: Event) -> Response:
+        if event.raw_payload is not None:
+            return _stream_response(await handle_stream(event))
+
+        endpoint = registry.lookup(event.function_name)
+        if endpoint and endpoint.stream and event.event_type in STREAMABLE_EVENT_TYPES:
+            upstream = await handle_stream(event)
+            chunks = upstream.aiter_bytes()
+            if event.event_type in (EventType.API_GATEWAY, EventType.ALB):
+                chunks = APIGatewayHandler.wrap_stream(chunks)
+            return _stream_response(upstream, chunks)
+
+        return CodecJSONResponse(await handle(event))
+
+    @app.get("/health")
+    async def health():
+        """Health check endpoint."""
+        return {"status": "healthy", "services": len(config.get('services', []))}
+
+    @app.get("/metrics")
+    async def prometheus_metrics():
+        """Prometheus metrics in the text exposition format."""
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+    @app.get("/admin/profile", response_class=PlainTextResponse)
+    async def get_profile():
+        """Collapsed stacks sampled from profiled requests, for flamegraph tools."""
+        if not profiler.enabled:
+            raise HTTPException(status_code=404, detail="Profiling is disabled")
+        return PlainTextResponse(
+            profiler.collapsed(),
+            headers={"X-Profiled-Requests": str(profiler.profiled_requests)}
+        )
+
+    @app.delete("/admin/profile")
+    async def reset_profile():
+        """Discard the samples collected so far."""
+        if not profiler.enabled:
+            raise HTTPException(status_code=404, detail="Profiling is disabled")
+        profiler.reset()
+        return {"status": "reset"}
+
+    @app.post("/invoke/{function_name}")
+    async def invoke_function(function_name: str, request: Request):
+        """Invoke a function by name."""
+        try:
+            async with profiler.profile(request.headers):
+                # Event type is detected from the payload structure
+                event = await _read_event(function_name, None, request, registry)
+                return await respond(event)
+
+        except UpstreamUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except (DeadlineExceeded, httpx.TimeoutException) as e:
+            raise HTTPException(status_code=504, detail=str(e) or "Upstream timed out")
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except Exception as e:
+            logger.error("Error invoking %s: %s", function_name, e)
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.post("/sqs/{function_name}")
+    async def sqs_event(function_name: str, request: Request):
+        """Handle SQS events."""
+        return await _handle_event(function_name, EventType.SQS, request, registry, respond, profiler)
+
+    @app.post("/eventbridge/{function_name}")
+    async def eventbridge_event(function_name: str, request: Request):
+        """Handle EventBridge events."""
+        return await _handle_event(function_name, EventType.EVENTBRIDGE, request, registry, respond, profiler)
+
+    @app.post("/api-gateway/{function_name}")
+    async def api_gateway_event(function_name: str, request: Request):
+        """Handle API Gateway events."""
+        return await _handle_event(function_name, EventType.API_GATEWAY, request, registry, respond, profiler)
+
+    @app.post("/batch/invoke")
+    async def batch_invoke(request: Request):
+        """Invoke many functions from one request.
+
+        Accepts a JSON array, or NDJSON, of ``{"function_name", "payload"}``
+        entries and returns one result per entry in request order.
+        """
+        body = await request.body()
+        try:
+            if request.headers.get("content-type", "").split(";")[0] in NDJSON_MEDIA_TYPES:
+                entries = [codec.loads(line) for line in body.splitlines() if line.strip()]
+            else:
+                entries = codec.loads(body)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid batch body: {e}")
+        if not isinstance(entries, list):
+            raise HTTPException(status_code=400, detail="Batch body must be a list of entries")
+
+        semaphore = asyncio.Semaphore(batch_concurrency)
+        context = deadline.from_headers(request.headers)
+
+        async def bounded(entry: Any) -> Dict[str, Any]:
+            async with semaphore:
+                return await _invoke_entry(entry, handle, context)
+
+        results = await asyncio.gather(*(bounded(entry) for entry in entries))
+        return CodecJSONResponse({"results": results})
+
+    @app.post("/stream/{function_name}")
+    async def stream_events(function_name: str, request: Request):
+        """Invoke a function once per NDJSON line, streaming results as they finish.
+
+        Each result line carries the zero-based ``index`` of its input line.
+        """
+        return DuplexStreamingResponse(
+            _stream_entries(function_name, request, handle, batch_concurrency),
+            media_type="application/x-ndjson"
+        )
+
+    @app.get("/services")
+    async def list_services():
+        """List all registered services."""
+        services = []
+        for name, endpoint in registry._mappings.items():
+            services.append({
+                "name": name,
+                "namespace": endpoint.namespace,
+                "service_name": endpoint.service_name,
+                "port": endpoint.port,
+                "path": endpoint.path,
+                "http2": endpoint.http2,
+                "passthrough": endpoint.passthrough,
+                "stream": endpoint.stream,
+                "discovery": endpoint.discovery,
+                "retries": endpoint.retries,
+                "idempotent": endpoint.idempotent,
+                "hedge_percentile": endpoint.hedge_percentile,
+                "connect_timeout": endpoint.connect_timeout,
+                "read_timeout": endpoint.read_timeout,
+                "timeout": endpoint.timeout,
+                "url": endpoint.url
+            })
+        return {"services": services}
+
+    return app
 
 async def _handle_event(
- function_name: str,
- event_type: EventType,
- request: Request,
- dispatcher: EventDispatcher,
- middleware: MiddlewareChain
+    function_name: str,
+    event_type: EventType,
+    request: Request,
+    registry: ServiceRegistry,
+    respond: Responder,
+    profiler: Profiler
+) -> Response:
+    """Handle an event of a specific type."""
+    try:
+        async with profiler.profile(request.headers):
+            event = await _read_event(function_name, event_type, request, registry)
+            return await respond(event)
+
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except (DeadlineExceeded, httpx.TimeoutException) as e:
+        raise HTTPException(status_code=504, detail=str(e) or "Upstream timed out")
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error("Error handling %s event: %s", event_type.value, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _invoke_entry(
+    entry: Any,
+    handle: HandlerFunc,
+    context: Dict[str, Any] | None = None
 ) -> Dict[str, Any]:
- """Handle an event of a specific type."""
- try:
- body = await request.json()
-
- event = Event(
- event_type=event_type,
- function_name=function_name,
- payload=body,
- context={}
- )
-
- async def final_handler(evt: Event):
- return await dispatcher.dispatch(evt)
-
- return await middleware.execute(event, final_handler)
-
- except ValueError as e:
- raise HTTPException(status_code=404, detail=str(e))
- except Exception as e:
- logger.error(f"Error handling {event_type.value} event: {e}")
- raise HTTPException(status_code=500, detail=str(e))
-
-def _detect_event_type(payload: Dict[str, Any]) -> EventType:
- """Detect AWS event type from payload structure."""
- if "Records" in payload:
- if payload["Records"] and "eventSource" in payload["Records"][0]:
- source = payload["Records"][0]["eventSource"]
- if source == "aws:sqs":
- return EventType.SQS
-
- if "detail-type" in payload and "source" in payload:
- return EventType.EVENTBRIDGE
-
- if "httpMethod" in payload or "requestContext" in payload:
- return EventType.API_GATEWAY
-
- return EventType.DIRECT_INVOKE
+    """Run one batch entry through the middleware chain and dispatcher.
+
+    Errors are reported in the entry's result with the status code the
+    single-event routes would have used. ``context`` carries the request's
+    deadline, shared by every entry.
+    """
+    if not isinstance(entry, dict) or "function_name" not in entry:
+        return {"status": 400, "error": "Entry must have function_name and payload"}
+
+    function_name = entry["function_name"]
+    if not isinstance(function_name, str):
+        return {"status": 400, "error": "function_name must be a string"}
+    payload = entry.get("payload", {})
+    if not isinstance(payload, dict):
+        return {"function_name": function_name, "status": 400, "error": "payload must be an object"}
+    try:
+        event = Event(
+            event_type=classifier.classify(payload),
+            function_name=function_name,
+            payload=payload,
+            context=dict(context or {})
+        )
+        result = await handle(event)
+        return {"function_name": function_name, "status": 200, "result": result}
+
+    except UpstreamUnavailable as e:
+        return {"function_name": function_name, "status": 503, "error": str(e)}
+    except (DeadlineExceeded, httpx.TimeoutException) as e:
+        return {"function_name": function_name, "status": 504, "error": str(e) or "Upstream timed out"}
+    except ValueError as e:
+        return {"function_name": function_name, "status": 404, "error": str(e)}
+    except Exception as e:
+        logger.error("Error invoking %s in batch: %s", function_name, e)
+        return {"function_name": function_name, "status": 500, "error": str(e)}
+
+async def _stream_entries(
+    function_name: str,
+    request: Request,
+    handle: HandlerFunc,
+    concurrency: int
+) -> AsyncIterator[bytes]:
+    """Read NDJSON events from the request body and yield results in completion order.
+
+    The body is consumed incrementally and reading pauses while
+    ``concurrency`` events are in flight, so memory stays flat however long
+    the stream is.
+    """
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks: set[asyncio.Task] = set()
+    context = deadline.from_headers(request.headers)
+
+    async def run(index: int, line: bytes):
+        try:
+            try:
+                payload = codec.loads(line)
+            except Exception as e:
+                result = {"status": 400, "error": f"Invalid JSON: {e}"}
+            else:
+                entry = {"function_name": function_name, "payload": payload}
+                result = await _invoke_entry(entry, handle, context)
+            await results.put({"index": index, **result})
+        finally:
+            semaphore.release()
+
+    async def spawn(index: int, line: bytes):
+        await semaphore.acquire()
+        task = asyncio.create_task(run(index, line))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    async def read():
+        index = 0
+        buffer = b""
+        try:
+            async for chunk in request.stream():
+                *lines, buffer = (buffer + chunk).split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        await spawn(index, line)
+                        index += 1
+            if buffer.strip():
+                await spawn(index, buffer)
+        except Exception as e:
+            logger.error("Error reading event stream for %s: %s", function_name, e)
+            await results.put({"status": 500, "error": f"Error reading event stream: {e}"})
+        await asyncio.gather(*tasks)
+        await results.put(None)
+
+    reader = asyncio.create_task(read())
+    try:
+        while (item := await results.get()) is not None:
+            yield codec.dumps(item) + b"\n"
+    finally:
+        reader.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+async def _read_event(
+    function_name: str,
+    event_type: EventType | None,
+    request: Request,
+    registry: ServiceRegistry
+) -> Event:
+    """Build the ingress event, leaving the body undecoded for passthrough functions."""
+    endpoint = registry.lookup(function_name)
+    if endpoint and endpoint.passthrough:
+        body = await request.body()
+        return Event(
+            event_type=event_type or classifier.peek(body),
+            function_name=function_name,
+            payload={},
+            raw_payload=body,
+            context=deadline.from_headers(request.headers)
+        )
+
+    body = codec.loads(await request.body())
+    return Event(
+        event_type=event_type or classifier.classify(body),
+        function_name=function_name,
+        payload=body,
+        context=deadline.from_headers(request.headers)
+    )
+
+def _server_timing(timings: Dict[str, float]) -> str:
+    """``Server-Timing`` header value with each middleware's self-time in milliseconds."""
+    return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items())
+
+def _stream_response(
+    upstream: httpx.Response,
+    chunks: AsyncIterator[bytes] | None = None
+) -> StreamingResponse:
+    """Relay an unread upstream response body chunk by chunk, closing it afterwards."""
+    async def relay() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in (chunks if chunks is not None else upstream.aiter_bytes()):
+                yield chunk
+        finally:
+            # Returns the connection (and its per-host slot) to the pool
+            await upstream.aclose()
+
+    return ClosingStreamingResponse(
+        relay(),
+        status_code=upstream.status_code,
+        media_type=upstream.headers.get("content-type", "application/json")
+    )
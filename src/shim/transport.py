@@ -0,0 +1,383 @@
+"""Shared HTTP client and connection pool for upstream K8s service calls."""
+import asyncio
+import ipaddress
+import time
+from typing import Any, Callable, Iterable, Mapping
+
+import httpx
+
+from .breaker import CircuitBreaker
+from .discovery import EndpointSet
+from .limiter import AdaptiveLimiter, signals_overload
+from .metrics import MetricsTransport
+from .resolver import DNSCache
+from .retry import RetryPolicy, is_retryable
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 5.0
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response stream that releases a per-host slot once the body is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+class CachedDNSTransport(httpx.AsyncBaseTransport):
+    """Connects to addresses from a ``DNSCache`` instead of resolving per connection.
+
+    The request keeps its ``Host`` header, and HTTPS requests their SNI
+    name, so only the address connected to changes.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, cache: DNSCache):
+        self._transport = transport
+        self.cache = cache
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        if _is_ip(host):
+            return await self._transport.handle_async_request(request)
+
+        try:
+            address = await self.cache.lookup(host)
+        except OSError as e:
+            raise httpx.ConnectError(f"DNS lookup of {host} failed: {e}", request=request) from e
+
+        extensions = dict(request.extensions)
+        if request.url.scheme == "https":
+            extensions.setdefault("sni_hostname", host)
+        resolved = httpx.Request(
+            request.method,
+            request.url.copy_with(host=address),
+            headers=request.headers,
+            stream=request.stream,
+            extensions=extensions
+        )
+        return await self._transport.handle_async_request(resolved)
+
+    async def aclose(self):
+        await self.cache.aclose()
+        await self._transport.aclose()
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """Caps concurrent requests per upstream host on top of the pool-wide limit."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_connections_per_host: int):
+        self._transport = transport
+        self.max_connections_per_host = max_connections_per_host
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_connections_per_host)
+            self._semaphores[host] = semaphore
+        return semaphore
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        semaphore = self._semaphore(request.url.netloc.decode("ascii"))
+        await semaphore.acquire()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            semaphore.release()
+            raise
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, semaphore.release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+class DiscoveryTransport(httpx.AsyncBaseTransport):
+    """Sends requests for discovered services straight to a ready pod.
+
+    ``endpoint_sets`` maps a service's host and port to its ready pods. A
+    request to a service without known pods goes to its DNS name as usual.
+    The pod's outstanding count is held until the response body is closed.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, endpoint_sets: Mapping[str, EndpointSet]):
+        self._transport = transport
+        self.endpoint_sets = endpoint_sets
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint_set = self.endpoint_sets.get(request.url.netloc.decode("ascii"))
+        address = endpoint_set.pick() if endpoint_set is not None else None
+        if address is None:
+            return await self._transport.handle_async_request(request)
+
+        host, port = address.rsplit(":", 1)
+        # A new request, so a retry of the original picks a pod afresh; the
+        # Host header still names the service
+        pod_request = httpx.Request(
+            request.method,
+            request.url.copy_with(host=host, port=int(port)),
+            headers=request.headers,
+            stream=request.stream,
+            extensions=request.extensions
+        )
+        endpoint_set.acquire(address)
+        try:
+            response = await self._transport.handle_async_request(pod_request)
+        except BaseException:
+            endpoint_set.release(address)
+            raise
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, lambda: endpoint_set.release(address)),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+class AdaptiveLimitTransport(httpx.AsyncBaseTransport):
+    """Applies an ``AdaptiveLimiter`` per upstream service (host and port).
+
+    A slot is held until the response body is closed; the latency sample
+    is taken when the response headers arrive.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, settings: dict[str, Any] | None = None):
+        self._transport = transport
+        self.settings = settings or {}
+        self.limiters: dict[str, AdaptiveLimiter] = {}
+
+    def limiter(self, host: str) -> AdaptiveLimiter:
+        limiter = self.limiters.get(host)
+        if limiter is None:
+            limiter = AdaptiveLimiter.from_settings(self.settings)
+            self.limiters[host] = limiter
+        return limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        limiter = self.limiter(request.url.netloc.decode("ascii"))
+        await limiter.acquire()
+        start = time.monotonic()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except asyncio.CancelledError:
+            limiter.release()
+            raise
+        except BaseException as e:
+            limiter.release(time.monotonic() - start, dropped=signals_overload(error=e))
+            raise
+
+        latency = time.monotonic() - start
+        dropped = signals_overload(response)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, lambda: limiter.release(latency, dropped)),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+class CircuitBreakerTransport(httpx.AsyncBaseTransport):
+    """Applies a ``CircuitBreaker`` per upstream service (host and port).
+
+    5xx responses, timeouts and network errors count as failures; the
+    outcome is recorded as soon as the response headers arrive.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, settings: dict[str, Any] | None = None):
+        self._transport = transport
+        self.settings = settings or {}
+        self.breakers: dict[str, CircuitBreaker] = {}
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker.from_settings(self.settings)
+            self.breakers[host] = breaker
+        return breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        breaker = self.breaker(request.url.netloc.decode("ascii"))
+        breaker.before_call()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except asyncio.CancelledError:
+            breaker.record_abandoned()
+            raise
+        except BaseException as e:
+            if signals_overload(error=e):
+                breaker.record_failure()
+            else:
+                breaker.record_abandoned()
+            raise
+
+        if signals_overload(response):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+class RetryTransport(httpx.AsyncBaseTransport):
+    """Retries requests that set the ``retries`` request extension.
+
+    Only connect failures and 502/503/504 responses are retried, with
+    backoff, and only while the shared ``RetryBudget`` has tokens.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, policy: RetryPolicy | None = None):
+        self._transport = transport
+        self.policy = policy or RetryPolicy()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        budget = self.policy.budget
+        budget.record_request()
+        retries = request.extensions.get("retries", 0)
+
+        attempt = 0
+        while True:
+            try:
+                response = await self._transport.handle_async_request(request)
+            except Exception as e:
+                if attempt >= retries or not is_retryable(error=e) or not budget.try_spend():
+                    raise
+            else:
+                if attempt >= retries or not is_retryable(response) or not budget.try_spend():
+                    return response
+                await response.aclose()
+            await asyncio.sleep(self.policy.backoff(attempt))
+            attempt += 1
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+def pool_limits(settings: dict[str, Any]) -> httpx.Limits:
+    """Connection pool limits from the ``http`` config section."""
+    return httpx.Limits(
+        max_connections=settings.get('max_connections', DEFAULT_MAX_CONNECTIONS),
+        max_keepalive_connections=settings.get(
+            'max_keepalive_connections', DEFAULT_MAX_KEEPALIVE_CONNECTIONS
+        ),
+        keepalive_expiry=settings.get('keepalive_expiry', DEFAULT_KEEPALIVE_EXPIRY),
+    )
+
+def _require_h2():
+    """Fail at startup rather than on the first HTTP/2 request, where httpx imports h2."""
+    try:
+        import h2.config  # noqa: F401
+    except ImportError:
+        raise ValueError(
+            "Services with http2: true need the h2 package; install k8s-lambda-shim[http2]"
+        ) from None
+
+def create_http_client(
+    settings: dict[str, Any] | None = None,
+    http2_origins: Iterable[str] = (),
+    endpoint_sets: Mapping[str, EndpointSet] | None = None,
+    transport: httpx.AsyncBaseTransport | None = None
+) -> httpx.AsyncClient:
+    """Build the AsyncClient shared by all handlers from the ``http`` config section.
+
+    Requests to ``http2_origins`` are routed through a dedicated transport that
+    speaks HTTP/2 with prior knowledge (h2c), so concurrent calls to the same
+    service multiplex over a single connection. An ``adaptive_concurrency``
+    subsection puts an ``AdaptiveLimiter`` in front of every service, and a
+    ``circuit_breaker`` subsection a ``CircuitBreaker`` in front of that.
+    Requests that set the ``retries`` extension are retried per the
+    ``retry`` subsection, each attempt passing through the breaker.
+    Services in ``endpoint_sets`` are called on their pod IPs directly, and
+    a ``dns_cache`` subsection resolves other hostnames through a ``DNSCache``.
+    A ``transport`` replaces the connection pools for every origin, under
+    the same wrappers; benchmarks use it to reach a fake upstream.
+    """
+    settings = settings or {}
+    limits = pool_limits(settings)
+    # Metrics innermost, so every attempt is timed on its own
+    mounts: dict[str, httpx.AsyncBaseTransport] = {}
+    if transport is not None:
+        transport = MetricsTransport(transport)
+    else:
+        http2_origins = set(http2_origins)
+        if http2_origins:
+            _require_h2()
+        transport = MetricsTransport(httpx.AsyncHTTPTransport(limits=limits))
+        mounts = {
+            origin: MetricsTransport(httpx.AsyncHTTPTransport(limits=limits, http1=False, http2=True))
+            for origin in http2_origins
+        }
+
+    dns_cache = settings.get('dns_cache')
+    if dns_cache is not None:
+        # Below the limits and breakers, so they still see service names
+        cache = DNSCache.from_settings(dns_cache)
+        transport = CachedDNSTransport(transport, cache)
+        mounts = {origin: CachedDNSTransport(mount, cache) for origin, mount in mounts.items()}
+
+    # Per-host limits exist to cap HTTP/1.1 connections; h2 streams share one
+    per_host = settings.get('max_connections_per_host')
+    if per_host:
+        transport = HostLimitedTransport(transport, per_host)
+
+    if endpoint_sets:
+        transport = DiscoveryTransport(transport, endpoint_sets)
+        mounts = {
+            origin: DiscoveryTransport(mount, endpoint_sets)
+            for origin, mount in mounts.items()
+        }
+
+    adaptive = settings.get('adaptive_concurrency')
+    if adaptive is not None:
+        transport = AdaptiveLimitTransport(transport, adaptive)
+        mounts = {
+            origin: AdaptiveLimitTransport(mount, adaptive)
+            for origin, mount in mounts.items()
+        }
+
+    breaker = settings.get('circuit_breaker')
+    if breaker is not None:
+        transport = CircuitBreakerTransport(transport, breaker)
+        mounts = {
+            origin: CircuitBreakerTransport(mount, breaker)
+            for origin, mount in mounts.items()
+        }
+
+    # One policy, and so one retry budget, for the whole client
+    retry = RetryPolicy.from_settings(settings.get('retry', {}))
+    transport = RetryTransport(transport, retry)
+    mounts = {origin: RetryTransport(mount, retry) for origin, mount in mounts.items()}
+
+    return httpx.AsyncClient(
+        transport=transport,
+        mounts=mounts,
+        timeout=settings.get('timeout', DEFAULT_TIMEOUT),
+    )
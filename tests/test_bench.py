@@ -0,0 +1,86 @@
+"""Tests for the in-process load generator."""
+import json
+import pytest
+from click.testing import CliRunner
+
+from shim import bench
+from shim.cli import cli
+from shim.events.classifier import classify
+from shim.events.dispatcher import EventType
+
+class TestEventMix:
+    def test_parses_weights(self):
+        assert bench.parse_mix("sqs=3, direct") == {"sqs": 3.0, "direct": 1.0}
+
+    def test_rejects_unknown_kind(self):
+        with pytest.raises(ValueError, match="Unknown event kind"):
+            bench.parse_mix("kinesis=1")
+
+    def test_rejects_all_zero_weights(self):
+        with pytest.raises(ValueError):
+            bench.parse_mix("sqs=0")
+
+    @pytest.mark.parametrize("kind, event_type", [
+        ("sqs", EventType.SQS),
+        ("eventbridge", EventType.EVENTBRIDGE),
+        ("api-gateway", EventType.API_GATEWAY),
+        ("direct", EventType.DIRECT_INVOKE),
+    ])
+    def test_sample_payloads_classify_as_their_kind(self, kind, event_type):
+        assert classify(bench.sample_payload(kind)) == event_type
+
+class TestBenchConfig:
+    def test_defaults_to_single_bench_service(self):
+        config = bench.bench_config(port=9000)
+
+        assert [svc["name"] for svc in config["services"]] == [bench.BENCH_FUNCTION]
+        assert config["services"][0]["port"] == 9000
+
+    def test_points_configured_services_at_stub(self):
+        original = {"services": [{"name": "a", "port": 8080, "discovery": True}]}
+
+        config = bench.bench_config(original, port=9000)
+
+        assert config["services"] == [{"name": "a", "port": 9000, "discovery": False}]
+        assert original["services"][0]["port"] == 8080
+
+class TestRunBenchmark:
+    @pytest.mark.asyncio
+    async def test_asgi_upstream(self):
+        result = await bench.run_benchmark(rps=100, duration=0.2, warmup=0)
+
+        assert result.requests == 20
+        assert result.errors == 0
+        assert 0 < result.p50_ms <= result.p95_ms <= result.p99_ms
+        assert result.cpu_ms_per_request > 0
+
+    @pytest.mark.asyncio
+    async def test_http_upstream(self):
+        result = await bench.run_benchmark(
+            upstream="http", rps=20, duration=0.25, warmup=0, mix={"eventbridge": 1.0}
+        )
+
+        assert result.requests == 5
+        assert result.errors == 0
+
+    @pytest.mark.asyncio
+    async def test_counts_errors(self):
+        # The function is not registered, so every request is a 404
+        result = await bench.run_benchmark(rps=100, duration=0.1, warmup=0, function="missing")
+
+        assert result.errors == result.requests == 10
+
+class TestBenchCommand:
+    def test_prints_json_result(self):
+        result = CliRunner().invoke(cli, [
+            "bench", "--rps", "50", "--duration", "0.1", "--warmup", "0", "--mix", "direct", "--json"
+        ])
+
+        assert result.exit_code == 0, result.output
+        assert json.loads(result.output)["requests"] == 5
+
+    def test_rejects_bad_mix(self):
+        result = CliRunner().invoke(cli, ["bench", "--mix", "kinesis=1"])
+
+        assert result.exit_code != 0
+        assert "Unknown event kind" in result.output
@@ -0,0 +1,123 @@
+"""Tests for the per-service circuit breaker."""
+import pytest
+import httpx
+
+from shim.breaker import CircuitBreaker, CircuitOpenError, CircuitState
+from shim.handlers import SQSHandler
+from shim.events.dispatcher import Event, EventType
+from shim.transport import CircuitBreakerTransport
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self, clock):
+        breaker = CircuitBreaker(failure_threshold=3, clock=clock)
+
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record_failure()
+
+        assert breaker.state is CircuitState.OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_success_resets_failure_count(self, clock):
+        breaker = CircuitBreaker(failure_threshold=2, clock=clock)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        assert breaker.state is CircuitState.CLOSED
+
+    def test_half_open_admits_one_trial_after_cooldown(self, clock):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+
+        clock.now = 10
+        breaker.before_call()
+
+        assert breaker.state is CircuitState.HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_trial_success_closes_circuit(self, clock):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+
+        breaker.before_call()
+        breaker.record_success()
+
+        assert breaker.state is CircuitState.CLOSED
+        breaker.before_call()
+
+    def test_trial_failure_reopens_circuit(self, clock):
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=10, clock=clock)
+        for _ in range(5):
+            breaker.record_failure()
+        clock.now = 10
+
+        breaker.before_call()
+        breaker.record_failure()
+
+        assert breaker.state is CircuitState.OPEN
+        assert breaker.opened_at == 10
+
+    def test_abandoned_trial_frees_its_slot(self, clock):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+
+        breaker.before_call()
+        breaker.record_abandoned()
+
+        breaker.before_call()
+
+class TestCircuitBreakerTransport:
+    @pytest.mark.asyncio
+    async def test_fails_fast_once_open(self):
+        calls = []
+
+        async def upstream(request):
+            calls.append(request)
+            raise httpx.ConnectError("refused")
+
+        transport = CircuitBreakerTransport(httpx.MockTransport(upstream), {"failure_threshold": 2})
+        async with httpx.AsyncClient(transport=transport) as client:
+            for _ in range(2):
+                with pytest.raises(httpx.ConnectError):
+                    await client.get("http://down.svc/")
+            with pytest.raises(CircuitOpenError):
+                await client.get("http://down.svc/")
+
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_client_errors_do_not_count(self):
+        async def upstream(request):
+            return httpx.Response(404)
+
+        transport = CircuitBreakerTransport(httpx.MockTransport(upstream), {"failure_threshold": 1})
+        async with httpx.AsyncClient(transport=transport) as client:
+            await client.get("http://a.svc/")
+
+        assert transport.breaker("a.svc").state is CircuitState.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_fails_sqs_records(self, service_registry):
+        async def upstream(request):
+            return httpx.Response(503)
+
+        transport = CircuitBreakerTransport(httpx.MockTransport(upstream), {"failure_threshold": 1})
+        event = Event(
+            event_type=EventType.SQS,
+            function_name="test-function",
+            payload={"Records": [{"messageId": "m1"}, {"messageId": "m2"}]}
+        )
+
+        async with httpx.AsyncClient(transport=transport) as client:
+            result = await SQSHandler(service_registry, client, batch_concurrency=1).handle(event)
+
+        assert result == {
+            "batchItemFailures": [{"itemIdentifier": "m1"}, {"itemIdentifier": "m2"}]
+        }
+        assert transport.breaker("test-service.test.svc.cluster.local:8080").state is CircuitState.OPEN
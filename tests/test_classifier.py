@@ -0,0 +1,45 @@
+"""Tests for event type classification."""
+import json
+import pytest
+
+from shim.events.classifier import classify, peek
+from shim.events.dispatcher import EventType
+
+EVENTS = [
+    ({"Records": [{"eventSource": "aws:sqs", "body": "{}"}]}, EventType.SQS),
+    ({"Records": [{"EventSource": "aws:sns", "Sns": {}}]}, EventType.SNS),
+    ({"Records": [{"eventSource": "aws:s3", "s3": {}}]}, EventType.S3),
+    ({"Records": [{"eventSource": "aws:kinesis", "kinesis": {}}]}, EventType.KINESIS),
+    ({"Records": [{"eventSource": "aws:dynamodb", "dynamodb": {}}]}, EventType.DYNAMODB),
+    ({"detail-type": "Shipment", "source": "asn", "detail": {}}, EventType.EVENTBRIDGE),
+    ({"httpMethod": "POST", "requestContext": {"accountId": "1"}}, EventType.API_GATEWAY),
+    ({"version": "2.0", "routeKey": "POST /asn", "requestContext": {"http": {}}}, EventType.API_GATEWAY),
+    ({"httpMethod": "GET", "requestContext": {"elb": {"targetGroupArn": "arn"}}}, EventType.ALB),
+    ({"custom": "data"}, EventType.DIRECT_INVOKE),
+]
+
+class TestClassify:
+    @pytest.mark.parametrize("raw_event,expected", EVENTS)
+    def test_classifies_event(self, raw_event, expected):
+        assert classify(raw_event) == expected
+
+    def test_empty_records_is_direct_invoke(self):
+        assert classify({"Records": []}) == EventType.DIRECT_INVOKE
+
+    @pytest.mark.parametrize("raw_event", [[{"Records": []}], "text", 1, None])
+    def test_non_object_is_direct_invoke(self, raw_event):
+        assert classify(raw_event) == EventType.DIRECT_INVOKE
+
+    def test_non_list_records_is_direct_invoke(self):
+        assert classify({"Records": {"a": 1}}) == EventType.DIRECT_INVOKE
+
+    def test_unknown_record_source_is_direct_invoke(self):
+        assert classify({"Records": [{"eventSource": "aws:ses"}]}) == EventType.DIRECT_INVOKE
+
+    def test_source_alone_is_direct_invoke(self):
+        assert classify({"source": "webhook", "data": 1}) == EventType.DIRECT_INVOKE
+
+class TestPeek:
+    @pytest.mark.parametrize("raw_event,expected", EVENTS)
+    def test_agrees_with_classify(self, raw_event, expected):
+        assert peek(json.dumps(raw_event).encode()) == expected
@@ -0,0 +1,34 @@
+"""Tests for the JSON codec selection."""
+import pytest
+
+from shim import codec
+
+class TestCodec:
+    def test_stdlib_codec_always_available(self):
+        json_codec = codec.get_codec("json")
+        assert json_codec.loads(json_codec.dumps({"a": [1, "é"]})) == {"a": [1, "é"]}
+
+    def test_stdlib_codec_is_compact(self):
+        assert codec.get_codec("json").dumps({"a": 1, "b": [1, 2]}) == b'{"a":1,"b":[1,2]}'
+
+    def test_default_is_stdlib(self):
+        assert codec.get_codec().name == "json"
+
+    def test_default_round_trips_integers_wider_than_64_bits(self):
+        default = codec.get_codec()
+        event = {"n": 123456789012345678901234567890}
+        assert default.loads(default.dumps(event)) == event
+        assert default.loads(b'{"n": 123456789012345678901234567890}') == event
+
+    def test_rejects_unavailable_codec(self):
+        with pytest.raises(ValueError, match="not available"):
+            codec.get_codec("simdjson")
+
+    def test_use_codec_switches_module_functions(self):
+        previous = codec._active
+        try:
+            codec.use_codec("json")
+            assert codec.dumps({"a": 1}) == b'{"a":1}'
+            assert codec.loads(b'{"a": 1}') == {"a": 1}
+        finally:
+            codec._active = previous
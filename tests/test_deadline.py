@@ -0,0 +1,102 @@
+"""Tests for per-function timeouts and deadline propagation."""
+import asyncio
+import pytest
+import httpx
+
+from shim import deadline
+from shim.deadline import DeadlineExceeded
+from shim.events.dispatcher import Event, EventType
+from shim.handlers import DirectInvokeHandler
+from shim.registry.service_registry import ServiceEndpoint, ServiceRegistry
+
+def invoke_event(context=None):
+    return Event(
+        event_type=EventType.DIRECT_INVOKE,
+        function_name="report",
+        payload={"n": 1},
+        context=context or {}
+    )
+
+def handler_for(client, **endpoint):
+    registry = ServiceRegistry()
+    registry.register("report", ServiceEndpoint(service_name="report", **endpoint))
+    return DirectInvokeHandler(registry, client)
+
+class TestDeadlineContext:
+    def test_reads_absolute_deadline(self):
+        assert deadline.from_headers({"X-Request-Deadline": "1700000000000"}) == {
+            "deadline": 1700000000000.0
+        }
+
+    def test_reads_lambda_remaining_time(self):
+        context = deadline.from_headers({"X-Lambda-Remaining-Ms": "5000"})
+
+        assert 4.9 < deadline.remaining(context) <= 5.0
+
+    def test_ignores_malformed_header(self):
+        assert deadline.from_headers({"X-Request-Deadline": "soon"}) == {}
+
+    @pytest.mark.parametrize("header", ["X-Request-Deadline", "X-Lambda-Remaining-Ms"])
+    @pytest.mark.parametrize("value", ["nan", "inf", "-inf", "1e400"])
+    def test_ignores_non_finite_header(self, header, value):
+        assert deadline.from_headers({header: value}) == {}
+
+    def test_adds_header_only_with_deadline(self):
+        base = {"Content-Type": "application/json"}
+
+        assert deadline.headers(base, {}) is base
+        assert deadline.headers(base, {"deadline": 1700000000000.5}) == {
+            "Content-Type": "application/json",
+            "X-Request-Deadline": "1700000000000"
+        }
+
+class TestBounded:
+    @pytest.mark.asyncio
+    async def test_refuses_work_past_its_deadline(self):
+        with pytest.raises(DeadlineExceeded):
+            async with deadline.bounded(None, {"deadline": deadline.now_ms() - 1}):
+                pytest.fail("work started after the deadline")
+
+    @pytest.mark.asyncio
+    async def test_cancels_work_at_total_timeout(self):
+        with pytest.raises(DeadlineExceeded):
+            async with deadline.bounded(0.01, {}):
+                await asyncio.sleep(1)
+
+class TestHandlerTimeouts:
+    @pytest.mark.asyncio
+    async def test_total_timeout_cancels_slow_upstream(self):
+        async def upstream(request):
+            await asyncio.sleep(1)
+            return httpx.Response(200, json={})
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(upstream)) as client:
+            with pytest.raises(DeadlineExceeded):
+                await handler_for(client, timeout=0.01).handle(invoke_event())
+
+    @pytest.mark.asyncio
+    async def test_applies_connect_and_read_overrides(self):
+        seen = []
+
+        async def upstream(request):
+            seen.append(request.extensions["timeout"])
+            return httpx.Response(200, json={})
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(upstream), timeout=30) as client:
+            await handler_for(client, connect_timeout=0.5, read_timeout=2).handle(invoke_event())
+
+        assert seen == [{"connect": 0.5, "read": 2, "write": 30, "pool": 30}]
+
+    @pytest.mark.asyncio
+    async def test_propagates_deadline_upstream(self):
+        seen = []
+
+        async def upstream(request):
+            seen.append(request.headers.get("X-Request-Deadline"))
+            return httpx.Response(200, json={})
+
+        future = deadline.now_ms() + 60_000
+        async with httpx.AsyncClient(transport=httpx.MockTransport(upstream)) as client:
+            await handler_for(client).handle(invoke_event({"deadline": future}))
+
+        assert seen == [str(int(future))]
@@ -0,0 +1,236 @@
+"""Tests for EndpointSlice discovery and client-side load balancing."""
+import asyncio
+import sys
+from types import SimpleNamespace
+
+import pytest
+import httpx
+
+from shim.discovery import (
+    LEAST_OUTSTANDING,
+    POWER_OF_TWO,
+    SYNC,
+    Discovery,
+    EndpointSet,
+    EndpointSliceWatcher,
+    kubernetes_watch_stream,
+    ready_addresses
+)
+from shim.factory import build_discovery, build_registry
+from shim.registry.service_registry import ServiceEndpoint
+from shim.transport import DiscoveryTransport
+
+def endpoint_slice(name, ips, port=8080, ready=True):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name=name),
+        ports=[SimpleNamespace(port=port)],
+        endpoints=[
+            SimpleNamespace(addresses=[ip], conditions=SimpleNamespace(ready=ready))
+            for ip in ips
+        ]
+    )
+
+def event(kind, name, ips, **kwargs):
+    return {"type": kind, "object": endpoint_slice(name, ips, **kwargs)}
+
+class TestEndpointSet:
+    def test_no_addresses_means_no_pick(self):
+        assert EndpointSet().pick() is None
+
+    def test_least_outstanding_avoids_busy_pods(self):
+        endpoint_set = EndpointSet(LEAST_OUTSTANDING)
+        endpoint_set.update_slice("a", ["10.0.0.1:80", "10.0.0.2:80", "10.0.0.3:80"])
+        endpoint_set.acquire("10.0.0.1:80")
+        endpoint_set.acquire("10.0.0.3:80")
+
+        assert all(endpoint_set.pick() == "10.0.0.2:80" for _ in range(20))
+
+    def test_power_of_two_never_picks_busiest_of_two(self):
+        endpoint_set = EndpointSet(POWER_OF_TWO)
+        endpoint_set.update_slice("a", ["10.0.0.1:80", "10.0.0.2:80"])
+        endpoint_set.acquire("10.0.0.1:80")
+
+        assert all(endpoint_set.pick() == "10.0.0.2:80" for _ in range(20))
+
+    def test_rejects_unknown_strategy(self):
+        with pytest.raises(ValueError):
+            EndpointSet("round_robin")
+
+    def test_merges_slices_and_forgets_removed_pods(self):
+        endpoint_set = EndpointSet()
+        endpoint_set.update_slice("a", ["10.0.0.1:80"])
+        endpoint_set.update_slice("b", ["10.0.0.2:80"])
+        endpoint_set.acquire("10.0.0.1:80")
+        endpoint_set.remove_slice("a")
+
+        assert endpoint_set.addresses == ["10.0.0.2:80"]
+        # Still counted until its request finishes
+        assert endpoint_set.outstanding["10.0.0.1:80"] == 1
+        endpoint_set.release("10.0.0.1:80")
+        assert "10.0.0.1:80" not in endpoint_set.outstanding
+
+class TestReadyAddresses:
+    def test_skips_pods_that_are_not_ready(self):
+        endpoint_slice_ = endpoint_slice("a", ["10.0.0.1"])
+        endpoint_slice_.endpoints.append(
+            SimpleNamespace(addresses=["10.0.0.2"], conditions=SimpleNamespace(ready=False))
+        )
+
+        assert ready_addresses(endpoint_slice_, 8080) == ["10.0.0.1:8080"]
+
+    def test_uses_single_target_port_for_mapped_service_port(self):
+        assert ready_addresses(endpoint_slice("a", ["10.0.0.1"], port=8080), 80) == ["10.0.0.1:8080"]
+
+class TestEndpointSliceWatcher:
+    @pytest.mark.asyncio
+    async def test_applies_watch_events(self):
+        events = [
+            event("ADDED", "a", ["10.0.0.1"]),
+            event("ADDED", "b", ["10.0.0.2"]),
+            event("MODIFIED", "a", ["10.0.0.1"], ready=False),
+            event("DELETED", "b", []),
+            event("ADDED", "c", ["10.0.0.3"]),
+        ]
+        endpoint_set = EndpointSet()
+        watcher = EndpointSliceWatcher(
+            ServiceEndpoint(service_name="orders", port=8080),
+            endpoint_set,
+            watch_stream=lambda namespace, name: iter(events)
+        )
+
+        await watcher._watch_once()
+        await asyncio.sleep(0)
+
+        assert endpoint_set.addresses == ["10.0.0.3:8080"]
+
+    @pytest.mark.asyncio
+    async def test_sync_drops_slices_deleted_between_watches(self):
+        endpoint_set = EndpointSet()
+        endpoint_set.update_slice("gone", ["10.0.0.9:8080"])
+        events = [
+            {"type": SYNC, "objects": [endpoint_slice("a", ["10.0.0.1"])]},
+            event("ADDED", "b", ["10.0.0.2"]),
+        ]
+        watcher = EndpointSliceWatcher(
+            ServiceEndpoint(service_name="orders", port=8080),
+            endpoint_set,
+            watch_stream=lambda namespace, name: iter(events)
+        )
+
+        await watcher._watch_once()
+        await asyncio.sleep(0)
+
+        assert endpoint_set.addresses == ["10.0.0.1:8080", "10.0.0.2:8080"]
+
+    def test_kubernetes_stream_watches_from_listed_version(self, monkeypatch):
+        watched = {}
+
+        def list_slices(namespace, **kwargs):
+            return SimpleNamespace(
+                items=[endpoint_slice("a", ["10.0.0.1"])],
+                metadata=SimpleNamespace(resource_version="42")
+            )
+
+        def stream(func, namespace, **kwargs):
+            watched.update(kwargs)
+            return iter([event("ADDED", "b", ["10.0.0.2"])])
+
+        config = SimpleNamespace(
+            ConfigException=Exception,
+            load_incluster_config=lambda: None,
+            load_kube_config=lambda: None
+        )
+        kubernetes = SimpleNamespace(
+            client=SimpleNamespace(
+                DiscoveryV1Api=lambda: SimpleNamespace(list_namespaced_endpoint_slice=list_slices)
+            ),
+            config=config,
+            watch=SimpleNamespace(Watch=lambda: SimpleNamespace(stream=stream))
+        )
+        monkeypatch.setitem(sys.modules, "kubernetes", kubernetes)
+
+        events = list(kubernetes_watch_stream("shop", "orders"))
+
+        assert [e["type"] for e in events] == [SYNC, "ADDED"]
+        assert watched["resource_version"] == "42"
+        assert watched["label_selector"] == "kubernetes.io/service-name=orders"
+
+    @pytest.mark.asyncio
+    async def test_discovery_watches_each_service(self):
+        watched = []
+
+        def watch_stream(namespace, name):
+            watched.append((namespace, name))
+            return iter([event("ADDED", f"{name}-1", ["10.0.0.9"], port=80)])
+
+        discovery = Discovery(watch_stream=watch_stream)
+        orders = discovery.add(ServiceEndpoint(service_name="orders", namespace="shop"))
+        discovery.start()
+        await asyncio.sleep(0.05)
+        await discovery.stop()
+
+        assert ("shop", "orders") in watched
+        assert orders.addresses == ["10.0.0.9:80"]
+
+class TestDiscoveryTransport:
+    @pytest.mark.asyncio
+    async def test_sends_to_pod_and_keeps_host(self):
+        seen = []
+
+        async def upstream(request):
+            seen.append((str(request.url), request.headers["host"]))
+            return httpx.Response(200, json={})
+
+        endpoint_set = EndpointSet()
+        endpoint_set.update_slice("a", ["10.0.0.1:8080"])
+        endpoint = ServiceEndpoint(service_name="orders", port=8080)
+        transport = DiscoveryTransport(
+            httpx.MockTransport(upstream),
+            {"orders.default.svc.cluster.local:8080": endpoint_set}
+        )
+
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream("POST", endpoint.url, json={}):
+                assert endpoint_set.outstanding["10.0.0.1:8080"] == 1
+
+        assert seen == [("http://10.0.0.1:8080/", "orders.default.svc.cluster.local:8080")]
+        assert endpoint_set.outstanding["10.0.0.1:8080"] == 0
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_service_name_without_ready_pods(self):
+        seen = []
+
+        async def upstream(request):
+            seen.append(str(request.url))
+            return httpx.Response(200, json={})
+
+        endpoint = ServiceEndpoint(service_name="orders", port=8080)
+        transport = DiscoveryTransport(
+            httpx.MockTransport(upstream),
+            {"orders.default.svc.cluster.local:8080": EndpointSet()}
+        )
+
+        async with httpx.AsyncClient(transport=transport) as client:
+            await client.post(endpoint.url, json={})
+
+        assert seen == [endpoint.url]
+
+class TestBuildDiscovery:
+    def test_only_for_services_with_discovery(self):
+        config = {
+            "discovery": {"strategy": "p2c"},
+            "services": [
+                {"name": "orders", "namespace": "default", "service_name": "orders", "port": 80, "discovery": True},
+                {"name": "billing", "namespace": "default", "service_name": "billing", "port": 80},
+            ]
+        }
+
+        discovery = build_discovery(config, build_registry(config))
+
+        assert list(discovery.endpoint_sets) == ["orders.default.svc.cluster.local:80"]
+        assert discovery.endpoint_sets["orders.default.svc.cluster.local:80"].strategy == POWER_OF_TWO
+
+    def test_none_without_discovered_services(self):
+        config = {"services": [{"name": "billing", "namespace": "default", "service_name": "billing", "port": 80}]}
+
+        assert build_discovery(config, build_registry(config)) is None
@@ -0,0 +1,68 @@
+"""Tests for the handler wiring shared by the server and CLI."""
+import httpx
+import pytest
+
+from shim import factory
+from shim.events.dispatcher import EventType
+from shim.handlers import SQSHandler
+from shim.middleware.asn import ASNBatchProcessingMiddleware
+
+CONFIG = {
+    "services": [
+        {
+            "name": "asn-processor",
+            "namespace": "test",
+            "service_name": "asn-service",
+            "port": 8080,
+            "max_concurrency": 4,
+            "http2": True
+        }
+    ],
+    "sqs": {"batch_concurrency": 25}
+}
+
+class TestBuildDispatcher:
+    @pytest.mark.asyncio
+    async def test_sqs_handler_gets_concurrency_config(self):
+        registry = factory.build_registry(CONFIG)
+        async with httpx.AsyncClient() as client:
+            dispatcher = factory.build_dispatcher(CONFIG, registry, client)
+
+        handler = dispatcher._handlers[EventType.SQS]
+        assert isinstance(handler, SQSHandler)
+        assert handler.client is client
+        assert handler.batch_concurrency == 25
+        assert handler.function_concurrency == {"asn-processor": 4}
+
+    def test_http2_origins_lists_opted_in_services(self):
+        registry = factory.build_registry(CONFIG)
+
+        assert factory.http2_origins(registry) == [
+            "http://asn-service.test.svc.cluster.local:8080"
+        ]
+
+class TestBuildMiddleware:
+    def test_adds_batch_processing_when_enabled(self):
+        chain = factory.build_middleware({
+            "middleware": {"batch_processing": {"enabled": True, "batch_size": 5}}
+        }, batch_processing=True)
+
+        batch = chain.middlewares[-1]
+        assert isinstance(batch, ASNBatchProcessingMiddleware)
+        assert batch.batch_size == 5
+
+    def test_omits_batch_processing_by_default(self):
+        chain = factory.build_middleware({}, batch_processing=True)
+
+        assert not any(isinstance(m, ASNBatchProcessingMiddleware) for m in chain.middlewares)
+
+    def test_omits_batch_processing_for_http_routes(self):
+        chain = factory.build_middleware({
+            "middleware": {"batch_processing": {"enabled": True}}
+        })
+
+        assert not any(isinstance(m, ASNBatchProcessingMiddleware) for m in chain.middlewares)
+
+    def test_enables_stage_timing(self):
+        assert factory.build_middleware({"middleware": {"timing": True}}).timing
+        assert not factory.build_middleware({}).timing
@@ -0,0 +1,187 @@
+"""Tests for event handlers."""
+import asyncio
+import json
+import pytest
+import httpx
+
+from shim.events.dispatcher import Event, EventType
+from shim.handlers import SQSHandler, StreamingHandler
+
+def mock_client(handler):
+    """Build an AsyncClient that routes requests to an in-process handler."""
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+def sqs_batch(count):
+    return Event(
+        event_type=EventType.SQS,
+        function_name="test-function",
+        payload={
+            "Records": [
+                {"messageId": f"msg-{i}", "body": {"index": i}}
+                for i in range(count)
+            ]
+        }
+    )
+
+class TestSQSHandler:
+    @pytest.mark.asyncio
+    async def test_fans_out_records_concurrently(self, service_registry):
+        in_flight = 0
+        peak = 0
+
+        async def upstream(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return httpx.Response(200, json={})
+
+        async with mock_client(upstream) as client:
+            handler = SQSHandler(service_registry, client, batch_concurrency=4)
+            result = await handler.handle(sqs_batch(10))
+
+        assert result == {"batchItemFailures": []}
+        assert peak == 4
+
+    @pytest.mark.asyncio
+    async def test_function_concurrency_is_shared_across_batches(self, service_registry):
+        in_flight = 0
+        peak = 0
+
+        async def upstream(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return httpx.Response(200, json={})
+
+        async with mock_client(upstream) as client:
+            handler = SQSHandler(
+                service_registry,
+                client,
+                batch_concurrency=10,
+                function_concurrency={"test-function": 3}
+            )
+            await asyncio.gather(handler.handle(sqs_batch(5)), handler.handle(sqs_batch(5)))
+
+        assert peak == 3
+
+    @pytest.mark.asyncio
+    async def test_sends_each_record_individually(self, service_registry):
+        seen = []
+
+        async def upstream(request):
+            seen.append(json.loads(request.content)["event"]["messageId"])
+            return httpx.Response(200, json={})
+
+        async with mock_client(upstream) as client:
+            await SQSHandler(service_registry, client).handle(sqs_batch(3))
+
+        assert sorted(seen) == ["msg-0", "msg-1", "msg-2"]
+
+    @pytest.mark.asyncio
+    async def test_reports_only_failed_records(self, service_registry):
+        async def upstream(request):
+            message_id = json.loads(request.content)["event"]["messageId"]
+            if message_id in ("msg-1", "msg-3"):
+                return httpx.Response(503)
+            return httpx.Response(200, json={})
+
+        async with mock_client(upstream) as client:
+            result = await SQSHandler(service_registry, client).handle(sqs_batch(5))
+
+        assert result == {
+            "batchItemFailures": [
+                {"itemIdentifier": "msg-1"},
+                {"itemIdentifier": "msg-3"}
+            ]
+        }
+
+    @pytest.mark.asyncio
+    async def test_reports_failed_record_without_message_id(self, service_registry):
+        async def upstream(request):
+            return httpx.Response(500)
+
+        event = Event(
+            event_type=EventType.SQS,
+            function_name="test-function",
+            payload={"Records": [{"messageId": "msg-0"}, "abc"]}
+        )
+
+        async with mock_client(upstream) as client:
+            result = await SQSHandler(service_registry, client).handle(event)
+
+        assert result == {
+            "batchItemFailures": [{"itemIdentifier": "msg-0"}, {"itemIdentifier": None}]
+        }
+
+    @pytest.mark.asyncio
+    async def test_fails_records_that_are_not_objects(self, service_registry):
+        sent = []
+
+        async def upstream(request):
+            sent.append(json.loads(request.content)["event"])
+            return httpx.Response(200, json={})
+
+        event = Event(
+            event_type=EventType.SQS,
+            function_name="test-function",
+            payload={"Records": [{"messageId": "msg-0"}, "abc"]}
+        )
+
+        async with mock_client(upstream) as client:
+            result = await SQSHandler(service_registry, client).handle(event)
+
+        assert sent == [{"messageId": "msg-0"}]
+        assert result == {"batchItemFailures": [{"itemIdentifier": None}]}
+
+    @pytest.mark.asyncio
+    async def test_rejects_records_that_are_not_a_list(self, service_registry):
+        async def upstream(request):
+            return httpx.Response(200, json={})
+
+        event = Event(event_type=EventType.SQS, function_name="test-function", payload={"Records": "x"})
+
+        async with mock_client(upstream) as client:
+            with pytest.raises(ValueError, match="must be a list"):
+                await SQSHandler(service_registry, client).handle(event)
+
+    @pytest.mark.asyncio
+    async def test_raises_for_unregistered_function(self, service_registry):
+        async def upstream(request):
+            return httpx.Response(200, json={})
+
+        event = sqs_batch(1)
+        event.function_name = "unknown-function"
+
+        async with mock_client(upstream) as client:
+            with pytest.raises(ValueError, match="No service registered"):
+                await SQSHandler(service_registry, client).handle(event)
+
+class TestStreamingHandler:
+    @pytest.mark.asyncio
+    async def test_returns_unread_response(self, service_registry):
+        async def upstream(request):
+            return httpx.Response(200, content=b'{"rows": []}')
+
+        event = Event(event_type=EventType.DIRECT_INVOKE, function_name="test-function", payload={})
+
+        async with mock_client(upstream) as client:
+            response = await StreamingHandler(service_registry, client).handle(event)
+            body = b"".join([chunk async for chunk in response.aiter_bytes()])
+            await response.aclose()
+
+        assert body == b'{"rows": []}'
+
+    @pytest.mark.asyncio
+    async def test_raises_on_upstream_error(self, service_registry):
+        async def upstream(request):
+            return httpx.Response(502)
+
+        event = Event(event_type=EventType.DIRECT_INVOKE, function_name="test-function", payload={})
+
+        async with mock_client(upstream) as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await StreamingHandler(service_registry, client).handle(event)
@@ -0,0 +1,122 @@
+"""Tests for hedged API Gateway requests."""
+import asyncio
+import pytest
+import httpx
+
+from shim.events.dispatcher import Event, EventType
+from shim.handlers import APIGatewayHandler
+from shim.hedging import MIN_SAMPLES, LatencyWindow, hedged
+from shim.registry.service_registry import ServiceEndpoint, ServiceRegistry
+
+class TestLatencyWindow:
+    def test_needs_enough_samples(self):
+        window = LatencyWindow()
+        for _ in range(MIN_SAMPLES - 1):
+            window.record(0.01)
+
+        assert window.percentile(95) is None
+
+    def test_percentile_of_recent_samples(self):
+        window = LatencyWindow(size=100)
+        for i in range(1, 201):
+            window.record(i / 1000)
+
+        assert window.percentile(50) == 0.15
+        assert window.percentile(100) == 0.2
+
+class TestHedged:
+    @pytest.mark.asyncio
+    async def test_does_not_hedge_fast_attempts(self):
+        calls = 0
+
+        async def attempt():
+            nonlocal calls
+            calls += 1
+            return calls
+
+        assert await hedged(attempt, delay=0.05) == 1
+        assert calls == 1
+
+    @pytest.mark.asyncio
+    async def test_second_attempt_wins_and_first_is_cancelled(self):
+        started = []
+        cancelled = []
+
+        async def attempt():
+            index = len(started)
+            started.append(index)
+            try:
+                await asyncio.sleep(1 if index == 0 else 0)
+            except asyncio.CancelledError:
+                cancelled.append(index)
+                raise
+            return index
+
+        assert await hedged(attempt, delay=0.01) == 1
+        assert cancelled == [0]
+
+    @pytest.mark.asyncio
+    async def test_waits_for_other_attempt_when_one_fails(self):
+        started = []
+
+        async def attempt():
+            index = len(started)
+            started.append(index)
+            if index == 0:
+                await asyncio.sleep(0.02)
+                return "slow but fine"
+            raise RuntimeError("hedge failed")
+
+        assert await hedged(attempt, delay=0.01) == "slow but fine"
+
+    @pytest.mark.asyncio
+    async def test_raises_when_every_attempt_fails(self):
+        async def attempt():
+            raise RuntimeError("down")
+
+        with pytest.raises(RuntimeError, match="down"):
+            await hedged(attempt, delay=None)
+
+class TestAPIGatewayHedging:
+    def handler(self, client, **endpoint):
+        registry = ServiceRegistry()
+        registry.register("quote", ServiceEndpoint(service_name="quote", **endpoint))
+        handler = APIGatewayHandler(registry, client)
+        window = LatencyWindow()
+        for _ in range(MIN_SAMPLES):
+            window.record(0.01)
+        handler._latencies["quote"] = window
+        return handler
+
+    @pytest.mark.asyncio
+    async def test_hedges_idempotent_function(self):
+        calls = []
+
+        async def upstream(request):
+            calls.append(request)
+            if len(calls) == 1:
+                await asyncio.sleep(1)
+            return httpx.Response(200, json={"price": 1})
+
+        event = Event(event_type=EventType.API_GATEWAY, function_name="quote", payload={"httpMethod": "GET"})
+        async with httpx.AsyncClient(transport=httpx.MockTransport(upstream)) as client:
+            handler = self.handler(client, idempotent=True, hedge_percentile=95)
+            result = await asyncio.wait_for(handler.handle(event), timeout=0.5)
+
+        assert result["body"] == {"price": 1}
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_never_hedges_non_idempotent_function(self):
+        calls = []
+
+        async def upstream(request):
+            calls.append(request)
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={})
+
+        event = Event(event_type=EventType.API_GATEWAY, function_name="quote", payload={"httpMethod": "POST"})
+        async with httpx.AsyncClient(transport=httpx.MockTransport(upstream)) as client:
+            await self.handler(client, hedge_percentile=95).handle(event)
+
+        assert len(calls) == 1
@@ -0,0 +1,130 @@
+"""Tests for the adaptive concurrency limiter."""
+import asyncio
+import pytest
+import httpx
+
+from shim.limiter import AdaptiveLimiter, ConcurrencyLimitExceeded
+from shim.transport import AdaptiveLimitTransport
+
+class TestAdaptiveLimiter:
+    @pytest.mark.asyncio
+    async def test_grows_while_latency_is_stable(self):
+        limiter = AdaptiveLimiter(initial_limit=2, max_limit=10)
+
+        for _ in range(20):
+            await limiter.acquire()
+            await limiter.acquire()
+            limiter.release(0.01)
+            limiter.release(0.01)
+
+        assert limiter.limit > 2
+
+    @pytest.mark.asyncio
+    async def test_does_not_grow_when_underused(self):
+        limiter = AdaptiveLimiter(initial_limit=10)
+
+        for _ in range(20):
+            await limiter.acquire()
+            limiter.release(0.01)
+
+        assert limiter.limit == 10
+
+    @pytest.mark.asyncio
+    async def test_backs_off_on_drop(self):
+        limiter = AdaptiveLimiter(initial_limit=10, backoff_ratio=0.5)
+
+        await limiter.acquire()
+        limiter.release(0.01, dropped=True)
+
+        assert limiter.limit == 5
+
+    @pytest.mark.asyncio
+    async def test_backs_off_when_latency_grows(self):
+        limiter = AdaptiveLimiter(initial_limit=10, backoff_ratio=0.5, latency_tolerance=2.0)
+        await limiter.acquire()
+        limiter.release(0.01)
+
+        await limiter.acquire()
+        limiter.release(0.1)
+
+        assert limiter.limit == 5
+
+    @pytest.mark.asyncio
+    async def test_never_drops_below_min_limit(self):
+        limiter = AdaptiveLimiter(initial_limit=2, min_limit=2, backoff_ratio=0.1)
+
+        await limiter.acquire()
+        limiter.release(dropped=True)
+
+        assert limiter.limit == 2
+
+    @pytest.mark.asyncio
+    async def test_queues_then_sheds_excess_requests(self):
+        limiter = AdaptiveLimiter(initial_limit=1, max_queue=1)
+        await limiter.acquire()
+
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(ConcurrencyLimitExceeded):
+            await limiter.acquire()
+
+        limiter.release(0.01)
+        await queued
+        assert limiter.in_flight == 1
+        assert limiter.queued == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        limiter = AdaptiveLimiter(initial_limit=1)
+        await limiter.acquire()
+
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        limiter.release(0.01)
+        assert limiter.in_flight == 0
+        assert limiter.queued == 0
+
+class TestAdaptiveLimitTransport:
+    @pytest.mark.asyncio
+    async def test_keeps_one_limiter_per_service(self):
+        async def upstream(request):
+            return httpx.Response(200, json={})
+
+        transport = AdaptiveLimitTransport(httpx.MockTransport(upstream), {"initial_limit": 4})
+        async with httpx.AsyncClient(transport=transport) as client:
+            await client.get("http://a.svc:8080/")
+            await client.get("http://b.svc:8080/")
+
+        assert set(transport.limiters) == {"a.svc:8080", "b.svc:8080"}
+        assert all(limiter.in_flight == 0 for limiter in transport.limiters.values())
+
+    @pytest.mark.asyncio
+    async def test_backs_off_on_server_errors(self):
+        async def upstream(request):
+            return httpx.Response(503)
+
+        transport = AdaptiveLimitTransport(
+            httpx.MockTransport(upstream),
+            {"initial_limit": 10, "backoff_ratio": 0.5}
+        )
+        async with httpx.AsyncClient(transport=transport) as client:
+            await client.get("http://a.svc/")
+
+        assert transport.limiter("a.svc").limit == 5
+
+    @pytest.mark.asyncio
+    async def test_holds_slot_until_streamed_body_is_closed(self):
+        async def upstream(request):
+            return httpx.Response(200, content=b"rows")
+
+        transport = AdaptiveLimitTransport(httpx.MockTransport(upstream))
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream("GET", "http://a.svc/") as response:
+                assert transport.limiter("a.svc").in_flight == 1
+                await response.aread()
+
+        assert transport.limiter("a.svc").in_flight == 0
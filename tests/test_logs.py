@@ -0,0 +1,118 @@
+"""Tests for the queued structured logging pipeline."""
+import io
+import json
+import logging
+import queue
+import sys
+import threading
+import pytest
+
+from shim.logs import JSONFormatter, LevelSampler, NonBlockingQueueHandler, configure_logging
+
+def record(level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    entry = logging.LogRecord("tests.logs", level, __file__, 1, msg, args, None)
+    entry.__dict__.update(extra)
+    return entry
+
+class RenderedOn:
+    """Argument remembering the thread that rendered it."""
+
+    def __init__(self):
+        self.threads = []
+
+    def __str__(self):
+        self.threads.append(threading.get_ident())
+        return "rendered"
+
+class TestJSONFormatter:
+    def test_formats_message_and_extra_fields(self):
+        line = json.loads(JSONFormatter().format(record(function="asn-processor")))
+
+        assert line["level"] == "INFO"
+        assert line["logger"] == "tests.logs"
+        assert line["message"] == "hello world"
+        assert line["function"] == "asn-processor"
+        assert line["time"].endswith("+00:00")
+
+    def test_skips_uvicorn_colour_message(self):
+        line = json.loads(JSONFormatter().format(record(color_message="\x1b[36mhello\x1b[0m")))
+
+        assert "color_message" not in line
+
+    def test_includes_exception(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            entry = logging.LogRecord("tests.logs", logging.ERROR, __file__, 1, "failed", (), None)
+            entry.exc_info = sys.exc_info()
+
+        line = json.loads(JSONFormatter().format(entry))
+
+        assert "ValueError: boom" in line["exc_info"]
+
+class TestLevelSampler:
+    def test_drops_and_keeps_by_level(self):
+        sampler = LevelSampler({"info": 0.0, "debug": 1.0})
+
+        assert not sampler.filter(record(logging.INFO))
+        assert sampler.filter(record(logging.DEBUG))
+        assert sampler.filter(record(logging.ERROR))
+
+    def test_samples_at_rate(self):
+        sampler = LevelSampler({"INFO": 0.5})
+
+        kept = sum(sampler.filter(record()) for _ in range(2000))
+
+        assert 800 < kept < 1200
+
+class TestNonBlockingQueueHandler:
+    def test_drops_records_when_full(self):
+        handler = NonBlockingQueueHandler(queue.Queue(1))
+
+        handler.handle(record())
+        handler.handle(record())
+
+        assert handler.dropped == 1
+
+    def test_leaves_message_unrendered(self):
+        records = queue.Queue()
+        argument = RenderedOn()
+        NonBlockingQueueHandler(records).handle(record(args=(argument,)))
+
+        assert argument.threads == []
+        assert records.get_nowait().getMessage() == "hello rendered"
+
+class TestConfigureLogging:
+    def test_writes_json_lines_from_writer_thread(self, root_logger):
+        out = io.StringIO()
+        argument = RenderedOn()
+        listener = configure_logging({"level": "info"}, stream=out)
+        logging.getLogger("tests.logs").info("event %s", argument, extra={"function": "fn"})
+        logging.getLogger("tests.logs").debug("hidden")
+        listener.stop()
+
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [line["message"] for line in lines] == ["event rendered"]
+        assert lines[0]["function"] == "fn"
+        assert argument.threads and threading.get_ident() not in argument.threads
+
+    def test_samples_per_level(self, root_logger):
+        out = io.StringIO()
+        listener = configure_logging({"sampling": {"INFO": 0}}, stream=out)
+        logging.getLogger("tests.logs").info("sampled out")
+        logging.getLogger("tests.logs").warning("kept")
+        listener.stop()
+
+        assert [json.loads(line)["message"] for line in out.getvalue().splitlines()] == ["kept"]
+
+    def test_text_format(self, root_logger):
+        out = io.StringIO()
+        listener = configure_logging({"format": "text"}, stream=out)
+        logging.getLogger("tests.logs").info("plain")
+        listener.stop()
+
+        assert out.getvalue().rstrip().endswith("tests.logs - INFO - plain")
+
+    def test_rejects_unknown_format(self, root_logger):
+        with pytest.raises(ValueError, match="Unknown log format"):
+            configure_logging({"format": "xml"})
@@ -0,0 +1,170 @@
+"""Tests for the Prometheus metrics."""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+import httpx
+from prometheus_client import REGISTRY
+
+from shim import metrics, server
+from shim.events.dispatcher import Event, EventType
+from shim.handlers import SQSHandler
+from shim.metrics import LABELS_EXTENSION, MetricsTransport
+from shim.middleware.base import Middleware, MiddlewareChain
+from shim.registry.service_registry import ServiceEndpoint, ServiceRegistry
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def registry_with(*functions):
+    registry = ServiceRegistry()
+    for function in functions:
+        registry.register(function, ServiceEndpoint(service_name=function))
+    return registry
+
+class SlowMiddleware(Middleware):
+    async def process(self, event, next_handler):
+        await asyncio.sleep(0.05)
+        return await next_handler(event)
+
+async def serve_http(reader, writer):
+    """Minimal keep-alive HTTP/1.1 server answering every bodiless request with ``{}``."""
+    try:
+        while True:
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}")
+            await writer.drain()
+    except asyncio.IncompleteReadError:
+        writer.close()
+
+class TestInstrument:
+    @pytest.mark.asyncio
+    async def test_splits_middleware_time_from_handler_time(self):
+        async def handler(event):
+            await asyncio.sleep(0.05)
+            return {}
+
+        handle = metrics.instrument(
+            MiddlewareChain([SlowMiddleware()]), handler, registry_with("timed-fn")
+        )
+        await handle(Event(event_type=EventType.DIRECT_INVOKE, function_name="timed-fn", payload={}))
+
+        labels = {"function": "timed-fn", "event_type": "direct_invoke"}
+        total = sample("shim_ingress_duration_seconds_sum", outcome="success", **labels)
+        middleware = sample("shim_middleware_duration_seconds_sum", **labels)
+        assert total >= 0.1
+        assert 0.05 <= middleware < total - 0.04
+        assert sample("shim_ingress_in_flight", **labels) == 0
+
+    @pytest.mark.asyncio
+    async def test_reports_unregistered_functions_as_unknown(self):
+        async def handler(event):
+            raise ValueError("No service registered")
+
+        handle = metrics.instrument(MiddlewareChain(), handler, registry_with())
+        before = sample("shim_ingress_duration_seconds_count", function="unknown", event_type="sqs", outcome="error")
+        with pytest.raises(ValueError):
+            await handle(Event(event_type=EventType.SQS, function_name="no-such-fn", payload={}))
+
+        after = sample("shim_ingress_duration_seconds_count", function="unknown", event_type="sqs", outcome="error")
+        assert after == before + 1
+
+    @pytest.mark.asyncio
+    async def test_records_self_time_of_each_middleware(self):
+        handle = metrics.instrument(
+            MiddlewareChain([SlowMiddleware()], timing=True),
+            AsyncMock(return_value={}),
+            registry_with("staged-fn")
+        )
+        await handle(Event(event_type=EventType.DIRECT_INVOKE, function_name="staged-fn", payload={}))
+
+        assert sample(
+            "shim_middleware_self_duration_seconds_sum",
+            middleware="SlowMiddleware",
+            function="staged-fn",
+            event_type="direct_invoke"
+        ) >= 0.05
+
+class TestMetricsTransport:
+    @pytest.mark.asyncio
+    async def test_records_ttfb_and_total_when_body_closes(self):
+        labels = {"function": "upstream-fn", "event_type": "api_gateway"}
+        transport = MetricsTransport(httpx.MockTransport(lambda request: httpx.Response(200, json={})))
+
+        async with httpx.AsyncClient(transport=transport) as client:
+            extensions = {LABELS_EXTENSION: ("upstream-fn", "api_gateway")}
+            async with client.stream("POST", "http://svc/", extensions=extensions):
+                assert sample("shim_upstream_in_flight", **labels) == 1
+                assert sample("shim_upstream_ttfb_seconds_count", **labels) == 1
+                assert sample("shim_upstream_duration_seconds_count", status="200", **labels) == 0
+
+        assert sample("shim_upstream_in_flight", **labels) == 0
+        assert sample("shim_upstream_duration_seconds_count", status="200", **labels) == 1
+
+    @pytest.mark.asyncio
+    async def test_records_connect_time_of_new_connections(self):
+        listener = await asyncio.start_server(serve_http, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        labels = {"function": "connect-fn", "event_type": "sqs"}
+        extensions = {LABELS_EXTENSION: ("connect-fn", "sqs")}
+
+        async with listener:
+            transport = MetricsTransport(httpx.AsyncHTTPTransport())
+            async with httpx.AsyncClient(transport=transport) as client:
+                metrics.POOLS.track(client)
+                for _ in range(2):
+                    await client.post(f"http://127.0.0.1:{port}/", extensions=extensions)
+                idle = sample("shim_pool_connections", pool="default", state="idle")
+                metrics.POOLS.untrack(client)
+
+        # The second request reused the pooled connection
+        assert sample("shim_upstream_connect_seconds_count", **labels) == 1
+        assert idle >= 1
+
+class TestSQSMetrics:
+    @pytest.mark.asyncio
+    async def test_records_batch_size_and_failures(self):
+        async def upstream(request):
+            ok = b"ok" in request.content
+            return httpx.Response(200 if ok else 500, json={})
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(upstream)) as client:
+            handler = SQSHandler(registry_with("sqs-fn"), client)
+            await handler.handle(Event(
+                event_type=EventType.SQS,
+                function_name="sqs-fn",
+                payload={"Records": [
+                    {"messageId": "1", "body": "ok"},
+                    {"messageId": "2", "body": "bad"},
+                    {"messageId": "3", "body": "bad"},
+                ]}
+            ))
+
+        assert sample("shim_sqs_batch_size_sum", function="sqs-fn") == 3
+        assert sample("shim_sqs_record_failures_total", function="sqs-fn") == 2
+
+class TestMetricsEndpoint:
+    @pytest.mark.asyncio
+    async def test_exposes_prometheus_text(self, monkeypatch):
+        monkeypatch.setattr(
+            server,
+            "create_http_client",
+            lambda *args, **kwargs: httpx.AsyncClient(
+                transport=httpx.MockTransport(lambda request: httpx.Response(200, json={}))
+            )
+        )
+        app = server.create_app({"services": [
+            {"name": "scraped-fn", "namespace": "test", "service_name": "scraped", "port": 8080}
+        ]})
+
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://shim") as client:
+                await client.post("/eventbridge/scraped-fn", json={"detail": {}})
+                response = await client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert (
+            'shim_ingress_duration_seconds_count{event_type="eventbridge",'
+            'function="scraped-fn",outcome="success"} 1.0'
+        ) in response.text
@@ -1,123 +1,235 @@
 """Tests for middleware."""
+import asyncio
 import pytest
 from unittest.mock import AsyncMock
 
 from shim.events.dispatcher import Event, EventType
-from shim.middleware.base import Middleware, MiddlewareChain
+from shim.middleware.base import Middleware, MiddlewareChain, stage_timings
 from shim.middleware.common import LoggingMiddleware, ValidationMiddleware, AuthMiddleware
 
 class RecordingMiddleware(Middleware):
- """Test middleware that records calls."""
+    """Test middleware that records calls."""
 
- def __init__(self, name):
- self.name = name
- self.called = False
+    def __init__(self, name):
+        self.name = name
+        self.called = False
 
- async def process(self, event, next_handler):
- self.called = True
- return await next_handler(event)
+    async def process(self, event, next_handler):
+        self.called = True
+        return await next_handler(event)
 
 class TestMiddlewareChain:
- @pytest.mark.asyncio
- async def test_executes_middleware_in_order(self):
- mw1 = RecordingMiddleware("first")
- mw2 = RecordingMiddleware("second")
- chain = MiddlewareChain([mw1, mw2])
+    @pytest.mark.asyncio
+    async def test_executes_middleware_in_order(self):
+        mw1 = RecordingMiddleware("first")
+        mw2 = RecordingMiddleware("second")
+        chain = MiddlewareChain([mw1, mw2])
 
- final_handler = AsyncMock(return_value={"success": True})
- event = Event(
- event_type=EventType.DIRECT_INVOKE,
- function_name="test",
- payload={}
- )
+        final_handler = AsyncMock(return_value={"success": True})
+        event = Event(
+            event_type=EventType.DIRECT_INVOKE,
+            function_name="test",
+            payload={}
+        )
 
- result = await chain.execute(event, final_handler)
+        result = await chain.execute(event, final_handler)
 
- assert mw1.called
- assert mw2.called
- assert result == {"success": True}
- final_handler.assert_called_once()
+        assert mw1.called
+        assert mw2.called
+        assert result == {"success": True}
+        final_handler.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_can_add_middleware(self):
+        chain = MiddlewareChain()
+        mw = RecordingMiddleware("test")
+
+        chain.add(mw)
 
- @pytest.mark.asyncio
- async def test_can_add_middleware(self):
- chain = MiddlewareChain()
- mw = RecordingMiddleware("test")
+        assert len(chain.middlewares) == 1
+        assert chain.middlewares[0] == mw
+
+    def test_build_reuses_compiled_handler(self):
+        chain = MiddlewareChain([RecordingMiddleware("first")])
+        final_handler = AsyncMock(return_value={})
 
- chain.add(mw)
+        assert chain.build(final_handler) is chain.build(final_handler)
+
+    @pytest.mark.asyncio
+    async def test_add_invalidates_compiled_handler(self):
+        chain = MiddlewareChain([RecordingMiddleware("first")])
+        final_handler = AsyncMock(return_value={})
+        compiled = chain.build(final_handler)
 
- assert len(chain.middlewares) == 1
- assert chain.middlewares[0] == mw
+        mw = RecordingMiddleware("second")
+        chain.add(mw)
+        await chain.build(final_handler)(Event(
+            event_type=EventType.DIRECT_INVOKE,
+            function_name="test",
+            payload={}
+        ))
+
+        assert chain.build(final_handler) is not compiled
+        assert mw.called
+
+    @pytest.mark.asyncio
+    async def test_compiled_handler_runs_middleware_outermost_first(self):
+        order = []
+
+        class OrderMiddleware(Middleware):
+            def __init__(self, name):
+                self.name = name
+
+            async def process(self, event, next_handler):
+                order.append(self.name)
+                return await next_handler(event)
+
+        chain = MiddlewareChain([OrderMiddleware("outer"), OrderMiddleware("inner")])
+        handler = chain.build(AsyncMock(return_value={}))
+        event = Event(event_type=EventType.DIRECT_INVOKE, function_name="test", payload={})
+
+        await handler(event)
+        await handler(event)
+
+        assert order == ["outer", "inner", "outer", "inner"]
+
+    @pytest.mark.asyncio
+    async def test_passes_next_handler_positionally(self):
+        class CallNextMiddleware(Middleware):
+            async def process(self, event, call_next):
+                return await call_next(event)
+
+        chain = MiddlewareChain([CallNextMiddleware()])
+        event = Event(event_type=EventType.DIRECT_INVOKE, function_name="test", payload={})
+
+        assert await chain.execute(event, AsyncMock(return_value={"ok": True})) == {"ok": True}
+
+class SleepingMiddleware(Middleware):
+    """Test middleware that spends ``seconds`` before calling the next handler."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    async def process(self, event, next_handler):
+        await asyncio.sleep(self.seconds)
+        return await next_handler(event)
+
+class FanOutMiddleware(Middleware):
+    """Test middleware that calls the next handler twice concurrently."""
+
+    async def process(self, event, next_handler):
+        await asyncio.gather(next_handler(event), next_handler(event))
+        return {}
+
+class TestStageTimings:
+    @pytest.fixture
+    def event(self):
+        return Event(event_type=EventType.DIRECT_INVOKE, function_name="test", payload={})
+
+    @pytest.mark.asyncio
+    async def test_records_self_time_excluding_downstream(self, event):
+        async def slow_handler(event):
+            await asyncio.sleep(0.05)
+            return {}
+
+        chain = MiddlewareChain([SleepingMiddleware(0.03), RecordingMiddleware("inner")], timing=True)
+        with stage_timings() as timings:
+            await chain.execute(event, slow_handler)
+
+        assert set(timings) == {"SleepingMiddleware", "RecordingMiddleware"}
+        assert 0.03 <= timings["SleepingMiddleware"] < 0.05
+        assert timings["RecordingMiddleware"] < 0.01
+
+    @pytest.mark.asyncio
+    async def test_concurrent_downstream_calls_are_not_double_counted(self, event):
+        async def slow_handler(event):
+            await asyncio.sleep(0.05)
+            return {}
+
+        chain = MiddlewareChain([FanOutMiddleware()], timing=True)
+        with stage_timings() as timings:
+            await chain.execute(event, slow_handler)
+
+        assert 0 <= timings["FanOutMiddleware"] < 0.01
+
+    @pytest.mark.asyncio
+    async def test_untimed_chain_records_nothing(self, event):
+        chain = MiddlewareChain([RecordingMiddleware("first")])
+        with stage_timings() as timings:
+            await chain.execute(event, AsyncMock(return_value={}))
+
+        assert timings == {}
 
 class TestValidationMiddleware:
- @pytest.mark.asyncio
- async def test_raises_error_for_missing_function_name(self):
- middleware = ValidationMiddleware()
- event = Event(
- event_type=EventType.DIRECT_INVOKE,
- function_name="",
- payload={}
- )
- next_handler = AsyncMock()
-
- with pytest.raises(ValueError, match="function_name is required"):
- await middleware.process(event, next_handler)
-
- @pytest.mark.asyncio
- async def test_allows_valid_event(self):
- middleware = ValidationMiddleware()
- event = Event(
- event_type=EventType.DIRECT_INVOKE,
- function_name="test",
- payload={"data": "value"}
- )
- next_handler = AsyncMock(return_value={})
-
- result = await middleware.process(event, next_handler)
-
- next_handler.assert_called_once()
- assert result == {}
+    @pytest.mark.asyncio
+    async def test_raises_error_for_missing_function_name(self):
+        middleware = ValidationMiddleware()
+        event = Event(
+            event_type=EventType.DIRECT_INVOKE,
+            function_name="",
+            payload={}
+        )
+        next_handler = AsyncMock()
+
+        with pytest.raises(ValueError, match="function_name is required"):
+            await middleware.process(event, next_handler)
+
+    @pytest.mark.asyncio
+    async def test_allows_valid_event(self):
+        middleware = ValidationMiddleware()
+        event = Event(
+            event_type=EventType.DIRECT_INVOKE,
+            function_name="test",
+            payload={"data": "value"}
+        )
+        next_handler = AsyncMock(return_value={})
+
+        result = await middleware.process(event, next_handler)
+
+        next_handler.assert_called_once()
+        assert result == {}
 
 class TestAuthMiddleware:
- @pytest.mark.asyncio
- async def test_allows_request_with_valid_api_key(self):
- middleware = AuthMiddleware(api_keys={"valid-key"})
- event = Event(
- event_type=EventType.DIRECT_INVOKE,
- function_name="test",
- payload={},
- context={"api_key": "valid-key"}
- )
- next_handler = AsyncMock(return_value={"authorized": True})
-
- result = await middleware.process(event, next_handler)
-
- assert result == {"authorized": True}
-
- @pytest.mark.asyncio
- async def test_rejects_request_with_invalid_api_key(self):
- middleware = AuthMiddleware(api_keys={"valid-key"})
- event = Event(
- event_type=EventType.DIRECT_INVOKE,
- function_name="test",
- payload={},
- context={"api_key": "invalid-key"}
- )
- next_handler = AsyncMock()
-
- with pytest.raises(PermissionError, match="Invalid API key"):
- await middleware.process(event, next_handler)
-
- @pytest.mark.asyncio
- async def test_bypasses_auth_when_no_keys_configured(self):
- middleware = AuthMiddleware()
- event = Event(
- event_type=EventType.DIRECT_INVOKE,
- function_name="test",
- payload={},
- context={}
- )
- next_handler = AsyncMock(return_value={})
-
- result = await middleware.process(event, next_handler)
-
- next_handler.assert_called_once()
+    @pytest.mark.asyncio
+    async def test_allows_request_with_valid_api_key(self):
+        middleware = AuthMiddleware(api_keys={"valid-key"})
+        event = Event(
+            event_type=EventType.DIRECT_INVOKE,
+            function_name="test",
+            payload={},
+            context={"api_key": "valid-key"}
+        )
+        next_handler = AsyncMock(return_value={"authorized": True})
+
+        result = await middleware.process(event, next_handler)
+
+        assert result == {"authorized": True}
+
+    @pytest.mark.asyncio
+    async def test_rejects_request_with_invalid_api_key(self):
+        middleware = AuthMiddleware(api_keys={"valid-key"})
+        event = Event(
+            event_type=EventType.DIRECT_INVOKE,
+            function_name="test",
+            payload={},
+            context={"api_key": "invalid-key"}
+        )
+        next_handler = AsyncMock()
+
+        with pytest.raises(PermissionError, match="Invalid API key"):
+            await middleware.process(event, next_handler)
+
+    @pytest.mark.asyncio
+    async def test_bypasses_auth_when_no_keys_configured(self):
+        middleware = AuthMiddleware()
+        event = Event(
+            event_type=EventType.DIRECT_INVOKE,
+            function_name="test",
+            payload={},
+            context={}
+        )
+        next_handler = AsyncMock(return_value={})
+
+        result = await middleware.process(event, next_handler)
+
+        next_handler.assert_called_once()
@@ -0,0 +1,183 @@
+"""Tests for the SQS poller against an in-process SQS stand-in."""
+import asyncio
+import json
+import sys
+import threading
+from types import SimpleNamespace
+import pytest
+import httpx
+
+from shim.handlers import SQSHandler
+from shim.poller import QueueSubscription, SQSPoller
+
+QUEUE_URL = "https://sqs.test/123456789012/asn"
+
+class FakeSQS:
+    """Thread-safe stand-in for the boto3 SQS client methods the poller uses."""
+
+    def __init__(self, bodies=()):
+        self._lock = threading.Lock()
+        self.queue = [
+            {
+                "MessageId": f"msg-{i}",
+                "ReceiptHandle": f"rh-{i}",
+                "Body": json.dumps(body)
+            }
+            for i, body in enumerate(bodies)
+        ]
+        self.deleted = []
+        self.delete_calls = []
+        self.visibility_calls = []
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, **kwargs):
+        with self._lock:
+            messages = self.queue[:MaxNumberOfMessages]
+            del self.queue[:MaxNumberOfMessages]
+        return {"Messages": messages} if messages else {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        with self._lock:
+            self.delete_calls.append(Entries)
+            self.deleted.extend(entry["ReceiptHandle"] for entry in Entries)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        with self._lock:
+            self.visibility_calls.append(Entries)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+def received(sqs, count):
+    messages = sqs.queue[:count]
+    del sqs.queue[:count]
+    return messages
+
+class TestSQSPoller:
+    @pytest.mark.asyncio
+    async def test_deletes_only_successful_messages(self):
+        sqs = FakeSQS([{"n": i} for i in range(3)])
+        seen = []
+
+        async def handle(event):
+            seen.extend(record["body"] for record in event.payload["Records"])
+            return {"batchItemFailures": [{"itemIdentifier": "msg-1"}]}
+
+        poller = SQSPoller(sqs, QueueSubscription(queue_url=QUEUE_URL, function_name="test-function"), handle)
+        failed = await poller.process(received(sqs, 3))
+
+        assert seen == [{"n": 0}, {"n": 1}, {"n": 2}]
+        assert sqs.deleted == ["rh-0", "rh-2"]
+        assert len(sqs.delete_calls) == 1
+        assert [m["MessageId"] for m in failed] == ["msg-1"]
+
+    @pytest.mark.asyncio
+    async def test_keeps_whole_batch_when_dispatch_fails(self):
+        sqs = FakeSQS([{"n": 1}, {"n": 2}])
+
+        async def handle(event):
+            raise RuntimeError("backend down")
+
+        poller = SQSPoller(sqs, QueueSubscription(queue_url=QUEUE_URL, function_name="test-function"), handle)
+        failed = await poller.process(received(sqs, 2))
+
+        assert sqs.deleted == []
+        assert len(failed) == 2
+
+    @pytest.mark.asyncio
+    async def test_extends_visibility_of_slow_batches(self):
+        sqs = FakeSQS([{"n": 1}])
+
+        async def handle(event):
+            await asyncio.sleep(0.05)
+            return {"batchItemFailures": []}
+
+        subscription = QueueSubscription(
+            queue_url=QUEUE_URL,
+            function_name="test-function",
+            visibility_timeout=45,
+            extend_interval=0.01
+        )
+        await SQSPoller(sqs, subscription, handle).process(received(sqs, 1))
+
+        assert sqs.visibility_calls
+        assert sqs.visibility_calls[0] == [{"Id": "0", "ReceiptHandle": "rh-0", "VisibilityTimeout": 45}]
+
+    @pytest.mark.asyncio
+    async def test_receivers_drain_queue_through_sqs_handler(self, service_registry):
+        sqs = FakeSQS([{"n": i} for i in range(25)])
+        invoked = []
+
+        async def upstream(request):
+            invoked.append(json.loads(request.content)["event"]["body"]["n"])
+            return httpx.Response(200, json={})
+
+        subscription = QueueSubscription(
+            queue_url=QUEUE_URL,
+            function_name="test-function",
+            receivers=3,
+            wait_time_seconds=0
+        )
+        stop = asyncio.Event()
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(upstream)) as client:
+            poller = SQSPoller(sqs, subscription, SQSHandler(service_registry, client).handle)
+            task = asyncio.create_task(poller.run(stop))
+            while len(sqs.deleted) < 25:
+                await asyncio.sleep(0.01)
+            stop.set()
+            await asyncio.wait_for(task, timeout=5)
+
+        assert sorted(invoked) == list(range(25))
+        assert all(len(entries) <= 10 for entries in sqs.delete_calls)
+
+class TestPollCommand:
+    def test_starts_and_stops_discovery(self, monkeypatch, tmp_path, root_logger):
+        from click.testing import CliRunner
+        from shim.cli import cli
+        from shim.discovery import Discovery
+
+        calls = []
+
+        async def run(self, stop=None):
+            calls.append("run")
+
+        async def stop(self):
+            calls.append("stop")
+
+        boto3 = SimpleNamespace(client=lambda *args, **kwargs: FakeSQS([]))
+        monkeypatch.setitem(sys.modules, "boto3", boto3)
+        monkeypatch.setattr(SQSPoller, "run", run)
+        monkeypatch.setattr(Discovery, "start", lambda self: calls.append("start"))
+        monkeypatch.setattr(Discovery, "stop", stop)
+        config = tmp_path / "config.yaml"
+        config.write_text(json.dumps({
+            "services": [{"name": "fn", "namespace": "test", "service_name": "svc", "port": 8080, "discovery": True}],
+            "sqs": {"queues": [{"queue_url": QUEUE_URL, "function_name": "fn"}]}
+        }))
+
+        result = CliRunner().invoke(cli, ["poll", "-c", str(config)])
+
+        assert result.exit_code == 0, result.output
+        assert calls == ["start", "run", "stop"]
+
+    def test_logs_through_background_writer(self, monkeypatch, tmp_path, root_logger):
+        from click.testing import CliRunner
+        from shim.cli import cli
+        from shim.logs import NonBlockingQueueHandler
+
+        handlers = []
+
+        async def run(self, stop=None):
+            handlers.extend(type(handler) for handler in root_logger.handlers)
+
+        monkeypatch.setitem(sys.modules, "boto3", SimpleNamespace(client=lambda *args, **kwargs: FakeSQS([])))
+        monkeypatch.setattr(SQSPoller, "run", run)
+        config = tmp_path / "config.yaml"
+        config.write_text(json.dumps({
+            "services": [{"name": "fn", "namespace": "test", "service_name": "svc", "port": 8080}],
+            "sqs": {"queues": [{"queue_url": QUEUE_URL, "function_name": "fn"}]}
+        }))
+
+        result = CliRunner().invoke(cli, ["poll", "-c", str(config)])
+
+        assert result.exit_code == 0, result.output
+        assert handlers == [NonBlockingQueueHandler]
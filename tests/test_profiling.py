@@ -0,0 +1,151 @@
+"""Tests for sampled request profiling."""
+import asyncio
+import sys
+import time
+import pytest
+import httpx
+
+from shim import server
+from shim.profiling import TRUNCATED, Profiler, collapse
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+class TestCollapse:
+    def test_lists_frames_outermost_first(self):
+        def inner():
+            return collapse(sys._getframe())
+
+        def outer():
+            return inner()
+
+        frames = outer().split(";")
+        assert frames[-1].startswith("inner (tests/test_profiling.py:")
+        assert frames[-2].startswith("outer (tests/test_profiling.py:")
+
+class TestWants:
+    def test_disabled_profiler_never_profiles(self):
+        profiler = Profiler(enabled=False, sample_rate=1.0)
+
+        assert not profiler.wants({"X-Shim-Profile": "1"})
+
+    def test_header_requests_profile(self):
+        assert Profiler().wants({"X-Shim-Profile": "true"})
+        assert not Profiler(allow_header=False).wants({"X-Shim-Profile": "1"})
+
+    def test_samples_at_rate(self):
+        assert Profiler(sample_rate=1.0).wants({})
+        assert not Profiler(sample_rate=0.0).wants({})
+
+    def test_disabled_by_default_in_config(self):
+        assert not Profiler.from_settings({}).enabled
+
+class TestProfile:
+    @pytest.mark.asyncio
+    async def test_samples_busy_code_of_profiled_request(self):
+        profiler = Profiler(interval=0.001)
+        try:
+            async with profiler.profile({"X-Shim-Profile": "1"}):
+                busy(0.1)
+        finally:
+            profiler.close()
+
+        assert profiler.profiled_requests == 1
+        assert "busy (tests/test_profiling.py:" in profiler.collapsed()
+        line = profiler.collapsed().splitlines()[0]
+        assert int(line.rsplit(" ", 1)[1]) > 0
+
+    @pytest.mark.parametrize("loop_factory", ["asyncio", "uvloop"])
+    def test_skips_samples_while_loop_waits(self, loop_factory):
+        if loop_factory == "uvloop":
+            loop_factory = pytest.importorskip("uvloop").new_event_loop
+        else:
+            loop_factory = asyncio.new_event_loop
+        profiler = Profiler(interval=0.001)
+
+        async def waiting_request():
+            async with profiler.profile({"X-Shim-Profile": "1"}):
+                await asyncio.sleep(0.1)
+
+        try:
+            with asyncio.Runner(loop_factory=loop_factory) as runner:
+                runner.run(waiting_request())
+        finally:
+            profiler.close()
+
+        assert sum(profiler.stacks.values()) < 10
+
+    @pytest.mark.asyncio
+    async def test_does_not_sample_unprofiled_requests(self):
+        profiler = Profiler(interval=0.001)
+        async with profiler.profile({}):
+            busy(0.02)
+
+        assert profiler.collapsed() == ""
+
+    @pytest.mark.asyncio
+    async def test_caps_distinct_stacks(self):
+        profiler = Profiler(interval=0.001, max_stacks=0)
+        try:
+            async with profiler.profile({"X-Shim-Profile": "1"}):
+                busy(0.05)
+        finally:
+            profiler.close()
+
+        assert set(profiler.stacks) == {TRUNCATED}
+
+    @pytest.mark.asyncio
+    async def test_reset_discards_samples(self):
+        profiler = Profiler(interval=0.001)
+        try:
+            async with profiler.profile({"X-Shim-Profile": "1"}):
+                busy(0.02)
+        finally:
+            profiler.close()
+
+        profiler.reset()
+        assert profiler.collapsed() == ""
+        assert profiler.profiled_requests == 0
+
+class TestProfileEndpoint:
+    def app(self, monkeypatch, profiling):
+        monkeypatch.setattr(
+            server,
+            "create_http_client",
+            lambda *args, **kwargs: httpx.AsyncClient(
+                transport=httpx.MockTransport(lambda request: httpx.Response(200, json={}))
+            )
+        )
+        return server.create_app({
+            "services": [{"name": "fn", "namespace": "test", "service_name": "svc", "port": 8080}],
+            "profiling": profiling
+        })
+
+    @pytest.mark.asyncio
+    async def test_counts_profiled_requests(self, monkeypatch):
+        app = self.app(monkeypatch, {"enabled": True})
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://shim") as client:
+                await client.post("/invoke/fn", json={}, headers={"X-Shim-Profile": "1"})
+                await client.post("/sqs/fn", json={"Records": []}, headers={"X-Shim-Profile": "1"})
+                await client.post("/invoke/fn", json={})
+                response = await client.get("/admin/profile")
+                reset = await client.delete("/admin/profile")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert response.headers["X-Profiled-Requests"] == "2"
+        assert reset.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_hidden_when_disabled(self, monkeypatch):
+        app = self.app(monkeypatch, {})
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://shim") as client:
+                response = await client.get("/admin/profile")
+
+        assert response.status_code == 404
@@ -0,0 +1,116 @@
+"""Tests for the upstream DNS cache."""
+import asyncio
+import pytest
+import httpx
+
+from shim.resolver import DNSCache
+from shim.transport import CachedDNSTransport, HostLimitedTransport, create_http_client
+
+HOST = "orders.shop.svc.cluster.local"
+
+class FakeResolver:
+    def __init__(self, *answers, ttl=None):
+        self.answers = list(answers)
+        self.ttl = ttl
+        self.calls = []
+
+    async def __call__(self, host):
+        self.calls.append(host)
+        await asyncio.sleep(0)
+        answer = self.answers[min(len(self.calls), len(self.answers)) - 1]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer, self.ttl
+
+class TestDNSCache:
+    @pytest.mark.asyncio
+    async def test_resolves_once_within_ttl(self, clock):
+        resolve = FakeResolver(["10.96.0.10"])
+        cache = DNSCache(ttl=5, resolve=resolve, clock=clock)
+
+        assert await cache.lookup(HOST) == "10.96.0.10"
+        clock.now = 3
+        assert await cache.lookup(HOST) == "10.96.0.10"
+        assert resolve.calls == [HOST]
+
+    @pytest.mark.asyncio
+    async def test_honours_resolver_ttl(self, clock):
+        resolve = FakeResolver(["10.96.0.10"], ["10.96.0.11"], ttl=1)
+        cache = DNSCache(ttl=60, resolve=resolve, clock=clock)
+
+        await cache.lookup(HOST)
+        clock.now = 1
+        assert await cache.lookup(HOST) == "10.96.0.11"
+
+    @pytest.mark.asyncio
+    async def test_refreshes_in_background_before_expiry(self, clock):
+        resolve = FakeResolver(["10.96.0.10"], ["10.96.0.11"])
+        cache = DNSCache(ttl=4, refresh_ratio=0.75, resolve=resolve, clock=clock)
+
+        await cache.lookup(HOST)
+        clock.now = 3
+        # Served from the cache while the refresh runs
+        assert await cache.lookup(HOST) == "10.96.0.10"
+        await asyncio.sleep(0.01)
+        assert await cache.lookup(HOST) == "10.96.0.11"
+        assert len(resolve.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_coalesces_concurrent_lookups(self):
+        resolve = FakeResolver(["10.96.0.10"])
+        cache = DNSCache(resolve=resolve)
+
+        await asyncio.gather(*(cache.lookup(HOST) for _ in range(10)))
+
+        assert resolve.calls == [HOST]
+
+    @pytest.mark.asyncio
+    async def test_rotates_through_addresses(self):
+        cache = DNSCache(resolve=FakeResolver(["10.0.0.1", "10.0.0.2"]))
+
+        assert [await cache.lookup(HOST) for _ in range(3)] == ["10.0.0.1", "10.0.0.2", "10.0.0.1"]
+
+    @pytest.mark.asyncio
+    async def test_serves_stale_answer_while_dns_fails(self, clock):
+        resolve = FakeResolver(["10.96.0.10"], OSError("SERVFAIL"))
+        cache = DNSCache(ttl=5, stale_ttl=30, resolve=resolve, clock=clock)
+
+        await cache.lookup(HOST)
+        clock.now = 10
+        assert await cache.lookup(HOST) == "10.96.0.10"
+        clock.now = 40
+        with pytest.raises(OSError):
+            await cache.lookup(HOST)
+
+class TestCachedDNSTransport:
+    @pytest.mark.asyncio
+    async def test_connects_to_cached_address_and_keeps_host(self):
+        seen = []
+
+        async def upstream(request):
+            seen.append((str(request.url), request.headers["host"]))
+            return httpx.Response(200)
+
+        cache = DNSCache(resolve=FakeResolver(["10.96.0.10"]))
+        transport = CachedDNSTransport(httpx.MockTransport(upstream), cache)
+        async with httpx.AsyncClient(transport=transport) as client:
+            await client.post(f"http://{HOST}:8080/process")
+
+        assert seen == [("http://10.96.0.10:8080/process", f"{HOST}:8080")]
+
+    @pytest.mark.asyncio
+    async def test_lookup_failure_is_a_connect_error(self):
+        cache = DNSCache(resolve=FakeResolver(OSError("NXDOMAIN")))
+        transport = CachedDNSTransport(httpx.MockTransport(lambda request: httpx.Response(200)), cache)
+
+        async with httpx.AsyncClient(transport=transport) as client:
+            with pytest.raises(httpx.ConnectError):
+                await client.post(f"http://{HOST}:8080/")
+
+    @pytest.mark.asyncio
+    async def test_sits_below_per_host_limits(self):
+        async with create_http_client({"dns_cache": {"ttl": 10}, "max_connections_per_host": 4}) as client:
+            host_limited = client._transport._transport
+            assert isinstance(host_limited, HostLimitedTransport)
+            assert isinstance(host_limited._transport, CachedDNSTransport)
+            assert host_limited._transport.cache.ttl == 10
@@ -0,0 +1,140 @@
+"""Tests for upstream retries and the retry budget."""
+import pytest
+import httpx
+
+from shim.events.dispatcher import Event, EventType
+from shim.handlers import DirectInvokeHandler
+from shim.registry.service_registry import ServiceEndpoint, ServiceRegistry
+from shim.retry import RetryBudget, RetryPolicy
+from shim.transport import RetryTransport
+
+def flaky(*outcomes):
+    """Upstream that replays ``outcomes`` (status codes or exceptions) in order."""
+    calls = []
+
+    async def upstream(request):
+        outcome = outcomes[min(len(calls), len(outcomes) - 1)]
+        calls.append(request)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, json={})
+
+    return upstream, calls
+
+def retrying(upstream, budget=None):
+    budget = budget or RetryBudget(min_retries_per_second=100)
+    policy = RetryPolicy(base_delay=0, max_delay=0, budget=budget)
+    return httpx.AsyncClient(transport=RetryTransport(httpx.MockTransport(upstream), policy))
+
+class TestRetryBudget:
+    def test_requests_earn_fractional_retries(self, clock):
+        budget = RetryBudget(ratio=0.5, min_retries_per_second=0, clock=clock)
+
+        budget.record_request()
+        assert not budget.try_spend()
+        budget.record_request()
+        assert budget.try_spend()
+
+    def test_refills_over_time(self, clock):
+        budget = RetryBudget(ratio=0, min_retries_per_second=2, clock=clock)
+        assert budget.try_spend()
+        assert budget.try_spend()
+        assert not budget.try_spend()
+
+        clock.now = 0.5
+        assert budget.try_spend()
+
+    def test_caps_tokens(self, clock):
+        budget = RetryBudget(ratio=0, min_retries_per_second=10, max_tokens=3, clock=clock)
+
+        clock.now = 60
+        spent = 0
+        while budget.try_spend():
+            spent += 1
+
+        assert spent == 3
+
+class TestRetryPolicy:
+    def test_backoff_is_jittered_and_capped(self):
+        policy = RetryPolicy(base_delay=0.1, max_delay=0.3)
+
+        delays = [policy.backoff(retry) for retry in range(6) for _ in range(20)]
+
+        assert all(0 <= delay <= 0.3 for delay in delays)
+        assert len(set(delays)) > 1
+
+class TestRetryTransport:
+    @pytest.mark.asyncio
+    async def test_retries_gateway_errors(self):
+        upstream, calls = flaky(503, 502, 200)
+
+        async with retrying(upstream) as client:
+            response = await client.get("http://a.svc/", extensions={"retries": 2})
+
+        assert response.status_code == 200
+        assert len(calls) == 3
+
+    @pytest.mark.asyncio
+    async def test_retries_connect_errors(self):
+        upstream, calls = flaky(httpx.ConnectError("refused"), 200)
+
+        async with retrying(upstream) as client:
+            response = await client.get("http://a.svc/", extensions={"retries": 1})
+
+        assert response.status_code == 200
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_returns_last_response_when_retries_run_out(self):
+        upstream, calls = flaky(503)
+
+        async with retrying(upstream) as client:
+            response = await client.get("http://a.svc/", extensions={"retries": 2})
+
+        assert response.status_code == 503
+        assert len(calls) == 3
+
+    @pytest.mark.asyncio
+    async def test_does_not_retry_errors_the_service_may_have_acted_on(self):
+        upstream, calls = flaky(500, 200)
+
+        async with retrying(upstream) as client:
+            response = await client.get("http://a.svc/", extensions={"retries": 3})
+
+        assert response.status_code == 500
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_does_not_retry_without_extension(self):
+        upstream, calls = flaky(503, 200)
+
+        async with retrying(upstream) as client:
+            response = await client.get("http://a.svc/")
+
+        assert response.status_code == 503
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_stops_when_budget_is_exhausted(self):
+        upstream, calls = flaky(503)
+        budget = RetryBudget(ratio=0, min_retries_per_second=0, max_tokens=1)
+        budget.tokens = 1
+
+        async with retrying(upstream, budget) as client:
+            await client.get("http://a.svc/", extensions={"retries": 5})
+
+        assert len(calls) == 2
+
+class TestHandlerRetries:
+    @pytest.mark.asyncio
+    async def test_uses_function_retry_count(self):
+        upstream, calls = flaky(503, 503, 200)
+        registry = ServiceRegistry()
+        registry.register("flaky-function", ServiceEndpoint(service_name="flaky", retries=2))
+        event = Event(event_type=EventType.DIRECT_INVOKE, function_name="flaky-function", payload={"n": 1})
+
+        async with retrying(upstream) as client:
+            result = await DirectInvokeHandler(registry, client).handle(event)
+
+        assert result == {}
+        assert len(calls) == 3
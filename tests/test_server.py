@@ -0,0 +1,372 @@
+"""Tests for the FastAPI server."""
+import json
+import pytest
+import httpx
+
+from shim import server
+from shim.limiter import ConcurrencyLimitExceeded
+
+CONFIG = {
+    "services": [
+        {
+            "name": "parsed-function",
+            "namespace": "test",
+            "service_name": "parsed-service",
+            "port": 8080,
+            "path": "/invoke"
+        },
+        {
+            "name": "raw-function",
+            "namespace": "test",
+            "service_name": "raw-service",
+            "port": 8080,
+            "path": "/invoke",
+            "passthrough": True
+        },
+        {
+            "name": "stream-function",
+            "namespace": "test",
+            "service_name": "stream-service",
+            "port": 8080,
+            "path": "/invoke",
+            "stream": True
+        }
+    ]
+}
+
+@pytest.fixture
+def upstream_requests():
+    return []
+
+@pytest.fixture
+def config():
+    return CONFIG
+
+@pytest.fixture
+def app(monkeypatch, upstream_requests, config):
+    """App whose upstream calls are answered in-process."""
+    async def upstream(request):
+        upstream_requests.append(request)
+        return httpx.Response(
+            200,
+            content=b'{"echo": "raw"}',
+            headers={"Content-Type": "application/json"}
+        )
+
+    monkeypatch.setattr(
+        server,
+        "create_http_client",
+        lambda *args, **kwargs: httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+    )
+    return server.create_app(config)
+
+@pytest.fixture
+async def client(app):
+    # ASGITransport does not run the lifespan, which closes the upstream pool
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://shim") as client:
+            yield client
+
+class TestInvokeEndpoint:
+    @pytest.mark.asyncio
+    async def test_wraps_parsed_payload_in_envelope(self, client, upstream_requests):
+        response = await client.post("/invoke/parsed-function", json={"custom": "data"})
+
+        assert response.status_code == 200
+        assert response.json() == {"echo": "raw"}
+        assert json.loads(upstream_requests[0].content) == {
+            "event": {"custom": "data"},
+            "context": {}
+        }
+
+    @pytest.mark.asyncio
+    async def test_returns_503_when_upstream_is_unavailable(self, monkeypatch):
+        async def upstream(request):
+            raise ConcurrencyLimitExceeded("queue full")
+
+        monkeypatch.setattr(
+            server,
+            "create_http_client",
+            lambda *args, **kwargs: httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        )
+        app = server.create_app(CONFIG)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url="http://shim"
+            ) as client:
+                response = await client.post("/invoke/parsed-function", json={"custom": "data"})
+
+        assert response.status_code == 503
+
+    @pytest.mark.asyncio
+    async def test_returns_504_without_calling_upstream_past_deadline(self, client, upstream_requests):
+        response = await client.post(
+            "/invoke/parsed-function",
+            json={"custom": "data"},
+            headers={"X-Lambda-Remaining-Ms": "0"}
+        )
+
+        assert response.status_code == 504
+        assert upstream_requests == []
+
+    @pytest.mark.asyncio
+    async def test_forwards_caller_deadline(self, client, upstream_requests):
+        await client.post(
+            "/invoke/parsed-function",
+            json={"custom": "data"},
+            headers={"X-Request-Deadline": "4102444800000"}
+        )
+
+        assert upstream_requests[0].headers["X-Request-Deadline"] == "4102444800000"
+        assert json.loads(upstream_requests[0].content)["context"] == {"deadline": 4102444800000}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("headers", [
+        {"X-Request-Deadline": "nan"},
+        {"X-Lambda-Remaining-Ms": "inf"}
+    ])
+    async def test_ignores_non_finite_deadline(self, client, upstream_requests, headers):
+        response = await client.post("/invoke/parsed-function", json={"custom": "data"}, headers=headers)
+
+        assert response.status_code == 200
+        assert "X-Request-Deadline" not in upstream_requests[0].headers
+
+    @pytest.mark.asyncio
+    async def test_reports_stage_timings_when_enabled(self, monkeypatch):
+        monkeypatch.setattr(
+            server,
+            "create_http_client",
+            lambda *args, **kwargs: httpx.AsyncClient(
+                transport=httpx.MockTransport(lambda request: httpx.Response(200, json={}))
+            )
+        )
+        app = server.create_app({**CONFIG, "middleware": {"timing": True}})
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url="http://shim"
+            ) as client:
+                response = await client.post("/invoke/parsed-function", json={"custom": "data"})
+
+        stages = [stage.split(";")[0] for stage in response.headers["Server-Timing"].split(", ")]
+        assert stages == ["LoggingMiddleware", "ValidationMiddleware"]
+
+    @pytest.mark.asyncio
+    async def test_omits_stage_timings_by_default(self, client):
+        response = await client.post("/invoke/parsed-function", json={"custom": "data"})
+
+        assert "Server-Timing" not in response.headers
+
+    @pytest.mark.asyncio
+    async def test_rejects_non_object_payload(self, client, upstream_requests):
+        response = await client.post("/invoke/parsed-function", json=[{"custom": "data"}])
+
+        assert response.status_code == 404
+        assert upstream_requests == []
+
+    @pytest.mark.asyncio
+    async def test_returns_404_for_unknown_function(self, client):
+        response = await client.post("/invoke/unknown", json={"custom": "data"})
+
+        assert response.status_code == 404
+
+class TestPassthrough:
+    @pytest.mark.asyncio
+    async def test_forwards_body_bytes_untouched(self, client, upstream_requests):
+        body = b'{"custom":  "data", "n": 1.50}'
+
+        response = await client.post(
+            "/invoke/raw-function",
+            content=body,
+            headers={"Content-Type": "application/json"}
+        )
+
+        assert response.status_code == 200
+        assert response.content == b'{"echo": "raw"}'
+        assert upstream_requests[0].content == b'{"event":' + body + b',"context":{}}'
+
+    @pytest.mark.asyncio
+    async def test_typed_route_forwards_whole_sqs_batch(self, client, upstream_requests):
+        body = b'{"Records": [{"messageId": "m1", "eventSource": "aws:sqs"}]}'
+
+        response = await client.post("/sqs/raw-function", content=body)
+
+        assert response.status_code == 200
+        assert len(upstream_requests) == 1
+        assert upstream_requests[0].content.startswith(b'{"event":' + body)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("config", [
+        {**CONFIG, "middleware": {"batch_processing": {"enabled": True}}}
+    ])
+    async def test_forwards_sqs_batch_with_batch_processing_configured(self, client, upstream_requests):
+        body = b'{"Records": [{"messageId": "m1", "eventSource": "aws:sqs"}]}'
+
+        sqs = await client.post("/sqs/raw-function", content=body)
+        direct = await client.post("/invoke/raw-function", content=body)
+
+        assert sqs.status_code == direct.status_code == 200
+        assert len(upstream_requests) == 2
+
+class TestStreaming:
+    @pytest.mark.asyncio
+    async def test_streams_direct_invoke_reply(self, client, upstream_requests):
+        response = await client.post("/invoke/stream-function", json={"report": "monthly"})
+
+        assert response.status_code == 200
+        assert response.content == b'{"echo": "raw"}'
+        assert json.loads(upstream_requests[0].content)["event"] == {"report": "monthly"}
+
+    @pytest.mark.asyncio
+    async def test_wraps_streamed_api_gateway_reply(self, client):
+        response = await client.post("/api-gateway/stream-function", json={"httpMethod": "GET"})
+
+        assert response.json() == {
+            "statusCode": 200,
+            "body": {"echo": "raw"},
+            "headers": {"Content-Type": "application/json"}
+        }
+
+    @pytest.mark.asyncio
+    async def test_does_not_stream_sqs_route(self, client):
+        response = await client.post(
+            "/sqs/stream-function",
+            json={"Records": [{"messageId": "m1"}]}
+        )
+
+        assert response.json() == {"batchItemFailures": []}
+
+    @pytest.mark.asyncio
+    async def test_closes_upstream_when_client_disconnects(self, monkeypatch):
+        closed = []
+
+        class UpstreamBody(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                yield b'{"part": 1}'
+                yield b'{"part": 2}'
+
+            async def aclose(self):
+                closed.append(True)
+
+        async def upstream(request):
+            return httpx.Response(200, stream=UpstreamBody())
+
+        monkeypatch.setattr(
+            server,
+            "create_http_client",
+            lambda *args, **kwargs: httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        )
+        app = server.create_app(CONFIG)
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.4"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": "/invoke/stream-function",
+            "raw_path": b"/invoke/stream-function",
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"content-type", b"application/json")],
+            "server": ("shim", 80),
+            "client": ("test", 1234),
+        }
+
+        async def receive():
+            return {"type": "http.request", "body": b'{"n": 1}', "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                raise OSError("client went away")
+
+        async with app.router.lifespan_context(app):
+            with pytest.raises(Exception):
+                await app(scope, receive, send)
+
+        assert closed == [True]
+
+class TestBatchInvoke:
+    @pytest.mark.asyncio
+    async def test_returns_result_per_entry_in_order(self, client, upstream_requests):
+        response = await client.post("/batch/invoke", json=[
+            {"function_name": "parsed-function", "payload": {"n": 1}},
+            {"function_name": "unknown", "payload": {"n": 2}},
+            {"payload": {"n": 3}},
+        ])
+
+        results = response.json()["results"]
+        assert response.status_code == 200
+        assert results[0] == {"function_name": "parsed-function", "status": 200, "result": {"echo": "raw"}}
+        assert results[1]["status"] == 404
+        assert results[2]["status"] == 400
+        assert len(upstream_requests) == 1
+
+    @pytest.mark.asyncio
+    async def test_accepts_ndjson(self, client, upstream_requests):
+        body = b'{"function_name": "parsed-function", "payload": {"n": 1}}\n\n' \
+            b'{"function_name": "parsed-function", "payload": {"n": 2}}\n'
+
+        response = await client.post(
+            "/batch/invoke",
+            content=body,
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+
+        assert [r["status"] for r in response.json()["results"]] == [200, 200]
+        assert len(upstream_requests) == 2
+
+    @pytest.mark.asyncio
+    async def test_rejects_non_list_body(self, client):
+        response = await client.post("/batch/invoke", json={"function_name": "parsed-function"})
+
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_rejects_non_string_function_name(self, client, upstream_requests):
+        response = await client.post("/batch/invoke", json=[
+            {"function_name": 42, "payload": {}}
+        ])
+
+        assert response.json()["results"] == [
+            {"status": 400, "error": "function_name must be a string"}
+        ]
+        assert upstream_requests == []
+
+class TestStreamEvents:
+    @pytest.mark.asyncio
+    async def test_streams_one_result_per_line(self, client, upstream_requests):
+        async def body():
+            # Lines deliberately split across chunks
+            yield b'{"n": 1}\n{"n"'
+            yield b': 2}\nnot json\n'
+            yield b'{"n": 3}'
+
+        response = await client.post("/stream/parsed-function", content=body())
+
+        lines = [json.loads(line) for line in response.content.splitlines()]
+        by_index = {line["index"]: line for line in lines}
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert sorted(by_index) == [0, 1, 2, 3]
+        assert by_index[0]["result"] == {"echo": "raw"}
+        assert by_index[2]["status"] == 400
+        assert sorted(json.loads(r.content)["event"]["n"] for r in upstream_requests) == [1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_reports_unknown_function_per_line(self, client):
+        response = await client.post("/stream/unknown", content=b'{"n": 1}\n')
+
+        assert json.loads(response.content)["status"] == 404
+
+    @pytest.mark.asyncio
+    async def test_reports_body_read_failure(self, client):
+        async def body():
+            yield b'{"n": 1}\n'
+            raise RuntimeError("connection reset")
+
+        response = await client.post("/stream/parsed-function", content=body())
+
+        lines = [json.loads(line) for line in response.content.splitlines()]
+        assert {"status": 500, "error": "Error reading event stream: connection reset"} in lines
+        assert any(line.get("index") == 0 and line["status"] == 200 for line in lines)
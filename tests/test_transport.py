@@ -0,0 +1,114 @@
+"""Tests for the shared upstream HTTP client."""
+import asyncio
+import sys
+import pytest
+import httpx
+
+from shim.metrics import MetricsTransport
+from shim.transport import (
+    AdaptiveLimitTransport,
+    CircuitBreakerTransport,
+    HostLimitedTransport,
+    RetryTransport,
+    create_http_client
+)
+
+def layers(transport):
+    """Transport wrappers from the outermost inwards, ending with the pool."""
+    found = [transport]
+    while hasattr(found[-1], "_transport"):
+        found.append(found[-1]._transport)
+    return found
+
+class TestCreateHttpClient:
+    @pytest.mark.asyncio
+    async def test_uses_defaults_without_settings(self):
+        async with create_http_client() as client:
+            assert client.timeout == httpx.Timeout(30.0)
+
+    @pytest.mark.asyncio
+    async def test_applies_configured_timeout(self):
+        async with create_http_client({"timeout": 5}) as client:
+            assert client.timeout == httpx.Timeout(5)
+
+    @pytest.mark.asyncio
+    async def test_wraps_transport_when_per_host_limit_configured(self):
+        async with create_http_client({"max_connections_per_host": 4}) as client:
+            host_limited = layers(client._transport)[1]
+            assert isinstance(host_limited, HostLimitedTransport)
+            assert host_limited.max_connections_per_host == 4
+
+    @pytest.mark.asyncio
+    async def test_adds_adaptive_limits_when_configured(self):
+        settings = {"adaptive_concurrency": {"initial_limit": 5}}
+        async with create_http_client(settings, http2_origins=["http://fast.svc:8080"]) as client:
+            h2_transport = client._transport_for_url(httpx.URL("http://fast.svc:8080/invoke"))
+            limiter = layers(client._transport)[1]
+
+            assert isinstance(limiter, AdaptiveLimitTransport)
+            assert isinstance(layers(h2_transport)[1], AdaptiveLimitTransport)
+            assert limiter.settings == {"initial_limit": 5}
+
+    @pytest.mark.asyncio
+    async def test_retries_each_attempt_through_breaker_then_limiter(self):
+        settings = {"adaptive_concurrency": {}, "circuit_breaker": {"failure_threshold": 3}}
+        async with create_http_client(settings) as client:
+            assert [type(t) for t in layers(client._transport)] == [
+                RetryTransport,
+                CircuitBreakerTransport,
+                AdaptiveLimitTransport,
+                MetricsTransport,
+                httpx.AsyncHTTPTransport
+            ]
+
+    @pytest.mark.asyncio
+    async def test_routes_http2_origins_through_h2c_transport(self):
+        async with create_http_client(http2_origins=["http://fast.svc:8080"]) as client:
+            h2_transport = layers(client._transport_for_url(httpx.URL("http://fast.svc:8080/invoke")))[-1]
+            default_transport = layers(client._transport_for_url(httpx.URL("http://slow.svc:8080/invoke")))[-1]
+
+        assert h2_transport is not default_transport
+        assert h2_transport._pool._http2
+        assert not h2_transport._pool._http1
+
+    def test_rejects_http2_origins_without_h2(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, "h2.config", None)
+
+        with pytest.raises(ValueError, match="need the h2 package"):
+            create_http_client(http2_origins=["http://fast.svc:8080"])
+
+class TestHostLimitedTransport:
+    @pytest.mark.asyncio
+    async def test_limits_concurrent_requests_per_host(self):
+        in_flight = {}
+        peak = {}
+
+        async def upstream(request):
+            host = request.url.host
+            in_flight[host] = in_flight.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), in_flight[host])
+            await asyncio.sleep(0.01)
+            in_flight[host] -= 1
+            return httpx.Response(200, json={})
+
+        transport = HostLimitedTransport(httpx.MockTransport(upstream), 2)
+        async with httpx.AsyncClient(transport=transport) as client:
+            await asyncio.gather(
+                *(client.get("http://a.svc/") for _ in range(6)),
+                *(client.get("http://b.svc/") for _ in range(6))
+            )
+
+        assert peak == {"a.svc": 2, "b.svc": 2}
+
+    @pytest.mark.asyncio
+    async def test_releases_slot_when_request_fails(self):
+        async def upstream(request):
+            raise httpx.ConnectError("refused")
+
+        transport = HostLimitedTransport(httpx.MockTransport(upstream), 1)
+        async with httpx.AsyncClient(transport=transport) as client:
+            for _ in range(2):
+                with pytest.raises(httpx.ConnectError):
+                    await client.get("http://a.svc/")
+
+        assert not transport._semaphore("a.svc").locked()